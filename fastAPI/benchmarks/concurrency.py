@@ -0,0 +1,112 @@
+"""
+Concurrency benchmark for the catalog and booking endpoints.
+
+Start the API once with DATABASE_ASYNC=0 and once with DATABASE_ASYNC=1 and
+run this script against each, saving the results, then compare them:
+
+    python concurrency.py --label before --token <jwt> --out before.json
+    python concurrency.py --label after --token <jwt> --out after.json
+    python concurrency.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+ENDPOINTS = ["/services/", "/bookings/"]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def hit(client, path, headers, total, concurrency):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def run(args):
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        for path in ENDPOINTS:
+            results[path] = await hit(client, path, headers, args.requests, args.concurrency)
+            print(f"{args.label} {path}: {results[path]}")
+    return {"label": args.label, "base_url": args.base_url, "results": results}
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    for path, old in before["results"].items():
+        new = after["results"].get(path)
+        if not new:
+            continue
+        print(f"{path}")
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            if key not in old or key not in new:
+                continue
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"  {key:19} {old[key]:>10} -> {new[key]:>10} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", help="Bearer token; /bookings/ requires one")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--out", help="Write results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+End-to-end load test of the main user journeys: sign in, browse the catalog,
+list, create and update bookings, and ask the chat assistant (with the fake
+model, so no API key or network is needed). Requests go through the whole
+application in-process, which lets each scenario report the SQL statements it
+ran per request next to throughput and p50/p95/p99.
+
+Use a scratch Postgres database; --seed applies the migrations and adds the
+default volumes (100k users of which 20k providers, 500k services, 5M bookings)
+times --scale:
+
+    DATABASE_URL=postgresql://.../homehelp_load python load_test.py --seed --scale 0.1
+    DATABASE_URL=postgresql://.../homehelp_load python load_test.py --label "$(git rev-parse --short HEAD)" --out after.json
+    python load_test.py --compare before.json after.json
+
+The client shares the event loop with the app, so absolute numbers are lower
+than against uvicorn; compare runs made on the same machine and dataset.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+os.environ.setdefault("CHAT_MODEL_CLIENT", "fake")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "users_auth"))
+
+import httpx  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from concurrency import compare, percentile  # noqa: E402
+
+LOAD_PASSWORD = "load-test-password"
+VOLUMES = {"users": 100_000, "providers": 20_000, "services": 500_000, "bookings": 5_000_000, "requests": 50_000}
+ACCOUNTS = 20  # signed-in homeowners and providers the scenarios act as
+
+CHAT_QUESTIONS = [
+    "How do I book a plumber?",
+    "How can I cancel my booking?",
+    "How do I become a service provider?",
+    "Is my payment information safe?",
+    "What documents do providers need to upload?",
+    "Can you recommend someone to fix a leaking roof this weekend?",
+    "What should I ask a painter before hiring them?",
+]
+
+
+class StatementCounter:
+    """Counts statements on every engine, including the async engine's sync core."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+statements = StatementCounter()
+
+
+def prepare(scale: float):
+    from database import make_engine
+    from datagen import generate
+    from migrations import migrate
+
+    # Index builds and bulk inserts outlast the API's statement timeout
+    seed_engine = make_engine(statement_timeout_ms=0, application_name="homehelp-load-seed", pool_size=1)
+    try:
+        migrate(seed_engine)
+        volumes = {name: max(1, int(count * scale)) for name, count in VOLUMES.items()}
+        generate(seed_engine, password=LOAD_PASSWORD, prefix="load", **volumes)
+    finally:
+        seed_engine.dispose()
+
+
+def sample(engine):
+    """Accounts, services and bookings for the scenarios to use."""
+    with engine.connect() as conn:
+        def emails(role):
+            return conn.execute(text(
+                "SELECT email FROM users WHERE email LIKE 'load-%' AND role = :role ORDER BY random() LIMIT :limit"
+            ), {"role": role, "limit": ACCOUNTS}).scalars().all()
+
+        homeowners, providers = emails("homeowners"), emails("serviceproviders")
+        services = conn.execute(text(
+            "SELECT id FROM services WHERE is_active ORDER BY random() LIMIT 1000"
+        )).scalars().all()
+        provider_bookings = conn.execute(text("""
+            SELECT u.email, b.id FROM bookings b
+            JOIN services s ON s.id = b.service_id
+            JOIN serviceproviders p ON p.id = s.provider_id
+            JOIN users u ON u.id = p.user_id
+            WHERE u.email = ANY(:emails) AND b.status = 'PENDING'
+            LIMIT 1000
+        """), {"emails": list(providers)}).all()
+        max_provider = conn.execute(text("SELECT max(id) FROM serviceproviders")).scalar()
+        sizes = dict(conn.execute(text(
+            "SELECT relname, reltuples::bigint FROM pg_class WHERE relname IN "
+            "('users', 'serviceproviders', 'homeowners', 'services', 'bookings', 'provider_registration_requests')"
+        )).all())
+    if not homeowners or not providers or not provider_bookings:
+        sys.exit("No load-test accounts in this database; run with --seed first")
+    return homeowners, providers, services, provider_bookings, max_provider, sizes
+
+
+async def sign_in(client, email: str, role: str) -> dict:
+    response = await client.post("/signin/", data={"email": email, "password": LOAD_PASSWORD, "role": role})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def build_scenarios(homeowners, homeowner_headers, provider_headers, services, provider_bookings, max_provider):
+    """Scenario name -> function sending one request of that kind."""
+    def service_listing(client):
+        params = random.choice([
+            {}, {"sort": "price_asc"}, {"sort": "rating"},
+            {"provider_id": random.randint(1, max_provider)},
+            {"min_price": random.randint(0, 400), "sort": "price_asc"},
+        ])
+        return client.get("/services/", params=params)
+
+    def create_booking(client):
+        scheduled = datetime.utcnow() + timedelta(days=random.randint(1, 60), hours=random.randint(0, 23))
+        return client.post(
+            "/bookings/", json={"service_id": random.choice(services), "scheduled_date": scheduled.isoformat()},
+            headers=random.choice(homeowner_headers)
+        )
+
+    def update_booking_status(client):
+        email, booking_id = random.choice(provider_bookings)
+        return client.patch(f"/bookings/{booking_id}", json={"new_status": "confirmed"}, headers=provider_headers[email])
+
+    return {
+        "signin": lambda client: client.post("/signin/", data={
+            "email": random.choice(homeowners), "password": LOAD_PASSWORD, "role": "homeowners"
+        }),
+        "services": service_listing,
+        "bookings": lambda client: client.get("/bookings/", headers=random.choice(homeowner_headers)),
+        "create_booking": create_booking,
+        "update_booking_status": update_booking_status,
+        "chat": lambda client: client.post("/chat/", json={"message": random.choice(CHAT_QUESTIONS)}),
+    }
+
+
+async def drive(client, send, total, concurrency):
+    latencies = []
+    codes = Counter()
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await send(client)
+                codes[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                codes[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    statements_before = statements.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": sum(n for code, n in codes.items() if not code.startswith(("2", "3"))),
+        "status_codes": dict(codes),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries_per_request": round((statements.count - statements_before) / total, 2),
+    }
+
+
+async def run(args):
+    from database import engine
+    from main import app
+
+    homeowners, providers, services, provider_bookings, max_provider, sizes = sample(engine)
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120) as client:
+            homeowner_headers = await asyncio.gather(*(sign_in(client, e, "homeowners") for e in homeowners))
+            provider_headers = dict(zip(providers, await asyncio.gather(
+                *(sign_in(client, e, "serviceproviders") for e in providers)
+            )))
+            scenarios = build_scenarios(
+                homeowners, homeowner_headers, provider_headers, services, provider_bookings, max_provider
+            )
+            for name in args.scenarios or scenarios:
+                await drive(client, scenarios[name], args.warmup, min(args.warmup, args.concurrency))
+                results[name] = await drive(client, scenarios[name], args.requests, args.concurrency)
+                print(f"{args.label} {name}: {results[name]}")
+
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "database_rows": sizes,
+        "results": results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="Migrate and add synthetic data before the run")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the default volumes to seed")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each scenario")
+    parser.add_argument("--scenarios", nargs="+",
+                        choices=["signin", "services", "bookings", "create_booking", "update_booking_status", "chat"])
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--out", help="Write results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.seed:
+        prepare(args.scale)
+
+    report = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
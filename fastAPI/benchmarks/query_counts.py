@@ -0,0 +1,132 @@
+"""
+Query budget check: calls each endpoint once through the app in-process,
+with the principal and catalog caches cold, and fails if it runs more SQL
+statements than its budget. N+1 detection is on (N_PLUS_ONE_DETECTION=raise),
+so a lazy load per row fails the request even within budget. Run it against a
+database seeded with load_test.py --seed (it adds a few admins of its own):
+
+    DATABASE_URL=postgresql://.../homehelp_load python query_counts.py
+
+Lower a budget when an endpoint gets cheaper; raise one only with a reason.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+os.environ.setdefault("N_PLUS_ONE_DETECTION", "raise")
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from load_test import LOAD_PASSWORD, sample, sign_in  # noqa: E402
+
+CHECK_ADMINS = 6  # more than N_PLUS_ONE_THRESHOLD, so a per-admin lookup shows
+
+# (name, budget, function sending the request given the client and the sampled data)
+BUDGETS = [
+    ("POST /signin/", 2, lambda client, data: client.post("/signin/", data={
+        "email": data["homeowner"], "password": LOAD_PASSWORD, "role": "homeowners"
+    })),
+    ("POST /admin/login", 2, lambda client, data: client.post("/admin/login", json={
+        "email": data["admin"], "password": LOAD_PASSWORD
+    })),
+    ("GET /services/", 1, lambda client, data: client.get("/services/")),
+    ("GET /services/{id}", 1, lambda client, data: client.get(f"/services/{data['service']}")),
+    ("GET /services/search", 1, lambda client, data: client.get("/services/search", params={"q": "plumbing repair"})),
+    ("GET /bookings/ (homeowner)", 3, lambda client, data: client.get("/bookings/", headers=data["homeowner_headers"])),
+    ("GET /bookings/ (provider)", 3, lambda client, data: client.get("/bookings/", headers=data["provider_headers"])),
+    ("POST /bookings/", 5, lambda client, data: client.post("/bookings/", json={
+        "service_id": data["service"], "scheduled_date": (datetime.utcnow() + timedelta(days=3)).isoformat()
+    }, headers=data["homeowner_headers"])),
+    ("PATCH /bookings/{id}", 6, lambda client, data: client.patch(
+        f"/bookings/{data['booking']}", json={"new_status": "confirmed"}, headers=data["provider_headers"]
+    )),
+    ("GET /providers", 3, lambda client, data: client.get("/providers", headers=data["admin_headers"])),
+    ("GET /admins", 3, lambda client, data: client.get("/admins", headers=data["admin_headers"])),
+    ("GET /admin/registration-requests", 3, lambda client, data: client.get(
+        "/admin/registration-requests", params={"status": "pending"}, headers=data["admin_headers"]
+    )),
+]
+
+
+def ensure_admins(engine) -> list:
+    """Super admins signing in with LOAD_PASSWORD, created on the first run."""
+    from auth import hash_password
+
+    emails = [f"querycheck-admin-{i}@example.com" for i in range(CHECK_ADMINS)]
+    with engine.begin() as conn:
+        existing = set(conn.execute(
+            text("SELECT email FROM users WHERE email = ANY(:emails)"), {"emails": emails}
+        ).scalars().all())
+        password_hash = hash_password(LOAD_PASSWORD)
+        for email in emails:
+            if email in existing:
+                continue
+            user_id = conn.execute(text(
+                "INSERT INTO users (email, password_hash, full_name, role, is_active, created_at) "
+                "VALUES (:email, :password_hash, 'Query Check Admin', 'admin', TRUE, NOW()) RETURNING id"
+            ), {"email": email, "password_hash": password_hash}).scalar()
+            conn.execute(text("INSERT INTO admins (user_id, is_super_admin) VALUES (:user_id, TRUE)"), {"user_id": user_id})
+    return emails
+
+
+async def run(names) -> list:
+    from database import engine
+    from main import app
+    from principal_cache import principal_cache
+    from profiling import assert_max_queries
+    from response_cache import catalog_cache
+
+    homeowners, providers, services, provider_bookings, _, _ = sample(engine)
+    admins = ensure_admins(engine)
+    provider, booking = provider_bookings[0]
+    failures = []
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://query-check", timeout=60) as client:
+            data = {
+                "homeowner": homeowners[0],
+                "admin": admins[0],
+                "service": services[0],
+                "booking": booking,
+                "homeowner_headers": await sign_in(client, homeowners[0], "homeowners"),
+                "provider_headers": await sign_in(client, provider, "serviceproviders"),
+                "admin_headers": {"Authorization": "Bearer " + (await client.post(
+                    "/admin/login", json={"email": admins[0], "password": LOAD_PASSWORD}
+                )).json()["token"]},
+            }
+            for name, budget, send in BUDGETS:
+                if names and name not in names:
+                    continue
+                principal_cache.clear()
+                catalog_cache.clear()
+                try:
+                    with assert_max_queries(budget, name) as profiles:
+                        response = await send(client, data)
+                    count = sum(profile.statement_count for profile in profiles)
+                    if response.status_code >= 400:
+                        failures.append(name)
+                        print(f"FAIL  {name}: {response.status_code} {response.text[:300]}")
+                    else:
+                        print(f"ok    {name}: {count} of {budget} statements")
+                except AssertionError as e:
+                    failures.append(name)
+                    print(f"FAIL  {e}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help="Only check these endpoints, named as in the output")
+    args = parser.parse_args()
+
+    failures = asyncio.run(run(args.names))
+    print(f"{len(failures)} endpoints over budget or failing" if failures else "All endpoints within budget")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Latency benchmark for /services/search queries.
+
+Seeds synthetic services straight in Postgres (generate_series, so 1M rows
+take well under a minute), then times the exact query the endpoint runs.
+Point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=postgresql://... python search.py --seed 1000000
+    DATABASE_URL=postgresql://... python search.py --budget-ms 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "users_auth"))
+
+from sqlalchemy import text  # noqa: E402
+
+from database import engine, make_engine  # noqa: E402
+from migrations import migrate  # noqa: E402
+from search import search_services_query  # noqa: E402
+
+TRADES = ["Plumbing", "Electrical", "Painting", "Cleaning", "Landscaping", "Roofing", "Carpentry",
+          "Handyman", "Moving", "Tiling", "Flooring", "Pest control", "Appliance repair", "Concrete"]
+ADJECTIVES = ["Emergency", "Affordable", "Premium", "Same-day", "Residential", "Eco-friendly",
+              "Licensed", "Weekend", "Deep", "Quick", "Professional", "Custom"]
+TASKS = ["repair", "installation", "maintenance", "inspection", "renovation", "service",
+         "replacement", "cleanup", "upgrade", "consultation"]
+NAMES = ["Abebe", "Sara", "Dawit", "Hana", "Yonas", "Meron", "Kebede", "Liya", "Samuel", "Tigist"]
+
+QUERIES = ["plumb", "electrical repair", "emergency", "paint", "deep clean", "roof insp",
+           "licensed carpentry", "abebe", "tiling install", "weekend moving", "pest", "eco land",
+           # No matches among the best-rated services, so it goes through the full-text index
+           "zebra"]
+
+
+def sql_array(words):
+    return "ARRAY[" + ", ".join("'" + w.replace("'", "''") + "'" for w in words) + "]"
+
+
+def pick(words):
+    return f"({sql_array(words)})[1 + floor(random() * {len(words)})::int]"
+
+
+def seed(count: int):
+    # Index builds outlast the API's statement timeout
+    migration_engine = make_engine(statement_timeout_ms=0, pool_size=1)
+    try:
+        migrate(migration_engine)
+    finally:
+        migration_engine.dispose()
+    with engine.begin() as conn:
+        # Bulk insert of a large catalog outlasts the API's statement timeout
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        provider_id = conn.execute(text("SELECT id FROM serviceproviders LIMIT 1")).scalar()
+        if provider_id is None:
+            user_id = conn.execute(text(
+                "INSERT INTO users (email, password_hash, full_name, role, is_active, created_at) "
+                "VALUES ('bench-provider@example.com', 'x', 'Bench Provider', 'serviceproviders', TRUE, NOW()) "
+                "RETURNING id"
+            )).scalar()
+            provider_id = conn.execute(text(
+                "INSERT INTO serviceproviders (user_id, is_verified) VALUES (:user_id, TRUE) RETURNING id"
+            ), {"user_id": user_id}).scalar()
+
+        started = time.perf_counter()
+        conn.execute(text(f"""
+            INSERT INTO services (provider_id, title, description, price, image, rating, provider_name, created_at, is_active)
+            SELECT
+                :provider_id,
+                {pick(ADJECTIVES)} || ' ' || {pick(TRADES)} || ' ' || {pick(TASKS)},
+                'Reliable ' || lower({pick(TRADES)}) || ' ' || {pick(TASKS)} || ' for homes and offices, '
+                    || 'booked and paid through HomeHelp Connect. Job #' || g,
+                (random() * 500)::int,
+                '/placeholder-service.jpg',
+                (random() * 5)::int,
+                {pick(NAMES)} || ' ' || {pick(TRADES)},
+                NOW() - random() * interval '365 days',
+                random() > 0.05
+            FROM generate_series(1, :count) AS g
+        """), {"provider_id": provider_id, "count": count})
+        print(f"inserted {count} services in {time.perf_counter() - started:.1f}s")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        conn.execute(text("ANALYZE services"))
+
+
+def run(iterations: int, limit: int):
+    results = {}
+    with engine.connect() as conn:
+        total = conn.execute(text("SELECT count(*) FROM services")).scalar()
+        print(f"{total} services")
+        for q in QUERIES:
+            query = search_services_query(q, limit)
+            conn.execute(query).all()  # warm the cache
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                conn.execute(query).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[q] = {
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(timings[int(0.95 * (len(timings) - 1))], 2),
+                "max_ms": round(timings[-1], 2),
+            }
+            print(f"  {q!r:24} {results[q]}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Insert this many synthetic services first")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="Fail if any query's p95 exceeds this")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.seed)
+    results = run(args.iterations, args.limit)
+
+    over = {q: r for q, r in results.items() if r["p95_ms"] > args.budget_ms}
+    if over:
+        print(f"over the {args.budget_ms} ms budget: {', '.join(over)}")
+        sys.exit(1)
+    print(f"all queries within {args.budget_ms} ms (p95)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Cold start time of an API worker: importing main plus the lifespan startup,
+each measured in a fresh interpreter, against the configured database:
+
+    DATABASE_URL=postgresql://... python startup.py --runs 5 --budget-ms 2000
+
+Set STARTUP_PREWARM=1 to include waiting for the suggestion index and the
+connection pools. Exits non-zero if the median exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+USERS_AUTH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "users_auth")
+
+# Runs in the child: time the import, then enter and leave the lifespan
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+    return ready
+
+ready = asyncio.run(run())
+print("STARTUP " + json.dumps({"import_ms": (imported - started) * 1000, "startup_ms": (ready - imported) * 1000}))
+"""
+
+
+def measure() -> dict:
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=USERS_AUTH, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise RuntimeError(f"worker failed to start:\n{result.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "2000")),
+                        help="Fail if the median import + startup exceeds this")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    for name in ("import_ms", "startup_ms"):
+        values = [run[name] for run in runs]
+        print(f"{name:<11} median {statistics.median(values):7.1f}  max {max(values):7.1f}")
+    total = statistics.median(run["import_ms"] + run["startup_ms"] for run in runs)
+    print(f"total       median {total:7.1f}  budget {args.budget_ms:.0f}")
+    if total > args.budget_ms:
+        print("over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Build time, per-keystroke latency and per-write update time of the
+/services/suggest index.
+
+Loads the in-memory index from the services in DATABASE_URL (seed a large
+catalog first with search.py --seed) and replays typing each query one
+character at a time. --services N instead indexes N generated services whose
+titles are all distinct, as in a real catalog, which is what a rebuild's
+cost depends on (generated catalogs repeat a few titles); no database needed:
+
+    DATABASE_URL=postgresql://... python suggest.py
+    python suggest.py --services 500000 --rebuild-budget-s 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "users_auth"))
+
+from suggest import suggest_index  # noqa: E402
+
+QUERIES = ["plumbing repair", "emergency electrical", "abebe", "deep cleaning", "licensed roofing inspection",
+           "pest control", "weekend moving service", "tiling", "eco-friendly landscaping", "zzz"]
+
+ADJECTIVES = ["Emergency", "Affordable", "Premium", "Same-day", "Residential", "Eco-friendly", "Licensed",
+              "Weekend", "Deep", "Quick", "Professional", "Custom", "Reliable", "Trusted", "Expert", "Local"]
+TRADES = ["Plumbing", "Electrical", "Painting", "Cleaning", "Landscaping", "Roofing", "Carpentry", "Handyman",
+          "Moving", "Tiling", "Flooring", "Pest control", "Appliance repair", "Concrete", "Glazing", "Welding"]
+TASKS = ["repair", "installation", "maintenance", "inspection", "renovation", "service", "replacement",
+         "cleanup", "upgrade", "consultation"]
+NAMES = ["Abebe", "Sara", "Dawit", "Hana", "Yonas", "Meron", "Kebede", "Liya", "Samuel", "Tigist",
+         "Almaz", "Daniel", "Helen", "Naomi", "Selam", "Solomon", "Yared", "Zewdu", "Amara", "Mulugeta"]
+AREAS = ["Bole", "Piassa", "Kazanchis", "Megenagna", "Sarbet", "Gerji", "Ayat", "CMC", "Lebu", "Kality",
+         "Adama", "Hawassa", "Bahir Dar", "Gondar", "Mekelle", "Dire Dawa"]
+
+
+def synthetic_rows(count: int, seed: int = 1):
+    """(id, title, provider_name) rows; every title is distinct, providers offer about 25 services each."""
+    rng = random.Random(seed)
+    providers = [f"{rng.choice(NAMES)} {rng.choice(NAMES)}sson {rng.choice(TRADES)} {i}" for i in range(count // 25 + 1)]
+    return [
+        (i, f"{rng.choice(ADJECTIVES)} {rng.choice(TRADES)} {rng.choice(TASKS)} in {rng.choice(AREAS)} no {i}",
+         rng.choice(providers))
+        for i in range(1, count + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=3.0, help="Fail if p99 exceeds this")
+    parser.add_argument("--services", type=int, help="Index this many generated services with distinct titles")
+    parser.add_argument("--rebuild-budget-s", type=float, help="Fail if building the index takes longer")
+    parser.add_argument("--writes", type=int, default=200, help="Time this many service title changes")
+    args = parser.parse_args()
+
+    if args.services:
+        rows = synthetic_rows(args.services)
+        started = time.perf_counter()
+        suggest_index.rebuild(rows)
+        count = len(rows)
+    else:
+        from database import SessionLocal
+        from suggest import load_suggest_index
+
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            count = load_suggest_index(db)
+        finally:
+            db.close()
+    rebuild_s = time.perf_counter() - started
+    print(f"indexed {count} services ({len(suggest_index)} distinct suggestions) in {rebuild_s:.1f}s")
+    failed = args.rebuild_budget_s is not None and rebuild_s > args.rebuild_budget_s
+    if failed:
+        print(f"rebuild over the {args.rebuild_budget_s} s budget")
+
+    timings = []
+    for _ in range(args.rounds):
+        for query in QUERIES:
+            for end in range(1, len(query) + 1):
+                started = time.perf_counter()
+                suggest_index.suggest(query[:end])
+                timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(0.99 * (len(timings) - 1))]
+    print(f"{len(timings)} keystrokes: p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {timings[-1]:.3f} ms")
+    if p99 > args.budget_ms:
+        print(f"p99 over the {args.budget_ms} ms budget")
+        failed = True
+
+    # Writes are applied in place, as create_service/update_service and the sync do
+    rng = random.Random(2)
+    service_ids = list(suggest_index._services)
+    writes = []
+    for i in range(min(args.writes, len(service_ids))):
+        started = time.perf_counter()
+        suggest_index.upsert(rng.choice(service_ids), f"{rng.choice(ADJECTIVES)} {rng.choice(TRADES)} update {i}",
+                             rng.choice(NAMES))
+        writes.append((time.perf_counter() - started) * 1000)
+    if writes:
+        writes.sort()
+        print(f"{len(writes)} writes: p50 {writes[len(writes) // 2]:.3f} ms, "
+              f"p99 {writes[int(0.99 * (len(writes) - 1))]:.3f} ms, max {writes[-1]:.3f} ms")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Fixtures for tests that run the app in-process against a scratch Postgres
+database (DATABASE_URL); migrations are applied and the accounts the tests
+need are added on first use. Without a reachable database those tests skip;
+the unit tests (caches, cursors, ranges, typeahead, FAQ, circuit breaker,
+replica routing) need no database and always run:
+
+    DATABASE_URL=postgresql://.../homehelp_test python -m pytest -q tests
+"""
+import os
+import sys
+
+os.environ.setdefault("CHAT_MODEL_CLIENT", "fake")
+# A lazy load per row fails the request, even within its query budget
+os.environ.setdefault("N_PLUS_ONE_DETECTION", "raise")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "users_auth"))
+
+import pytest  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+TEST_PASSWORD = "test-password"
+# More than N_PLUS_ONE_THRESHOLD of each, so a per-row lookup shows
+TEST_ADMINS = 6
+TEST_PROVIDERS = 6
+
+
+def ensure_users(engine, role: str, count: int) -> list:
+    """Active users with TEST_PASSWORD: super admins or verified providers, created on the first run."""
+    from auth import hash_password
+
+    emails = [f"test-{role}-{i}@example.com" for i in range(count)]
+    with engine.begin() as conn:
+        existing = set(conn.execute(
+            text("SELECT email FROM users WHERE email = ANY(:emails)"), {"emails": emails}
+        ).scalars().all())
+        password_hash = hash_password(TEST_PASSWORD)
+        for email in emails:
+            if email in existing:
+                continue
+            user_id = conn.execute(text(
+                "INSERT INTO users (email, password_hash, full_name, role, is_active, created_at) "
+                "VALUES (:email, :password_hash, 'Test User', :role, TRUE, NOW()) RETURNING id"
+            ), {"email": email, "password_hash": password_hash, "role": role}).scalar()
+            if role == "admin":
+                conn.execute(text("INSERT INTO admins (user_id, is_super_admin) VALUES (:user_id, TRUE)"), {"user_id": user_id})
+            else:
+                conn.execute(text(
+                    "INSERT INTO serviceproviders (user_id, business_name, is_verified, verification_date) "
+                    "VALUES (:user_id, 'Test Business', TRUE, NOW())"
+                ), {"user_id": user_id})
+    return emails
+
+
+@pytest.fixture(scope="session")
+def client():
+    from database import make_engine
+    from migrations import migrate
+
+    # Index builds may run past the API's statement timeout
+    setup_engine = make_engine(statement_timeout_ms=0, application_name="homehelp-tests", pool_size=1)
+    try:
+        migrate(setup_engine)
+        ensure_users(setup_engine, "serviceproviders", TEST_PROVIDERS)
+        ensure_users(setup_engine, "admin", TEST_ADMINS)
+    except OperationalError as e:
+        pytest.skip(f"No database to test against: {e.orig}")
+    finally:
+        setup_engine.dispose()
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client) -> dict:
+    response = client.post("/admin/login", json={"email": "test-admin-0@example.com", "password": TEST_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture
+def max_queries():
+    """
+    profiling.assert_max_queries with the principal and catalog caches cold,
+    so a budget counts the lookups a first request pays for:
+
+        with max_queries(3, "GET /providers"):
+            client.get("/providers", headers=admin_headers)
+    """
+    from principal_cache import principal_cache
+    from profiling import assert_max_queries
+    from response_cache import catalog_cache
+
+    principal_cache.clear()
+    catalog_cache.clear()
+    return assert_max_queries
@@ -0,0 +1,65 @@
+# Replica selection and read-your-writes markers; replicas are never connected to.
+import pytest
+
+import db_routing
+from db_routing import REPLICA_MAX_LAG_SECONDS, ReplicaRouter, wrote_recently, write_marker
+
+
+@pytest.fixture
+def router():
+    router = ReplicaRouter(["sqlite://", "sqlite://", "sqlite://"])
+    for replica in router.replicas:
+        replica.lag = 0.0
+    return router
+
+
+def test_round_robin_over_usable_replicas(router):
+    picked = [router.pick("catalog") for _ in range(6)]
+    assert picked == router.replicas * 2
+    assert (router.replica_reads, router.primary_reads) == (6, 0)
+
+
+def test_lagging_or_unreachable_replicas_are_skipped(router):
+    router.replicas[0].lag = REPLICA_MAX_LAG_SECONDS + 1
+    router.replicas[1].lag = None
+    assert {router.pick() for _ in range(4)} == {router.replicas[2]}
+
+
+def test_primary_when_no_replica_is_usable(router):
+    for replica in router.replicas:
+        replica.lag = None
+    assert router.pick() is None
+    assert router.primary_reads == 1
+    assert ReplicaRouter([]).pick() is None
+
+
+def test_pinned_reads_go_to_the_primary(router):
+    assert router.pick(pinned=True) is None
+    assert router.pick() is not None
+
+
+def test_written_scope_stays_on_the_primary(router):
+    router.note_write("catalog")
+    assert router.pick("catalog") is None
+    assert router.pick("bookings") is not None
+
+
+def test_write_marker_expires():
+    assert wrote_recently(write_marker())
+    assert not wrote_recently(write_marker(now=0))
+
+
+@pytest.mark.parametrize("marker", [None, "", "garbage", "9999999999", "9999999999.deadbeef", ".abc"])
+def test_forged_markers_are_ignored(marker):
+    assert not wrote_recently(marker)
+
+
+def test_marker_deadline_cannot_be_extended():
+    until, signature = write_marker().split(".")
+    assert not wrote_recently(f"{int(until) + 3600}.{signature}")
+
+
+def test_marker_is_tied_to_the_secret(monkeypatch):
+    marker = write_marker()
+    monkeypatch.setattr(db_routing, "SECRET_KEY", "another secret")
+    assert not wrote_recently(marker)
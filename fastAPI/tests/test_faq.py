@@ -0,0 +1,40 @@
+# FAQ matching thresholds; no database needed.
+from faq import FAQ_ENTRIES, FOLLOW_UP, FaqIndex
+
+BOOKING = next(entry for entry in FAQ_ENTRIES if "How do I book a service?" in entry["questions"])
+
+
+def test_known_question_is_answered():
+    index = FaqIndex(FAQ_ENTRIES, min_score=0.55)
+    assert index.answer("How do I book a service?") == BOOKING["answer"] + FOLLOW_UP
+
+
+def test_rephrased_question_still_matches():
+    index = FaqIndex(FAQ_ENTRIES, min_score=0.55)
+    assert index.answer("Booking a service") == BOOKING["answer"] + FOLLOW_UP
+    assert index.answer("how do i book?") == BOOKING["answer"] + FOLLOW_UP
+
+
+def test_unrelated_question_goes_to_the_model():
+    index = FaqIndex(FAQ_ENTRIES, min_score=0.55)
+    assert index.answer("Which paint colour suits a north facing kitchen?") is None
+    assert index.answer("") is None
+
+
+def test_threshold_decides():
+    index = FaqIndex(FAQ_ENTRIES, min_score=0.55)
+    question = "booking for my kitchen sink plumbing tomorrow morning"
+    _, score = index.best_match(question)
+    assert 0 < score < 1
+    assert index.answer(question, min_score=score) is not None
+    assert index.answer(question, min_score=score + 0.01) is None
+    # Above any cosine: everything goes to the model
+    assert FaqIndex(FAQ_ENTRIES, min_score=1.01).answer("How do I book a service?") is None
+
+
+def test_stats_count_hits():
+    index = FaqIndex(FAQ_ENTRIES, min_score=0.55)
+    index.answer("How do I book a service?")
+    index.answer("Which paint colour suits a north facing kitchen?")
+    stats = index.stats()
+    assert (stats["lookups"], stats["hits"], stats["hit_rate"]) == (2, 1, 0.5)
@@ -0,0 +1,30 @@
+# Range header parsing; no database needed.
+import pytest
+
+from file_serving import parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=900-2000", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=0-0 ", (0, 0)),
+    # Several ranges, other units or garbage: send the whole file
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=-", None),
+    ("bytes=a-b", None),
+    ("bytes=1000-", "unsatisfiable"),
+    ("bytes=500-100", "unsatisfiable"),
+    ("bytes=-0", "unsatisfiable"),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_parse_range_of_empty_file():
+    assert parse_range("bytes=0-", 0) == "unsatisfiable"
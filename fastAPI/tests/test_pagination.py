@@ -0,0 +1,34 @@
+# Keyset cursor encoding; no database needed.
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    values = (datetime(2025, 3, 1, 12, 30, 5, 123456), 42)
+    assert decode_cursor(encode_cursor(*values), datetime, int) == list(values)
+
+
+def test_cursor_keeps_null_sort_keys():
+    assert decode_cursor(encode_cursor(None, 7), datetime, int) == [None, 7]
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor("a?b/c+d", 10 ** 12)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor, str, int) == ["a?b/c+d", 10 ** 12]
+
+
+@pytest.mark.parametrize("cursor, types", [
+    ("not a cursor", (datetime, int)),
+    (encode_cursor("yesterday", 1), (datetime, int)),
+    (encode_cursor(1, 2, 3), (datetime, int)),
+    (encode_cursor("x", 1), (int, int)),
+])
+def test_bad_cursor_is_a_400(cursor, types):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, *types)
+    assert error.value.status_code == 400
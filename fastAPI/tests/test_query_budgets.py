@@ -0,0 +1,16 @@
+# SQL statement budgets for admin listings; keep them in line with
+# benchmarks/query_counts.py, which checks every endpoint on a large dataset.
+
+
+def test_providers_query_budget(client, admin_headers, max_queries):
+    with max_queries(3, "GET /providers"):
+        response = client.get("/providers", params={"limit": 50}, headers=admin_headers)
+    assert response.status_code == 200
+    assert len(response.json()) >= 6
+
+
+def test_admins_query_budget(client, admin_headers, max_queries):
+    with max_queries(3, "GET /admins"):
+        response = client.get("/admins", headers=admin_headers)
+    assert response.status_code == 200
+    assert len(response.json()) >= 6
@@ -0,0 +1,171 @@
+# Plan regression checks for the hot queries: each one is EXPLAINed the way
+# the endpoint runs it and fails if it reads a hot table with a sequential scan
+# or misses the index it was designed around. Sequential scans are disabled
+# while planning, so a query only gets one if no index can serve it. Each query
+# is planned twice, with its parameter values (custom plan, as psycopg2 sends
+# them) and as a generic prepared statement (as asyncpg reuses them), because a
+# generic plan cannot use a partial index whose predicate depends on a parameter.
+import json
+import re
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, func, literal, text
+
+from models import Booking, BookingStatus, ProviderRegistrationRequest, RegistrationStatus, Service
+from pagination import after_nulls_last, keyset_page, nulls_last_order
+from search import search_services_query
+
+HOT_TABLES = {"bookings", "provider_registration_requests", "services"}
+# The planner only picks indexes sensibly with statistics from real-sized
+# tables, so a smaller database is topped up to this many bookings first
+PLAN_TEST_BOOKINGS = 200000
+
+
+def bookings_query():
+    """The projection GET /bookings/ pages through."""
+    return (
+        select(
+            Booking.id, Booking.service_id, Booking.homeowner_id, Booking.booking_date, Booking.status,
+            Booking.scheduled_date, Booking.completed_date,
+            func.coalesce(Service.title, "Unknown Service").label("service_title"),
+            func.coalesce(Service.provider_name, "Unknown Provider").label("provider_name"),
+        )
+        .outerjoin(Service, Service.id == Booking.service_id)
+    )
+
+
+def bookings_page(query, cursor=None):
+    if cursor:
+        query = query.where(after_nulls_last(Booking.scheduled_date, Booking.id, *cursor))
+    return keyset_page(query, Booking.scheduled_date, Booking.id, 100)
+
+
+def catalog_page(column, descending, cursor=None):
+    """A page of GET /services/ sorted on `column`."""
+    query = select(Service).where(Service.is_active == True)  # noqa: E712
+    if cursor:
+        query = query.where(after_nulls_last(column, Service.id, *cursor, descending))
+    return query.order_by(*nulls_last_order(column, Service.id, descending)).limit(21)
+
+
+def registration_requests(status=None):
+    query = select(ProviderRegistrationRequest)
+    if status:
+        query = query.where(ProviderRegistrationRequest.status == status)
+    return query.order_by(ProviderRegistrationRequest.requested_at.desc())
+
+
+# (name, statement, index names any of which the plan must use)
+HOT_QUERIES = [
+    ("bookings: homeowner", lambda: bookings_page(bookings_query().where(Booking.homeowner_id == 42)),
+     {"ix_bookings_homeowner_scheduled_nulls_last"}),
+    ("bookings: homeowner, next page",
+     lambda: bookings_page(bookings_query().where(Booking.homeowner_id == 42), (datetime(2025, 1, 1), 1000)),
+     {"ix_bookings_homeowner_scheduled_nulls_last"}),
+    ("bookings: homeowner, unscheduled page",
+     lambda: bookings_page(bookings_query().where(Booking.homeowner_id == 42), (None, 1000)),
+     {"ix_bookings_homeowner_scheduled_nulls_last"}),
+    ("bookings: homeowner by status",
+     lambda: bookings_page(bookings_query().where(Booking.homeowner_id == 42, Booking.status == BookingStatus.PENDING.value)),
+     {"ix_bookings_homeowner_scheduled_nulls_last", "ix_bookings_status_scheduled_nulls_last"}),
+    ("bookings: provider", lambda: bookings_page(bookings_query().where(Service.provider_id == 7)),
+     {"ix_bookings_service_scheduled_nulls_last"}),
+    ("bookings: admin by status",
+     lambda: bookings_page(bookings_query().where(Booking.status == BookingStatus.CONFIRMED.value)),
+     {"ix_bookings_status_scheduled_nulls_last"}),
+    ("bookings: admin", lambda: bookings_page(bookings_query()), {"ix_bookings_scheduled_nulls_last"}),
+    ("registration requests: pending", lambda: registration_requests(RegistrationStatus.PENDING.value),
+     {"ix_registration_requests_status_requested"}),
+    ("registration requests: all", lambda: registration_requests(), {"ix_registration_requests_requested"}),
+    ("signin: pending request for email", lambda: select(ProviderRegistrationRequest).where(
+        ProviderRegistrationRequest.email == "someone@example.com",
+        ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
+    ), {"provider_registration_requests_email_key"}),
+    ("catalog: newest", lambda: catalog_page(Service.created_at, True), {"ix_services_active_created_nulls_last"}),
+    ("catalog: newest, next page", lambda: catalog_page(Service.created_at, True, (datetime(2025, 1, 1), 1000)),
+     {"ix_services_active_created_nulls_last"}),
+    ("catalog: cheapest", lambda: catalog_page(Service.price, False), {"ix_services_active_price_nulls_last"}),
+    ("catalog: priciest, unpriced page", lambda: catalog_page(Service.price, True, (None, 1000)),
+     {"ix_services_active_price_desc_nulls_last"}),
+    ("catalog: top rated", lambda: catalog_page(Service.rating, True), {"ix_services_active_rating_nulls_last"}),
+    ("catalog: provider", lambda: select(Service).where(Service.provider_id == 7)
+     .order_by(Service.created_at.desc()), {"ix_services_provider_created"}),
+    # Reads the best-rated window, falling back to the full-text index for rare terms
+    ("search", lambda: search_services_query("plumbing repair", 20),
+     {"ix_services_active_rating_nulls_last", "ix_services_search"}),
+]
+
+
+def as_prepared(statement, dialect):
+    """The statement as `PREPARE` text with $n parameters, and the SQL literals to EXECUTE it with."""
+    compiled = statement.compile(dialect=dialect)
+    names = []
+
+    def placeholder(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    sql = re.sub(r"%\((\w+)\)s", placeholder, compiled.string).replace("%%", "%")
+    values = [
+        str(literal(compiled.params[name], compiled.binds[name].type)
+            .compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        for name in names
+    ]
+    return sql, values
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(conn, sql, values, mode):
+    conn.execute(text(f"SET plan_cache_mode = {mode}"))
+    conn.exec_driver_sql(f"PREPARE hot_query AS {sql}")
+    try:
+        arguments = f"({', '.join(values)})" if values else ""
+        result = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) EXECUTE hot_query{arguments}").scalar()
+    finally:
+        conn.exec_driver_sql("DEALLOCATE hot_query")
+    return (json.loads(result) if isinstance(result, str) else result)[0]["Plan"]
+
+
+@pytest.fixture(scope="module")
+def plan_conn(client):
+    from database import engine, make_engine
+    from datagen import generate
+
+    with engine.connect() as conn:
+        bookings = conn.execute(text("SELECT count(*) FROM bookings")).scalar()
+    if bookings < PLAN_TEST_BOOKINGS:
+        # Bulk inserts outlast the API's statement timeout
+        seed_engine = make_engine(statement_timeout_ms=0, application_name="homehelp-tests", pool_size=1)
+        try:
+            count = PLAN_TEST_BOOKINGS - bookings
+            generate(seed_engine, users=count // 50 + count // 500 + 2, providers=count // 500 + 1,
+                     services=count // 2 + 1, bookings=count, requests=count // 20 + 1, prefix="plan", seed=1)
+            with seed_engine.connect() as conn:
+                conn.execute(text("ANALYZE"))
+                conn.commit()
+        finally:
+            seed_engine.dispose()
+
+    with engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        yield conn
+        conn.rollback()
+
+
+@pytest.mark.parametrize("name, build, expected_indexes", HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+def test_hot_query_uses_its_index(plan_conn, name, build, expected_indexes):
+    sql, values = as_prepared(build(), plan_conn.dialect)
+    for mode in ("force_custom_plan", "force_generic_plan"):
+        nodes = list(plan_nodes(explain(plan_conn, sql, values, mode)))
+        seq_scans = sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in HOT_TABLES})
+        used = {n["Index Name"] for n in nodes if "Index Name" in n}
+        assert not seq_scans, f"{mode} plan of {name} scans {', '.join(seq_scans)} sequentially"
+        assert used & expected_indexes, f"{mode} plan of {name} uses {sorted(used) or 'no index'}, expected one of {sorted(expected_indexes)}"
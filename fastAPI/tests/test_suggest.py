@@ -0,0 +1,77 @@
+# The in-memory typeahead index; no database needed.
+import random
+
+import pytest
+
+import suggest
+from suggest import PrefixIndex
+
+
+def texts(results):
+    return [result["text"] for result in results]
+
+
+def test_prefix_of_any_word_matches():
+    index = PrefixIndex()
+    index.rebuild([(1, "Emergency Plumbing Repair", "Abebe Kebede"), (2, "House Painting", "Sara Tesfaye")])
+    assert texts(index.suggest("plu")) == ["Emergency Plumbing Repair"]
+    assert texts(index.suggest("keb")) == ["Abebe Kebede"]
+    assert index.suggest("zzz") == [] and index.suggest("  ") == []
+
+
+def test_ranks_by_service_count_then_alphabetically():
+    index = PrefixIndex()
+    index.rebuild([(1, "Pest Control", None), (2, "Painting", None), (3, "Painting", None), (4, "Plumbing", None)])
+    assert index.suggest("p") == [
+        {"text": "Painting", "type": "service", "count": 2},
+        {"text": "Pest Control", "type": "service", "count": 1},
+        {"text": "Plumbing", "type": "service", "count": 1},
+    ]
+
+
+def test_whole_phrase_matches_come_first():
+    index = PrefixIndex()
+    index.rebuild([(1, "Deep Cleaning", None), (2, "Cleaning Deep Fryers", None), (3, "Cleaning Deep Fryers", None)])
+    assert texts(index.suggest("deep cl")) == ["Deep Cleaning", "Cleaning Deep Fryers"]
+    assert texts(index.suggest("cle")) == ["Cleaning Deep Fryers", "Deep Cleaning"]
+
+
+def test_upsert_moves_and_removes_services():
+    index = PrefixIndex()
+    index.upsert(1, "Roof Repair", "Dawit")
+    index.upsert(2, "Roof Repair", "Dawit")
+    assert index.suggest("roof")[0]["count"] == 2
+    index.upsert(2, "Window Repair", "Dawit")
+    assert index.suggest("roof")[0]["count"] == 1
+    assert texts(index.suggest("win")) == ["Window Repair"]
+    index.upsert(1, "Roof Repair", "Dawit", is_active=False)
+    assert index.suggest("roof") == []
+    assert texts(index.suggest("dawit")) == ["Dawit"]
+
+
+WORDS = ["plumb", "plumbing", "pl", "paint", "painter", "pest", "deep", "de", "clean", "cleaning",
+         "abebe", "a", "ab", "roof"]
+PROVIDERS = ["Abebe Plumbing", "Sara Paint", "Dawit", None]
+QUERIES = ["p", "pl", "plumb", "de", "a", "clean", "pl de", "abebe pl", "r", "x", "paint pest"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_updates_match_a_rebuild(monkeypatch, seed):
+    # Short lists, so truncated lists and their refills are exercised too
+    monkeypatch.setattr(suggest, "SUGGEST_TOP_K", 4)
+    rng = random.Random(seed)
+    index, services = PrefixIndex(), {}
+    for step in range(1500):
+        service_id = rng.randint(1, 40)
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        provider, active = rng.choice(PROVIDERS), rng.random() > 0.15
+        index.upsert(service_id, title, provider, active)
+        if active:
+            services[service_id] = (title, provider)
+        else:
+            services.pop(service_id, None)
+        if step % 100 == 99:
+            rebuilt = PrefixIndex()
+            rebuilt.rebuild([(service_id, *row) for service_id, row in services.items()])
+            for query in QUERIES:
+                assert index.suggest(query, 5) == rebuilt.suggest(query, 5), (step, query)
@@ -0,0 +1,80 @@
+# TTLCache expiry and LRU eviction, on a fake clock; no database needed.
+import pytest
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ttl_cache, "time", fake)
+    return fake
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(ttl=10, max_size=10)
+    cache.set("a", 1)
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    clock.now += 0.2
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+    assert cache.stats()["expired"] == 1
+
+
+def test_sliding_expiry_restarts_on_read(clock):
+    cache = TTLCache(ttl=10, max_size=10, sliding=True)
+    cache.set("a", 1)
+    for _ in range(3):
+        clock.now += 8
+        assert cache.get("a") == 1
+    clock.now += 11
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_is_evicted_first(clock):
+    cache = TTLCache(ttl=10, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_purge_expired_stops_at_first_live_entry(clock):
+    cache = TTLCache(ttl=10, max_size=10)
+    cache.set("old", 1)
+    clock.now += 5
+    cache.set("new", 2)
+    clock.now += 6
+    assert cache.purge_expired() == 1
+    assert cache.get("new") == 2
+
+
+def test_zero_ttl_disables_the_cache(clock):
+    cache = TTLCache(ttl=0, max_size=10)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_discard_and_stats(clock):
+    cache = TTLCache(ttl=10, max_size=10)
+    for key in ("user:1", "user:2", "provider:1"):
+        cache.set(key, key)
+    assert cache.discard(lambda key: key.startswith("user:")) == 2
+    assert cache.get("provider:1") == "provider:1"
+    assert cache.get("user:1") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
@@ -1,36 +1,59 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from jose import jwt
-
-
-from fastapi import status
-from typing import Union
+import asyncio
+import calendar
+import os
+import threading
+import time
+import uuid
 
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
 from typing import Optional
 
-from database import get_db
-from models import User, UserRole, Admin, ServiceProvider, HomeOwner
+from database import get_async_db
+from models import User, UserRole, Admin, ServiceProvider, HomeOwner, RevokedToken
+from principal_cache import principal_cache, claims_are_current
+from profiling import timed
+from schemas import Principal, ProviderProfile
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="signin")
 
-# Update your auth.py to handle roles
-def create_access_token(data: dict, role: str):
-    to_encode = data.copy()
-    # Include role in the token payload
-    to_encode.update({"role": role})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+# The one key every token is signed and checked with
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "mysecret")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+# Opt-in: embed profile ids and verification/super-admin flags in access
+# tokens so the hot homeowner/provider routes authorize without a lookup
+EMBED_PROFILE_CLAIMS = os.getenv("JWT_EMBED_PROFILE_CLAIMS", "0").lower() in ("1", "true", "yes")
+PROFILE_CLAIMS_VERSION = 2
 
-SECRET_KEY = "mysecret"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Changing BCRYPT_ROUNDS makes every existing hash "need update", so it gets
+# transparently rehashed at the new cost the next time its owner logs in
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", "4"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "64"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt releases the GIL, so a small dedicated thread pool keeps hashing off
+# the event loop without competing with the threadpool used for sync routes
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_POOL_SIZE, thread_name_prefix="password")
+_pending_password_jobs = 0
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -38,65 +61,234 @@ def hash_password(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def _run_password_job(func, *args):
+    global _pending_password_jobs
+    # Shed load instead of queueing without bound during login storms
+    if _pending_password_jobs >= PASSWORD_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _pending_password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with timed("bcrypt"):
+            return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _pending_password_jobs -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job(hash_password, password)
 
-async def get_current_admin_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password(plain_password, hashed_password):
+    """Returns (is_valid, new_hash); new_hash is None unless the stored hash is outdated."""
+    return await _run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def release_connection(db, *instances):
+    """
+    Ends the session's transaction so its connection goes back to the pool
+    while bcrypt runs, which can take seconds when the password pool is busy.
+    `instances` are detached first and stay readable; the session checks out
+    a connection again on its next statement.
+    """
+    for instance in instances:
+        if instance is not None:
+            db.expunge(instance)
+    await db.rollback()
+
+async def save_password_hash(db, model, row_id: int, new_hash: str):
+    """Stores a rehashed password for a row released by release_connection."""
+    await db.execute(update(model).where(model.id == row_id).values(password_hash=new_hash))
+    await db.commit()
+
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+# Revoked token ids are stored in revoked_tokens so every worker honours a
+# logout or a rotated refresh token. Each worker also keeps the ids it knows
+# about in memory, mapped to their expiry, so access tokens are checked
+# without a query: its own revocations plus the ones sync_revoked_tokens pulls
+# in every REVOCATION_SYNC_SECONDS. Refresh tokens are always checked against
+# the table. Rows and entries are dropped once the token would have expired.
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "10"))
+_revoked_tokens = {}
+_revoked_lock = threading.Lock()
+_revocations_synced_to = None
+
+def _remember_revoked(entries):
+    now = time.time()
+    with _revoked_lock:
+        _revoked_tokens.update(entries)
+        for expired in [key for key, exp in _revoked_tokens.items() if exp < now]:
+            del _revoked_tokens[expired]
+
+async def revoke_token(db, payload: dict) -> bool:
+    """Records the token as revoked; False if it already was (or cannot be revoked)."""
+    jti = payload.get("jti")
+    if not jti:
+        return False
+    expires_at = payload.get("exp", time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    _remember_revoked({jti: expires_at})
+    now = datetime.utcnow()
+    # The primary key makes rotation single use even across workers
+    inserted = await db.execute(
+        pg_insert(RevokedToken)
+        .values(jti=jti, expires_at=datetime.utcfromtimestamp(expires_at), revoked_at=now)
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
     )
-    
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+    await db.commit()
+    return inserted.rowcount == 1
+
+def is_token_revoked(jti: Optional[str]) -> bool:
+    """Whether this worker knows the token is revoked (see sync_revoked_tokens)."""
+    with _revoked_lock:
+        return jti is not None and jti in _revoked_tokens
+
+def sync_revoked_tokens(db) -> int:
+    """Pulls revocations made by other workers into memory; returns how many were read."""
+    global _revocations_synced_to
+    query = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at).where(
+        RevokedToken.expires_at > datetime.utcnow()
+    )
+    if _revocations_synced_to is not None:
+        # Overlap the previous sync: workers' clocks and commit order differ a little
+        query = query.where(RevokedToken.revoked_at > _revocations_synced_to - timedelta(minutes=1))
+    rows = db.execute(query).all()
+    _remember_revoked({jti: calendar.timegm(expires_at.utctimetuple()) for jti, expires_at, _ in rows})
+    if rows:
+        newest = max(revoked_at for _, _, revoked_at in rows)
+        if _revocations_synced_to is None or newest > _revocations_synced_to:
+            _revocations_synced_to = newest
+    return len(rows)
+
+def _encode_token(data: dict, expires_delta: timedelta, token_type: str) -> str:
+    to_encode = data.copy()
+    to_encode.update({
+        "exp": datetime.utcnow() + expires_delta,
+        "iat": time.time(),
+        "jti": uuid.uuid4().hex,
+        "type": token_type,
+    })
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def create_access_token(data: dict):
+    return _encode_token(data, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), "access")
+
+def create_refresh_token(email: str):
+    return _encode_token({"sub": email}, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), "refresh")
+
+def create_admin_token(email: str, user_id: int, is_super_admin: bool):
+    return create_access_token({
+        "sub": email,
+        "user_id": user_id,
+        "role": "admin",
+        "is_super_admin": is_super_admin,
+    })
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    """Single decode path for every token; raises 401 for anything unusable."""
+    if token.startswith('Bearer '):
+        token = token[7:]
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        
-        # Get the role from the token
-        role: str = payload.get("role")
-        if role != "admin":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions - Admin access required"
-            )
-        
     except JWTError:
         raise credentials_exception
+
+    # Tokens issued before token types existed are access tokens
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        raise credentials_exception
+    if is_token_revoked(payload.get("jti")):
+        raise credentials_exception
+    return payload
+
+async def build_profile_claims(db, user: User) -> dict:
+    """Profile claims for a new access token; empty unless EMBED_PROFILE_CLAIMS is on."""
+    if not EMBED_PROFILE_CLAIMS:
+        return {}
+
+    claims = {"ver": PROFILE_CLAIMS_VERSION, "name": user.full_name}
+    if user.role == UserRole.HOMEOWNERS.value:
+        claims["homeowner_id"] = (await db.execute(
+            select(HomeOwner.id).where(HomeOwner.user_id == user.id)
+        )).scalar()
+    elif user.role == UserRole.SERVICEPROVIDERS.value:
+        provider = (await db.execute(
+            select(ServiceProvider).where(ServiceProvider.user_id == user.id)
+        )).scalars().first()
+        if provider:
+            claims["provider_id"] = provider.id
+            claims["is_verified"] = bool(provider.is_verified)
+            claims["has_documents"] = bool(provider.id_verification and provider.certification)
+    elif user.role == UserRole.ADMIN.value:
+        admin = (await db.execute(select(Admin).where(Admin.user_id == user.id))).scalars().first()
+        if admin:
+            claims["admin_id"] = admin.id
+            claims["is_super_admin"] = bool(admin.is_super_admin)
+    return claims
+
+def principal_from_claims(payload: dict) -> Optional[Principal]:
+    """The caller's identity straight from an embedded-claims token, if it is still current."""
+    if payload.get("ver") != PROFILE_CLAIMS_VERSION or "user_id" not in payload:
+        return None
+    if not claims_are_current(payload["sub"], payload.get("iat")):
+        return None
+    return Principal(
+        id=payload["user_id"],
+        email=payload["sub"],
+        role=payload["role"],
+        full_name=payload.get("name") or "",
+        homeowner_id=payload.get("homeowner_id"),
+        provider_id=payload.get("provider_id"),
+        admin_id=payload.get("admin_id"),
+        is_verified=payload.get("is_verified", False),
+        has_documents=payload.get("has_documents", False),
+        is_super_admin=payload.get("is_super_admin", False),
+    )
+
+async def get_current_admin_user(token: str = Depends(oauth2_scheme), db = Depends(get_async_db)) -> User:
+    payload = decode_token(token)
+    email: str = payload["sub"]
+    if payload.get("role") != UserRole.ADMIN.value:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions - Admin access required"
+        )
     
-    # Get the user from the database
-    user = db.query(User).filter(User.email == email).first()
+    user = principal_cache.get("admin", email)
+    if user is not None:
+        return user
+
+    # Load the Admin row up front so the cached (detached) user still has it
+    user = (await db.execute(
+        select(User).options(selectinload(User.admin)).where(User.email == email)
+    )).scalars().first()
     if user is None:
         raise credentials_exception
-    
-    # Additional check to ensure the user is actually an admin
-    if user.role != UserRole.ADMIN.value:
+    if user.role != UserRole.ADMIN.value or user.admin is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User does not have admin privileges"
         )
     
+    # Detach the Admin row too (expunge doesn't cascade to it), or the rollback would expire it
+    db.expunge(user.admin)
+    db.expunge(user)
+    # Admin endpoints open their own session too; don't hold two connections per request
+    await db.rollback()
+    principal_cache.set("admin", email, user)
     return user
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-
-async def get_current_super_admin(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    user = await get_current_admin_user(token, db)
-    
-    admin = db.query(Admin).filter(Admin.user_id == user.id).first()
-    if not admin or not admin.is_super_admin:
+async def get_current_super_admin(user: User = Depends(get_current_admin_user)) -> User:
+    if not user.admin.is_super_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions - Super admin access required"
@@ -104,66 +296,61 @@ async def get_current_super_admin(
     
     return user
 
-def create_admin_token(email: str, user_id: int, is_super_admin: bool):
-    expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {
-        "sub": email,
-        "user_id": user_id,
-        "role": "admin",
-        "is_super_admin": is_super_admin,
-        "exp": datetime.utcnow() + expires
-    }
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_async_db)):
+    payload = decode_token(token)
+    email: str = payload["sub"]
 
-def get_current_admin_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None or user.role != UserRole.ADMIN.value:
-        raise credentials_exception
-    
-    return user
+    principal = principal_from_claims(payload)
+    if principal is not None:
+        return principal
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        # Remove 'Bearer ' prefix if present
-        if token.startswith('Bearer '):
-            token = token[7:]
-            
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-            
-        # Debug logging
-        print(f"Decoded token payload: {payload}")
+    user = principal_cache.get("user", email)
+    if user is not None:
+        return user
         
-    except JWTError as e:
-        print(f"JWT Error: {str(e)}")
-        raise credentials_exception
-        
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
     if user is None:
         raise credentials_exception
-        
-    # Debug logging
-    print(f"Found user: {user.email}, Role: {user.role}")
-    
+
+    db.expunge(user)
+    # Hand the connection back now: the endpoint's own session needs one too, and
+    # holding both until the response is sent starves the pool under load
+    await db.rollback()
+    principal_cache.set("user", email, user)
     return user
-    
+
+async def get_homeowner_id(db, user) -> Optional[int]:
+    """Homeowner profile id from the token claims, falling back to a lookup."""
+    if isinstance(user, Principal) and user.homeowner_id is not None:
+        return user.homeowner_id
+    return (await db.execute(
+        select(HomeOwner.id).where(HomeOwner.user_id == user.id)
+    )).scalar()
+
+async def get_provider_profile(db, user, current: bool = False) -> Optional[ProviderProfile]:
+    """
+    Provider id and verification state from the token claims, falling back to a
+    lookup. A verification change recorded on another worker does not reach
+    claims_are_current there, so claims are only trusted when they allow
+    everything, and never with current=True: endpoints that write on the
+    strength of the verification flag pass it to read the row every time.
+    """
+    if (
+        not current and isinstance(user, Principal) and user.provider_id is not None
+        and user.is_verified and user.has_documents
+    ):
+        return ProviderProfile(
+            id=user.provider_id,
+            is_verified=user.is_verified,
+            has_documents=user.has_documents,
+        )
+    provider = (await db.execute(
+        select(ServiceProvider).where(ServiceProvider.user_id == user.id)
+    )).scalars().first()
+    if not provider:
+        return None
+    return ProviderProfile(
+        id=provider.id,
+        is_verified=bool(provider.is_verified),
+        has_documents=bool(provider.id_verification and provider.certification),
+    )
@@ -1,12 +1,42 @@
+import asyncio
+import logging
 import os
-import google.generativeai as genai
+import re
+import time
+from typing import AsyncIterator
+
 from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from chat_sessions import ChatSession, chat_sessions
+from faq import faq_index
+from profiling import timed_iter
+from ttl_cache import TTLCache
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = "gemini-1.5-pro"
+# "gemini", or "fake" for a local canned client (offline development, load tests)
+CHAT_MODEL_CLIENT = os.getenv("CHAT_MODEL_CLIENT", "gemini")
+# Model calls in flight per worker; more wait for a slot
+CHAT_CONCURRENCY = int(os.getenv("CHAT_CONCURRENCY", "8"))
+# Calls allowed to wait for a slot; beyond that new questions get a 503 at once
+CHAT_QUEUE_LIMIT = int(os.getenv("CHAT_QUEUE_LIMIT", "32"))
+# Whole answer, including the wait for a slot
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "30"))
+# Answers keyed on the normalized question; CHAT_CACHE_TTL=0 turns it off
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+# After CHAT_BREAKER_FAILURES model errors in a row, stop calling the model for
+# CHAT_BREAKER_RESET_SECONDS and answer from the cache or the closest FAQ entry
+# (if it scores at least CHAT_FALLBACK_MIN_SCORE); then one trial call decides
+CHAT_BREAKER_FAILURES = int(os.getenv("CHAT_BREAKER_FAILURES", "5"))
+CHAT_BREAKER_RESET_SECONDS = float(os.getenv("CHAT_BREAKER_RESET_SECONDS", "30"))
+CHAT_FALLBACK_MIN_SCORE = float(os.getenv("CHAT_FALLBACK_MIN_SCORE", "0.25"))
 GENERATION_CONFIG = {
     "temperature": 1,
     "top_p": 0.95,
@@ -18,10 +48,17 @@ SYSTEM_INSTRUCTION = """You are a helpful and friendly AI assistant for HomeHelp
 
 You should also be ready to talk about key platform features: how users find service providers using a recommendation system based on their needs and preferences; how booking works safely through the platform; how homeowners and workers can chat in real time; how payments are made securely; how the platform gives personalized worker suggestions using machine learning; and how verified reviews and ratings help build trust. Mention how the platform benefits homeowners by offering convenience and reliability, and how it helps skilled workers by giving them a chance to grow their reputation and reach more clients. Avoid talking about things not mentioned in the project, like exact pricing, dispute handling, or technical backend details unless clearly stated (e.g., React.js, FastAPI, PostgreSQL)."""
 
-class Ai_Assistant:
+def normalize_message(message: str) -> str:
+    """Case, spacing and trailing punctuation don't change the question."""
+    return re.sub(r"\s+", " ", message).strip().rstrip("?!.").strip().lower()
+
+
+class GeminiClient:
     def __init__(self):
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY environment variable not set.")
+        import google.generativeai as genai
+
         genai.configure(api_key=GEMINI_API_KEY)
         self.model = genai.GenerativeModel(
             model_name=MODEL_NAME,
@@ -29,8 +66,321 @@ class Ai_Assistant:
             system_instruction=SYSTEM_INSTRUCTION,
         )
 
-    async def generate_response(self, user_message: str) -> str:
-        """Generates a response from the Gemini model."""
-        chat_session = self.model.start_chat(history=[])
-        response = chat_session.send_message(user_message)
-        return response.text
\ No newline at end of file
+    async def stream(self, user_message: str, history=()) -> AsyncIterator[str]:
+        """Yields the answer text as the model produces it, without blocking the event loop."""
+        contents = [*history, {"role": "user", "parts": [user_message]}]
+        response = await self.model.generate_content_async(contents, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeClient:
+    """Answers every question with the same text, a word at a time."""
+
+    def __init__(self, reply: str = None, delay: float = None):
+        self.reply = reply or os.getenv(
+            "CHAT_FAKE_REPLY",
+            "Thanks for asking! Search for the service you need, open a provider's page and press Book. "
+            "Is there anything else I can help you with?"
+        )
+        self.delay = float(os.getenv("CHAT_FAKE_DELAY", "0")) if delay is None else delay
+        self.calls = 0
+
+    async def stream(self, user_message: str, history=()) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                await asyncio.sleep(self.delay / len(words))
+            yield word if i == 0 else " " + word
+
+
+def make_model_client():
+    if CHAT_MODEL_CLIENT == "fake":
+        return FakeClient()
+    return GeminiClient()
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` errors in a row -> one trial call after `reset_seconds`."""
+
+    def __init__(self, failures: int, reset_seconds: float):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.opens = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_running or self.consecutive_failures >= self.failures:
+            if self.opened_at is None or self.trial_running:
+                self.opens += 1
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+
+class _Flight:
+    """One upstream call; every request asking the same question reads from it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.error = None
+        self.done = False
+        self._changed = asyncio.Event()
+        self.task = None
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def add(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Exception = None):
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class Ai_Assistant:
+    """
+    Answers platform questions from the FAQ index when it has a confident
+    match, otherwise through a swappable model client (anything with an async
+    `stream(message, history)` generator). Identical opening questions in
+    flight at the same time share one model call. Calls are limited to
+    CHAT_CONCURRENCY at a time with at most CHAT_QUEUE_LIMIT waiting, and
+    CHAT_TIMEOUT_SECONDS each; answers to opening questions are cached. With
+    a ChatSession, earlier turns are sent along and the exchange is added to
+    the session once it completes.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or make_model_client()
+        self.cache = TTLCache(CHAT_CACHE_TTL, CHAT_CACHE_SIZE)
+        self.breaker = CircuitBreaker(CHAT_BREAKER_FAILURES, CHAT_BREAKER_RESET_SECONDS)
+        self._slots = asyncio.Semaphore(CHAT_CONCURRENCY)
+        self._flights = {}
+        self._pending = 0  # upstream calls started, running or waiting for a slot
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.shed = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def cached_response(self, user_message: str):
+        return self.cache.get(normalize_message(user_message))
+
+    async def generate_response(self, user_message: str, session: ChatSession = None) -> str:
+        """Generates a response from the model, or returns the cached one."""
+        chunks = []
+        async for chunk in self.stream_response(user_message, session):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    async def stream_response(self, user_message: str, session: ChatSession = None) -> AsyncIterator[str]:
+        """Yields the answer as it arrives; FAQ and cached answers come as a single chunk."""
+        if not user_message.strip():
+            raise ValueError("Message must not be empty.")
+        chunks = []
+        async for chunk in self._answer(user_message, session.history() if session else []):
+            chunks.append(chunk)
+            yield chunk
+        if session is not None:
+            session.add_exchange(user_message, "".join(chunks))
+
+    async def _answer(self, user_message: str, history) -> AsyncIterator[str]:
+        answer = faq_index.answer(user_message)
+        if answer is not None:
+            yield answer
+            return
+        # A follow-up ("and for electricians?") means something else in every conversation
+        if not history:
+            cached = self.cached_response(user_message)
+            if cached is not None:
+                yield cached
+                return
+
+        key = normalize_message(user_message)
+        flight = None if history else self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        elif not self.breaker.allow():
+            # A follow-up's opening-question answer, or a looser FAQ match, beats an error
+            answer = self.cached_response(user_message) or faq_index.answer(user_message, CHAT_FALLBACK_MIN_SCORE)
+            if answer is None:
+                raise self._unavailable("The assistant is temporarily unavailable, please try again shortly")
+            self.fallbacks += 1
+            yield answer
+            return
+        elif self._pending >= CHAT_CONCURRENCY + CHAT_QUEUE_LIMIT:
+            # Shed load instead of queueing without bound when the model is slow
+            self.shed += 1
+            self.breaker.trial_running = False
+            raise self._unavailable("The assistant is busy, please try again shortly")
+        else:
+            flight = _Flight()
+            if not history:
+                self._flights[key] = flight
+            self._pending += 1
+            flight.task = asyncio.create_task(self._fly(flight, key, user_message, history))
+
+        async for chunk in timed_iter("llm", flight.follow()):
+            yield chunk
+
+    async def _fly(self, flight: _Flight, key: str, user_message: str, history):
+        """
+        Runs in its own task, so the call completes (and is cached) for the
+        other requests even if the one that started it goes away.
+        """
+        deadline = time.monotonic() + CHAT_TIMEOUT_SECONDS
+        error = None
+        try:
+            await asyncio.wait_for(self._slots.acquire(), CHAT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            # Our own queue was too slow; that says nothing about the model
+            self.breaker.trial_running = False
+            self._finish(flight, key, self._timed_out())
+            return
+        except asyncio.CancelledError:
+            self._finish(flight, key, self._unavailable("The assistant is restarting, please try again shortly"))
+            raise
+
+        try:
+            self.upstream_calls += 1
+            await asyncio.wait_for(self._stream_into(flight, user_message, history), max(deadline - time.monotonic(), 0))
+            self.breaker.record_success()
+            if not history:
+                self.cache.set(key, "".join(flight.chunks))
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            error = self._timed_out()
+        except asyncio.CancelledError:
+            error = self._unavailable("The assistant is restarting, please try again shortly")
+            raise
+        except Exception as e:
+            logger.exception("Error from chat model")
+            self.errors += 1
+            self.breaker.record_failure()
+            error = e
+        finally:
+            self._slots.release()
+            self._finish(flight, key, error)
+
+    async def _stream_into(self, flight: _Flight, user_message: str, history):
+        stream = self.client.stream(user_message, history)
+        try:
+            async for chunk in stream:
+                flight.add(chunk)
+        finally:
+            await stream.aclose()
+
+    def _finish(self, flight: _Flight, key: str, error: Exception = None):
+        self._pending -= 1
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.finish(error)
+
+    def _timed_out(self) -> HTTPException:
+        self.timeouts += 1
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="The assistant took too long to answer, please try again"
+        )
+
+    def _unavailable(self, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": "5"},
+        )
+
+    def stats(self) -> dict:
+        return {
+            "client": type(self.client).__name__,
+            "concurrency": CHAT_CONCURRENCY,
+            "queue_limit": CHAT_QUEUE_LIMIT,
+            "timeout_seconds": CHAT_TIMEOUT_SECONDS,
+            "in_flight": self._pending,
+            "waiting": max(self._pending - CHAT_CONCURRENCY, 0),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "breaker": {
+                "state": self.breaker.state,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "opens": self.breaker.opens,
+            },
+            "cache": self.cache.stats(),
+            "faq": faq_index.stats(),
+            "sessions": chat_sessions.stats(),
+        }
+
+
+_assistant = None
+
+
+def current_assistant():
+    """The assistant if it has been created, without creating it."""
+    return _assistant
+
+
+def get_assistant() -> Ai_Assistant:
+    """
+    The worker's assistant, created on first use rather than at import (a
+    FastAPI dependency). Without a usable model client the chat endpoints
+    answer 503 and the rest of the API is unaffected.
+    """
+    global _assistant
+    if _assistant is None:
+        try:
+            _assistant = Ai_Assistant()
+        except ValueError as e:
+            logger.warning("Chat assistant unavailable: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The assistant is not available right now"
+            )
+    return _assistant
@@ -0,0 +1,84 @@
+import os
+import secrets
+import threading
+
+from ttl_cache import TTLCache
+
+# Server-side chat history, so follow-up questions keep their context without
+# the client resending the conversation. Each session keeps only its most
+# recent turns within CHAT_HISTORY_TOKENS; sessions idle for longer than
+# CHAT_SESSION_IDLE_SECONDS are dropped, and the least recently used go once
+# CHAT_SESSIONS_MAX are open. Worst case memory is roughly
+# CHAT_SESSIONS_MAX * CHAT_HISTORY_TOKENS * 4 bytes per worker.
+CHAT_SESSIONS_MAX = int(os.getenv("CHAT_SESSIONS_MAX", "10000"))
+CHAT_SESSION_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1000"))
+
+# Close enough to the model's tokenizer for English text, and free to compute
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ChatSession:
+    def __init__(self, session_id: str, token_budget: int):
+        self.id = session_id
+        self.token_budget = token_budget
+        self.turns = []  # (role, text, tokens), oldest first
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def history(self):
+        """Earlier turns in the model's chat format."""
+        with self._lock:
+            return [{"role": role, "parts": [text]} for role, text, _ in self.turns]
+
+    def add_exchange(self, user_message: str, answer: str):
+        with self._lock:
+            for role, text in (("user", user_message), ("model", answer)):
+                # A single huge message keeps only its start
+                text = text[:self.token_budget * CHARS_PER_TOKEN]
+                tokens = estimate_tokens(text)
+                self.turns.append((role, text, tokens))
+                self.tokens += tokens
+            # Drop whole exchanges from the front so the history never starts with an answer
+            while self.tokens > self.token_budget and len(self.turns) > 2:
+                for _ in range(2):
+                    self.tokens -= self.turns.pop(0)[2]
+
+
+class ChatSessionStore:
+    """Chat sessions in a sliding TTLCache, so idle time is what expires them."""
+
+    def __init__(self, max_sessions: int, idle_seconds: float, token_budget: int):
+        self.token_budget = token_budget
+        self._sessions = TTLCache(idle_seconds, max_sessions, sliding=True)
+        self.created = 0
+
+    def get_or_create(self, session_id: str = None) -> ChatSession:
+        """The session for `session_id`, or a new one (with a new id) if it is unknown or expired."""
+        self._sessions.purge_expired()
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            session = ChatSession(secrets.token_urlsafe(16), self.token_budget)
+            self._sessions.set(session.id, session)
+            self.created += 1
+        return session
+
+    def stats(self) -> dict:
+        self._sessions.purge_expired()
+        stats = self._sessions.stats()
+        return {
+            "sessions": stats["size"],
+            "max_sessions": stats["max_size"],
+            "idle_seconds": stats["ttl_seconds"],
+            "history_tokens": self.token_budget,
+            "created": self.created,
+            "expired": stats["expired"],
+            "evictions": stats["evictions"],
+        }
+
+
+chat_sessions = ChatSessionStore(CHAT_SESSIONS_MAX, CHAT_SESSION_IDLE_SECONDS, CHAT_HISTORY_TOKENS)
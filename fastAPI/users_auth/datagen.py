@@ -0,0 +1,270 @@
+import argparse
+import io
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import BookingStatus, RegistrationStatus, UserRole
+
+# Synthetic data for benchmarking and staging: users, homeowners, providers,
+# services, bookings and registration requests that reference each other
+# consistently. Rows are produced by generators and streamed into Postgres with
+# COPY in batches, so millions of rows load in minutes and memory stays flat.
+#
+#     python datagen.py --users 100000 --providers 20000 --services 500000 --bookings 5000000
+#
+# Every generated account gets the same password; it is hashed once and the
+# hash reused, since bcrypt per row would take longer than the whole load.
+# Ids are reserved up front by advancing the table sequences, so the app can
+# keep inserting while a load runs, but run only one generator at a time.
+
+COPY_BATCH_ROWS = 50000
+
+FIRST_NAMES = [
+    "Abebe", "Almaz", "Amara", "Daniel", "Dawit", "Hana", "Helen", "Kebede", "Liya", "Meron",
+    "Mulugeta", "Naomi", "Samuel", "Sara", "Selam", "Solomon", "Tigist", "Yared", "Yonas", "Zewdu",
+]
+LAST_NAMES = [
+    "Alemu", "Bekele", "Desta", "Girma", "Haile", "Kassa", "Mekonnen", "Negash", "Tadesse", "Tesfaye",
+    "Wolde", "Worku", "Yilma", "Zeleke",
+]
+TRADES = ["Plumbing", "Electrical", "Painting", "Cleaning", "Roofing", "Carpentry", "Moving", "Tiling"]
+TASKS = ["repair", "installation", "maintenance", "inspection", "renovation", "cleanup"]
+CITIES = ["Addis Ababa", "Adama", "Bahir Dar", "Dire Dawa", "Gondar", "Hawassa", "Mekelle"]
+
+# Share of each status among generated rows
+BOOKING_STATUSES = [
+    (BookingStatus.PENDING, 0.15), (BookingStatus.CONFIRMED, 0.15),
+    (BookingStatus.COMPLETED, 0.55), (BookingStatus.CANCELLED, 0.15),
+]
+REGISTRATION_STATUSES = [
+    (RegistrationStatus.PENDING, 0.03), (RegistrationStatus.APPROVED, 0.77), (RegistrationStatus.REJECTED, 0.20),
+]
+
+
+def copy_value(value) -> str:
+    """A value in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def copy_rows(conn, table: str, columns, rows, batch_rows: int = COPY_BATCH_ROWS) -> int:
+    """Streams `rows` (tuples in `columns` order) into `table`, one COPY and commit per batch."""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    total = 0
+    buffer = io.StringIO()
+    batch = 0
+
+    def flush():
+        buffer.seek(0)
+        with conn.cursor() as cursor:
+            cursor.copy_expert(statement, buffer)
+        conn.commit()
+        buffer.seek(0)
+        buffer.truncate()
+
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+        batch += 1
+        if batch == batch_rows:
+            flush()
+            total += batch
+            batch = 0
+    if batch:
+        flush()
+        total += batch
+    return total
+
+
+def reserve_ids(conn, table: str, count: int) -> int:
+    """First of `count` consecutive ids nothing else will be given; the sequence moves past them."""
+    if count == 0:
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT setval(seq, greatest(nextval(seq), (SELECT coalesce(max(id), 0) + 1 FROM {table})) + %s - 1) "
+            f"FROM (SELECT pg_get_serial_sequence('{table}', 'id') AS seq) AS s",
+            (count,)
+        )
+        last = cursor.fetchone()[0]
+    conn.commit()
+    return last - count + 1
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def phone(rng):
+    return f"+2519{rng.randint(10000000, 99999999)}"
+
+
+def user_rows(rng, first_id, count, providers, prefix, password_hash, names, now):
+    for offset in range(count):
+        user_id = first_id + offset
+        role = UserRole.SERVICEPROVIDERS if offset < providers else UserRole.HOMEOWNERS
+        yield (
+            user_id, f"{prefix}-{user_id}@example.com", password_hash, names[offset], phone(rng),
+            True, role.value, now - timedelta(days=rng.uniform(0, 730)),
+        )
+
+
+def provider_rows(rng, first_id, first_user_id, count, names):
+    for offset in range(count):
+        yield (
+            first_id + offset, first_user_id + offset, f"{names[offset]} {rng.choice(TRADES)}",
+            f"{rng.randint(1, 500)} {rng.choice(CITIES)}", rng.randint(0, 30),
+            f"documents/{first_user_id + offset}-id.pdf", f"documents/{first_user_id + offset}-certificate.pdf",
+            True,
+        )
+
+
+def homeowner_rows(rng, first_id, first_user_id, count):
+    for offset in range(count):
+        yield first_id + offset, first_user_id + offset, f"{rng.randint(1, 500)} {rng.choice(CITIES)}"
+
+
+def service_rows(rng, first_id, count, first_provider_id, providers, provider_names, now):
+    for offset in range(count):
+        provider = rng.randrange(providers)
+        trade, task = rng.choice(TRADES), rng.choice(TASKS)
+        yield (
+            first_id + offset, first_provider_id + provider, f"{trade} {task}",
+            f"{trade} {task} by an experienced local professional in {rng.choice(CITIES)}.",
+            rng.randint(20, 500), "/placeholder-service.jpg", rng.randint(0, 5), provider_names[provider],
+            now - timedelta(days=rng.uniform(0, 365)), rng.random() > 0.05,
+        )
+
+
+def booking_rows(rng, count, first_service_id, services, first_homeowner_id, homeowners, now):
+    for _ in range(count):
+        booked = now - timedelta(days=rng.uniform(0, 365))
+        scheduled = booked + timedelta(days=rng.uniform(0, 60))
+        status = weighted(rng, BOOKING_STATUSES)
+        if scheduled > now and status == BookingStatus.COMPLETED:
+            status = BookingStatus.CONFIRMED
+        completed = scheduled + timedelta(hours=rng.uniform(1, 8)) if status == BookingStatus.COMPLETED else None
+        yield (
+            first_service_id + rng.randrange(services), first_homeowner_id + rng.randrange(homeowners),
+            booked, status.name, scheduled, completed,
+        )
+
+
+def registration_request_rows(rng, first_id, count, prefix, password_hash, now):
+    for offset in range(count):
+        request_id = first_id + offset
+        status = weighted(rng, REGISTRATION_STATUSES)
+        requested = now - timedelta(days=rng.uniform(0, 365))
+        yield (
+            request_id, person(rng), f"{prefix}-request-{request_id}@example.com", phone(rng),
+            f"{rng.randint(1, 500)} {rng.choice(CITIES)}", rng.randint(0, 30), password_hash,
+            f"documents/request-{request_id}-id.pdf", f"documents/request-{request_id}-certificate.pdf",
+            status.name, "Documents could not be verified" if status == RegistrationStatus.REJECTED else None,
+            requested, requested + timedelta(days=rng.uniform(0, 7)) if status != RegistrationStatus.PENDING else None,
+        )
+
+
+def generate(engine, users: int, providers: int, services: int, bookings: int, requests: int,
+             password: str = "Pass@123", prefix: str = "gen", seed: int = None,
+             batch_rows: int = COPY_BATCH_ROWS) -> dict:
+    """
+    Loads the given numbers of rows; the first `providers` users are providers
+    and the rest homeowners. Emails are <prefix>-<user id>@example.com. The same
+    `seed` gives the same data. Returns the rows loaded per table.
+    """
+    from auth import hash_password
+
+    if not 0 < providers < users:
+        raise ValueError("Need at least one provider and one homeowner")
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = hash_password(password)
+    homeowners = users - providers
+    names = [person(rng) for _ in range(users)]
+    loaded = {}
+
+    conn = engine.raw_connection()
+    try:
+        first_user = reserve_ids(conn, "users", users)
+        first_provider = reserve_ids(conn, "serviceproviders", providers)
+        first_homeowner = reserve_ids(conn, "homeowners", homeowners)
+        first_service = reserve_ids(conn, "services", services)
+        first_request = reserve_ids(conn, "provider_registration_requests", requests)
+
+        loads = [
+            ("users", ["id", "email", "password_hash", "full_name", "phone_number", "is_active", "role", "created_at"],
+             user_rows(rng, first_user, users, providers, prefix, password_hash, names, now)),
+            ("serviceproviders", ["id", "user_id", "business_name", "address", "years_experience",
+                                  "id_verification", "certification", "is_verified"],
+             provider_rows(rng, first_provider, first_user, providers, names)),
+            ("homeowners", ["id", "user_id", "address"],
+             homeowner_rows(rng, first_homeowner, first_user + providers, homeowners)),
+            ("services", ["id", "provider_id", "title", "description", "price", "image", "rating",
+                          "provider_name", "created_at", "is_active"],
+             service_rows(rng, first_service, services, first_provider, providers, names[:providers], now)),
+            ("bookings", ["service_id", "homeowner_id", "booking_date", "status", "scheduled_date", "completed_date"],
+             booking_rows(rng, bookings, first_service, services, first_homeowner, homeowners, now)),
+            ("provider_registration_requests", ["id", "full_name", "email", "phone_number", "address",
+                                                "years_experience", "password_hash", "id_verification",
+                                                "certification", "status", "rejection_reason", "requested_at",
+                                                "processed_at"],
+             registration_request_rows(rng, first_request, requests, prefix, password_hash, now)),
+        ]
+        for table, columns, rows in loads:
+            started = datetime.utcnow()
+            loaded[table] = copy_rows(conn, table, columns, rows, batch_rows)
+            print(f"Loaded {loaded[table]} {table} in {(datetime.utcnow() - started).total_seconds():.1f}s")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as analyze_conn:
+        for table in loaded:
+            analyze_conn.execute(text(f"ANALYZE {table}"))
+    return loaded
+
+
+if __name__ == "__main__":
+    import logging
+
+    from database import make_engine
+    from migrations import migrate
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description="Load synthetic users, services, bookings and registration requests")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--providers", type=int, default=2000, help="How many of the users are providers")
+    parser.add_argument("--services", type=int, default=50000)
+    parser.add_argument("--bookings", type=int, default=500000)
+    parser.add_argument("--requests", type=int, default=5000, help="Provider registration requests")
+    parser.add_argument("--password", default="Pass@123", help="Password of every generated account")
+    parser.add_argument("--prefix", default="gen", help="Email prefix of the generated accounts")
+    parser.add_argument("--seed", type=int, help="Random seed, for the same data on every run")
+    parser.add_argument("--batch-rows", type=int, default=COPY_BATCH_ROWS, help="Rows per COPY")
+    args = parser.parse_args()
+
+    # Loads and ANALYZE may run past the API's statement timeout
+    datagen_engine = make_engine(statement_timeout_ms=0, application_name="homehelp-datagen", pool_size=1)
+    migrate(datagen_engine)
+    generate(
+        datagen_engine, users=args.users, providers=args.providers, services=args.services,
+        bookings=args.bookings, requests=args.requests, password=args.password, prefix=args.prefix,
+        seed=args.seed, batch_rows=args.batch_rows
+    )
@@ -0,0 +1,213 @@
+import hashlib
+import hmac
+import itertools
+import os
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from auth import SECRET_KEY
+from database import (
+    DATABASE_ASYNC, DB_APPLICATION_NAME, SessionLocal, ThreadedSessionLocal, AsyncSessionLocal,
+    async_session_scope, make_engine, make_async_engine, to_async_url
+)
+
+# Read-only endpoints can be served by streaming replicas of the primary.
+# A replica is used only while its replay lag is within REPLICA_MAX_LAG_SECONDS.
+# After a client writes (any successful non-GET request), its reads stay on
+# the primary for REPLICA_STICKY_SECONDS so it always sees its own changes.
+# The deadline travels with the client, signed, in a cookie and in a response
+# header it may send back instead, so every worker and node honours it.
+# Data scopes (e.g. "catalog") are tracked per worker process.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "2"))
+READ_YOUR_WRITES_COOKIE = "read_primary_until"
+READ_YOUR_WRITES_HEADER = "X-Read-Primary-Until"
+
+# Zero when the replica has replayed everything it received, so an idle
+# primary does not look like lag
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = make_engine(url, application_name=f"{DB_APPLICATION_NAME}-read")
+        self.SessionLocal = sessionmaker(bind=self.engine, autocommit=False, autoflush=False, expire_on_commit=False)
+        self.AsyncSessionLocal = None
+        if DATABASE_ASYNC:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+
+            async_engine = make_async_engine(to_async_url(url), application_name=f"{DB_APPLICATION_NAME}-read")
+            self.AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        self.lag = None  # seconds; None until checked or while unreachable
+        self.error = None
+
+    @property
+    def usable(self) -> bool:
+        return self.lag is not None and self.lag <= REPLICA_MAX_LAG_SECONDS
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(REPLICA_LAG_SQL).scalar())
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+            self.error = None
+        except Exception as e:
+            self.lag = None
+            self.error = str(e)
+
+
+class ReplicaRouter:
+    def __init__(self, urls):
+        self.replicas = [Replica(url) for url in urls]
+        self._turn = itertools.count()
+        self._written_until = {}
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def note_write(self, key: str):
+        """Pins reads for `key` (a data scope) to the primary for a while."""
+        now = time.monotonic()
+        with self._lock:
+            self._written_until[key] = now + REPLICA_STICKY_SECONDS
+            if len(self._written_until) > 10000:
+                for stale in [k for k, until in self._written_until.items() if until < now]:
+                    del self._written_until[stale]
+
+    def recently_wrote(self, *keys) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(self._written_until.get(key, 0) > now for key in keys if key)
+
+    def pick(self, *keys, pinned: bool = False):
+        """A usable replica, or None to read from the primary (always when `pinned`)."""
+        replica = None
+        if self.replicas and not pinned and not self.recently_wrote(*keys):
+            usable = [r for r in self.replicas if r.usable]
+            if usable:
+                replica = usable[next(self._turn) % len(usable)]
+        if replica is None:
+            self.primary_reads += 1
+        else:
+            self.replica_reads += 1
+        return replica
+
+    def check_all(self):
+        for replica in self.replicas:
+            replica.check()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [
+                {"index": i, "lag_seconds": r.lag, "usable": r.usable, "error": r.error}
+                for i, r in enumerate(self.replicas)
+            ],
+            "max_lag_seconds": REPLICA_MAX_LAG_SECONDS,
+            "sticky_seconds": REPLICA_STICKY_SECONDS,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
+
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+
+def _sign(until: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"read-primary:{until}".encode(), hashlib.sha256).hexdigest()
+
+
+def write_marker(now: float = None) -> str:
+    """Signed value pinning the client's reads to the primary for REPLICA_STICKY_SECONDS."""
+    until = str(int((time.time() if now is None else now) + REPLICA_STICKY_SECONDS) + 1)
+    return f"{until}.{_sign(until)}"
+
+
+def wrote_recently(marker) -> bool:
+    """Whether a marker from write_marker is genuine and not yet expired (never raises)."""
+    until, _, signature = (marker or "").partition(".")
+    if not until.isdigit() or not hmac.compare_digest(signature, _sign(until)):
+        return False
+    return int(until) > time.time()
+
+
+def _route(request: Request, scope):
+    if not replica_router.replicas:
+        return None
+    marker = request.headers.get(READ_YOUR_WRITES_HEADER) or request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    return replica_router.pick(scope, pinned=wrote_recently(marker))
+
+
+def read_session(scope: str = None):
+    """
+    Dependency for read-only endpoints: an async session on a replica, or on
+    the primary when none is usable, the caller wrote recently, or `scope`
+    (e.g. "catalog") was written recently.
+    """
+    async def get_read_db(request: Request):
+        async with read_session_scope(request, scope) as db:
+            yield db
+
+    return get_read_db
+
+
+def read_session_scope(request: Request, scope: str = None):
+    """The session read_session would give, as an async context manager the caller closes."""
+    replica = _route(request, scope)
+    if replica is None:
+        return async_session_scope(AsyncSessionLocal, ThreadedSessionLocal)
+    return async_session_scope(replica.AsyncSessionLocal, replica.SessionLocal)
+
+
+def sync_read_session(scope: str = None):
+    """read_session for endpoints still written against a sync Session."""
+    def get_read_db(request: Request):
+        replica = _route(request, scope)
+        db = replica.SessionLocal() if replica else SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return get_read_db
+
+
+class ReadYourWritesMiddleware:
+    """Hands the caller a write marker when a non-GET request succeeds."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or not replica_router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_note(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                marker = write_marker()
+                cookie = (f"{READ_YOUR_WRITES_COOKIE}={marker}; Max-Age={int(REPLICA_STICKY_SECONDS) + 1}; "
+                          "Path=/; HttpOnly; SameSite=Lax")
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.encode("latin-1")),
+                    (READ_YOUR_WRITES_HEADER.lower().encode("latin-1"), marker.encode("latin-1")),
+                ]}
+            await send(message)
+
+        await self.app(scope, receive, send_and_note)
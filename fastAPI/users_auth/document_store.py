@@ -0,0 +1,282 @@
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from fastapi import UploadFile
+from sqlalchemy import update, delete, select, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from starlette.concurrency import run_in_threadpool
+
+from models import Document, ProviderRegistrationRequest, ServiceProvider
+from uploads import save_upload_file, discard_upload
+
+# Verification documents are stored once per distinct content under their
+# SHA-256, so a re-upload or a document shared by two rows costs nothing.
+# Rows (registration requests, providers) hold the key; the documents table
+# counts references and unreferenced files are garbage collected.
+DOCUMENT_STORE_BACKEND = os.getenv("DOCUMENT_STORE_BACKEND", "local")
+DOCUMENT_STORE_ROOT = os.getenv("DOCUMENT_STORE_ROOT", "static/documents")
+# Uploads are written here first; on the same filesystem as the local store
+# so moving a finished file into place is a rename
+DOCUMENT_STAGING_DIR = os.path.join(DOCUMENT_STORE_ROOT, ".staging")
+# Unreferenced documents younger than this are kept, which covers uploads
+# whose row has not been committed yet
+DOCUMENT_GC_GRACE_SECONDS = int(os.getenv("DOCUMENT_GC_GRACE_SECONDS", "3600"))
+DOCUMENT_GC_INTERVAL_SECONDS = int(os.getenv("DOCUMENT_GC_INTERVAL_SECONDS", "3600"))
+
+_KEY = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+# Documents uploaded before the store existed: uuid names, referenced by path
+LEGACY_UPLOAD_DIR = "static/uploads"
+_LEGACY_NAME = re.compile(r"^[0-9a-f-]{36}\.[A-Za-z0-9]+$")
+
+# Columns that reference documents
+DOCUMENT_COLUMNS = [
+    ProviderRegistrationRequest.id_verification,
+    ProviderRegistrationRequest.certification,
+    ServiceProvider.id_verification,
+    ServiceProvider.certification,
+]
+
+
+def is_document_key(value) -> bool:
+    """False for empty values and for paths stored before the document store."""
+    return bool(value) and bool(_KEY.match(value))
+
+
+class LocalDocumentBackend:
+    """Files under root/ab/cd/<key>, sharded on the first hash bytes."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def put(self, source_path: str, key: str):
+        """
+        Moves a finished file into the store. If the content is already there,
+        only its modified time is refreshed, so the garbage collector's grace
+        period for stray files restarts for the reused copy as well.
+        """
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.utime(path)
+            os.remove(source_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source_path, path)
+
+    def open(self, key: str):
+        return open(self.path_for(key), "rb")
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self):
+        """Yields (key, modified time) for every stored file."""
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            for name in files:
+                if is_document_key(name):
+                    yield name, os.path.getmtime(os.path.join(directory, name))
+
+
+class S3DocumentBackend:
+    """
+    Objects in an S3-compatible bucket (AWS, MinIO), so every API node sees the
+    same files. Needs boto3; credentials come from the usual AWS_* variables.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, prefix: str = "documents/"):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("DOCUMENT_STORE_BACKEND=s3 needs boto3 (pip install boto3)")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client_error = ClientError
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key[:2]}/{key[2:4]}/{key}"
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put(self, source_path: str, key: str):
+        try:
+            object_key = self._object_key(key)
+            if not self.exists(key):
+                self.client.upload_file(source_path, self.bucket, object_key)
+            else:
+                # Copying onto itself refreshes LastModified, like os.utime for local files
+                self.client.copy_object(Bucket=self.bucket, Key=object_key, MetadataDirective="REPLACE",
+                                        CopySource={"Bucket": self.bucket, "Key": object_key})
+        finally:
+            os.remove(source_path)
+
+    def open(self, key: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))["Body"]
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def presigned_url(self, key: str, expires_in: int = 300) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._object_key(key)}, ExpiresIn=expires_in
+        )
+
+    def list_keys(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                name = item["Key"].rsplit("/", 1)[-1]
+                if is_document_key(name):
+                    yield name, item["LastModified"].timestamp()
+
+
+def make_document_backend():
+    if DOCUMENT_STORE_BACKEND == "s3":
+        return S3DocumentBackend(
+            bucket=os.getenv("DOCUMENT_STORE_BUCKET", "homehelp-documents"),
+            endpoint_url=os.getenv("DOCUMENT_STORE_ENDPOINT")
+        )
+    return LocalDocumentBackend(DOCUMENT_STORE_ROOT)
+
+
+document_backend = make_document_backend()
+
+
+def prepare_document_store():
+    """Creates the staging directory; called once at startup rather than on import."""
+    os.makedirs(DOCUMENT_STAGING_DIR, exist_ok=True)
+
+
+def resolve_document(name: str):
+    """
+    For a document file name, returns (the value the referencing columns hold,
+    its local path or None when the backend is remote); None for any other name.
+    """
+    if is_document_key(name):
+        local = isinstance(document_backend, LocalDocumentBackend)
+        return name, document_backend.path_for(name) if local else None
+    if _LEGACY_NAME.match(name):
+        return f"{LEGACY_UPLOAD_DIR}/{name}", os.path.join(LEGACY_UPLOAD_DIR, name)
+    return None
+
+
+async def store_document(db, upload_file: UploadFile) -> str:
+    """
+    Stores an upload and returns its document key. The documents row is written
+    (or touched, which restarts its GC grace period) before the file is put, so
+    a concurrent garbage collection cannot remove content that is being reused.
+    The caller adds the reference with ref_count_updates in the same commit.
+    """
+    staged = await save_upload_file(upload_file, DOCUMENT_STAGING_DIR)
+    try:
+        key = staged.sha256 + os.path.splitext(staged.path)[1]
+        now = datetime.utcnow()
+        await db.execute(
+            pg_insert(Document)
+            .values(key=key, content_type=staged.content_type, size=staged.size,
+                    ref_count=0, created_at=now, updated_at=now)
+            .on_conflict_do_update(index_elements=[Document.key], set_={"updated_at": now})
+        )
+        await run_in_threadpool(document_backend.put, staged.path, key)
+        return key
+    finally:
+        await discard_upload(staged.path)
+
+
+def ref_count_updates(added=(), removed=()):
+    """
+    UPDATE statements applying the net reference change for each document key.
+    Execute them in the same transaction as the row change that adds or drops
+    the references.
+    """
+    deltas = Counter(key for key in added if is_document_key(key))
+    deltas.subtract(key for key in removed if is_document_key(key))
+    now = datetime.utcnow()
+    return [
+        update(Document)
+        .where(Document.key == key)
+        .values(ref_count=Document.ref_count + delta, updated_at=now)
+        for key, delta in deltas.items() if delta
+    ]
+
+
+def collect_garbage(db) -> dict:
+    """
+    Recounts references, then deletes unreferenced documents and stray files
+    (no documents row) older than the grace period. Takes a sync Session.
+    Rows are deleted and locked before their files are removed, and only
+    committed afterwards, so a concurrent store_document of the same content
+    waits and then re-creates the file.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=DOCUMENT_GC_GRACE_SECONDS)
+
+    # Counters can drift if a row is changed outside the API; the columns are the truth
+    references = sum(
+        (select(func.count()).where(column == Document.key).scalar_subquery() for column in DOCUMENT_COLUMNS)
+    )
+    recounted = db.execute(
+        update(Document)
+        .where(Document.ref_count != references)
+        .values(ref_count=references)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+
+    try:
+        deleted = db.execute(
+            delete(Document)
+            .where(Document.ref_count <= 0, or_(Document.updated_at < cutoff, Document.updated_at.is_(None)))
+            .returning(Document.key)
+        ).scalars().all()
+        for key in deleted:
+            document_backend.delete(key)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # Files whose row was never committed (failed request, crashed worker)
+    known = set(db.execute(select(Document.key)).scalars().all())
+    oldest = time.time() - DOCUMENT_GC_GRACE_SECONDS
+    strays = [key for key, modified in document_backend.list_keys() if key not in known and modified < oldest]
+    for key in strays:
+        document_backend.delete(key)
+
+    # Leftovers from interrupted uploads
+    for name in os.listdir(DOCUMENT_STAGING_DIR) if os.path.isdir(DOCUMENT_STAGING_DIR) else []:
+        path = os.path.join(DOCUMENT_STAGING_DIR, name)
+        if os.path.getmtime(path) < oldest:
+            os.remove(path)
+
+    return {"recounted": recounted, "deleted": len(deleted), "strays": len(strays)}
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(collect_garbage(session))
+    finally:
+        session.close()
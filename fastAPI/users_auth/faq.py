@@ -0,0 +1,210 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+# Most chat traffic is the same handful of platform questions. Those are
+# answered from curated FAQ entries through a small TF-IDF index; only
+# questions whose best match scores below FAQ_MIN_SCORE go to the model.
+# FAQ_MIN_SCORE=1.01 (above any cosine) sends everything to the model.
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.55"))
+
+FOLLOW_UP = " Is there anything else I can help you with?"
+
+# Each entry: a few ways people ask it, and the answer. Keep answers to what
+# SYSTEM_INSTRUCTION allows the assistant to say.
+FAQ_ENTRIES = [
+    {
+        "questions": [
+            "How do I find a service provider?",
+            "How do I find a plumber or electrician?",
+            "How can I search for a worker near me?",
+            "How does the recommendation system work?",
+        ],
+        "answer": "Search for the service you need, such as plumbing or cleaning, and browse the results. "
+                  "HomeHelp Connect also uses a recommendation system that suggests professionals based on "
+                  "your needs and preferences, so the right workers are easy to find.",
+    },
+    {
+        "questions": [
+            "How do I book a service?",
+            "How does booking work?",
+            "How can I hire a worker?",
+            "How do I make a booking request?",
+        ],
+        "answer": "Open the service you want and send a booking request with your preferred date and any "
+                  "details. The provider accepts or declines it, and you can follow its status under your "
+                  "bookings. Booking through the platform keeps everything safe and on record.",
+    },
+    {
+        "questions": [
+            "How do I pay for a service?",
+            "How do payments work?",
+            "Is payment secure?",
+            "What payment methods can I use?",
+        ],
+        "answer": "Payments are made through the platform, which handles them securely so neither side has to "
+                  "share payment details directly. I can't quote exact prices; those are set per service by "
+                  "each provider.",
+    },
+    {
+        "questions": [
+            "How do I message a provider?",
+            "Can I chat with the worker?",
+            "How do I contact a homeowner?",
+            "Is there real time messaging?",
+        ],
+        "answer": "Homeowners and workers can chat in real time on the platform, for example to agree on "
+                  "details before or after a booking. Keeping conversations on the platform also keeps "
+                  "your personal contact information private.",
+    },
+    {
+        "questions": [
+            "How do reviews and ratings work?",
+            "Can I leave a review for a worker?",
+            "Are reviews verified?",
+            "How do I rate a service provider?",
+        ],
+        "answer": "After a job, homeowners can rate and review the professional. Reviews and ratings are "
+                  "verified, so they reflect real bookings and help everyone choose workers they can trust.",
+    },
+    {
+        "questions": [
+            "How do I become a service provider?",
+            "How do I register as a worker?",
+            "How can I offer my services?",
+            "How does provider verification work?",
+        ],
+        "answer": "Register as a service provider and upload your ID and a certification. An admin reviews "
+                  "them, and once your account is verified you can list your services and start receiving "
+                  "bookings, building your reputation and reaching more clients.",
+    },
+    {
+        "questions": [
+            "How do I create an account?",
+            "How do I sign up as a homeowner?",
+            "How do I register?",
+        ],
+        "answer": "Choose Sign up, pick whether you are a homeowner or a service provider, and enter your name, "
+                  "email and a password. Homeowners can start browsing and booking right away.",
+    },
+    {
+        "questions": [
+            "I forgot my password",
+            "How do I change my password?",
+            "I can't log in to my account",
+            "How do I update my profile?",
+        ],
+        "answer": "You can update your details from your account page. If you can't sign in, check that you "
+                  "picked the right account type (homeowner or service provider) on the sign-in page; if it "
+                  "still fails, please contact HomeHelp Connect support so they can help you get back in.",
+    },
+    {
+        "questions": [
+            "Is the platform safe?",
+            "Are the workers verified?",
+            "How do you keep homeowners safe?",
+            "Can I trust the professionals?",
+        ],
+        "answer": "Service providers are verified by our admins before they can offer services, bookings and "
+                  "messages stay on the platform, and verified reviews show how each professional has worked "
+                  "for others. Please never share personal information that a booking does not need.",
+    },
+    {
+        "questions": [
+            "What is HomeHelp Connect?",
+            "What does this platform do?",
+            "Why should I use HomeHelp Connect?",
+        ],
+        "answer": "HomeHelp Connect connects homeowners with skilled professionals for household tasks. "
+                  "Homeowners get a convenient, reliable way to find and book help, and workers get a chance "
+                  "to grow their reputation and reach more clients.",
+    },
+]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be can do does for from how i if in is it me my of on or so the there this "
+    "to up use what when where which who why will with you your".split()
+)
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ers", "er", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str):
+    return [_stem(word) for word in _TOKEN.findall(text.lower()) if word not in STOP_WORDS]
+
+
+class FaqIndex:
+    """TF-IDF vectors of every FAQ question variant, matched by cosine similarity."""
+
+    def __init__(self, entries, min_score: float):
+        self.entries = entries
+        self.min_score = min_score
+        variants = [
+            (i, Counter(tokenize(question)))
+            for i, entry in enumerate(entries) for question in entry["questions"]
+        ]
+        document_frequency = Counter(term for _, terms in variants for term in terms)
+        count = len(variants)
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.unknown_idf = math.log(1 + count) + 1
+        self.vectors = [(i, self._vector(terms)) for i, terms in variants]
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _vector(self, terms: Counter) -> dict:
+        # Words the FAQ never uses can't match anything, but still count
+        # against the question so a long unrelated question scores low
+        vector = {term: (1 + math.log(tf)) * self.idf.get(term, self.unknown_idf)
+                  for term, tf in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+    def best_match(self, question: str):
+        """(entry index, score) of the closest FAQ question, or (None, 0.0)."""
+        query = self._vector(Counter(tokenize(question)))
+        best, best_score = None, 0.0
+        for i, vector in self.vectors:
+            score = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+            if score > best_score:
+                best, best_score = i, score
+        return best, best_score
+
+    def answer(self, question: str, min_score: float = None):
+        """The curated answer when the best match clears min_score, else None."""
+        started = time.perf_counter()
+        i, score = self.best_match(question)
+        hit = i is not None and score >= (self.min_score if min_score is None else min_score)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.lookups += 1
+            self.hits += hit
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+        return self.entries[i]["answer"] + FOLLOW_UP if hit else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "min_score": self.min_score,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "avg_ms": round(self.total_ms / self.lookups, 3) if self.lookups else 0.0,
+                "max_ms": round(self.max_ms, 3),
+            }
+
+
+faq_index = FaqIndex(FAQ_ENTRIES, FAQ_MIN_SCORE)
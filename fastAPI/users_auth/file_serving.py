@@ -0,0 +1,144 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from fastapi import Request
+from fastapi.responses import Response
+
+from response_cache import etag_matches
+
+# Files on local disk (documents, image derivatives, legacy uploads). Under
+# uvicorn the body is read in large chunks off the event loop; servers that
+# offer the ASGI zero-copy extension get a sendfile instead. Behind nginx,
+# set FILE_ACCEL_REDIRECT_PREFIX to an internal location aliased to
+# FILE_ROOT: the API only checks access and nginx sends the file itself.
+FILE_ROOT = os.getenv("FILE_ROOT", "static")
+FILE_ACCEL_REDIRECT_PREFIX = os.getenv("FILE_ACCEL_REDIRECT_PREFIX")
+FILE_CHUNK_SIZE = 256 * 1024
+
+# For files whose name changes whenever their content does (hash or uuid names)
+IMMUTABLE_PUBLIC = "public, max-age=31536000, immutable"
+IMMUTABLE_PRIVATE = "private, max-age=31536000, immutable"
+
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header, size: int):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to send the whole
+    file (no header, or several ranges), or "unsatisfiable".
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _not_modified_since(header, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+class RangeFileResponse(Response):
+    """Sends all or part of a file; headers are already computed by file_response."""
+
+    def __init__(self, path: str, start: int, length: int, status_code: int, headers: dict, send_body: bool):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.length = length
+        self.send_body = send_body
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if ZERO_COPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": ZERO_COPY_EXTENSION, "file": f.fileno(), "offset": self.start, "count": self.length})
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            remaining = self.length
+            while remaining:
+                chunk = await f.read(min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                # The file shrank underneath us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b""})
+
+
+def file_response(request: Request, path: str, content_type: str, cache_control: str) -> Response:
+    """
+    Serves `path` with validators (ETag, Last-Modified), conditional requests
+    (If-None-Match, If-Modified-Since -> 304) and single byte ranges (206,
+    If-Range aware). Raises FileNotFoundError if the file is missing.
+    """
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+        if_none_match is None and _not_modified_since(request.headers.get("if-modified-since"), stat.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    if FILE_ACCEL_REDIRECT_PREFIX:
+        internal = os.path.relpath(path, FILE_ROOT).replace(os.sep, "/")
+        return Response(headers={
+            **headers,
+            "X-Accel-Redirect": f"{FILE_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{internal}",
+            "Content-Type": content_type,
+        })
+
+    size = stat.st_size
+    byte_range = parse_range(request.headers.get("range"), size)
+    if_range = request.headers.get("if-range")
+    if byte_range is not None and if_range and if_range != etag and if_range != headers["Last-Modified"]:
+        byte_range = None  # The client's copy is outdated; send the whole file
+
+    if byte_range == "unsatisfiable":
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    send_body = request.method != "HEAD"
+    headers["Content-Type"] = content_type
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return RangeFileResponse(path, 0, size, 200, headers, send_body)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return RangeFileResponse(path, start, end - start + 1, 206, headers, send_body)
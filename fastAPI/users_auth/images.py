@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import re
+import socket
+from io import BytesIO
+
+import httpx
+from PIL import Image, ImageOps
+from sqlalchemy import select, update
+from starlette.concurrency import run_in_threadpool
+
+from models import Service
+
+logger = logging.getLogger(__name__)
+
+# Service images are whatever URL the provider gave us, often a full-size
+# photo. A background worker fetches each new image once and writes resized
+# WebP and JPEG copies at IMAGE_WIDTHS; listings then pick the smallest one
+# that fits. Derivatives are named by the source's SHA-256, so they never
+# change once written and a shared image is only processed once.
+IMAGE_WIDTHS = (320, 640, 1280)
+IMAGE_FORMATS = {"webp": {"quality": 80, "method": 4}, "jpeg": {"quality": 82, "optimize": True, "progressive": True}}
+IMAGE_VARIANT_DIR = os.getenv("IMAGE_VARIANT_DIR", "static/images")
+IMAGE_URL_PREFIX = os.getenv("IMAGE_URL_PREFIX", "/media/images")
+IMAGE_MAX_SOURCE_BYTES = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", str(15 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+IMAGE_MAX_REDIRECTS = int(os.getenv("IMAGE_MAX_REDIRECTS", "3"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Services still missing derivatives that are queued again at startup
+IMAGE_BACKFILL_LIMIT = int(os.getenv("IMAGE_BACKFILL_LIMIT", "500"))
+
+# Refuse decompression bombs (about 8k x 8k)
+Image.MAX_IMAGE_PIXELS = 64_000_000
+
+
+class ImageSourceError(Exception):
+    """The source image cannot be fetched or decoded; the service keeps its original image only."""
+
+
+def _public_address(url: httpx.URL) -> str:
+    """
+    Resolves the URL's host once and returns the address to connect to.
+    Providers choose the URL, so never let it point the server at itself or
+    the internal network: every address the name resolves to must be public.
+    """
+    if url.scheme not in ("http", "https") or not url.host:
+        raise ImageSourceError(f"unsupported image URL: {url}")
+    host = url.raw_host.decode("ascii")
+    try:
+        infos = socket.getaddrinfo(host, url.port or (443 if url.scheme == "https" else 80), type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ImageSourceError(f"cannot resolve image host {host}: {e}")
+    addresses = [info[4][0] for info in infos]
+    for address in addresses:
+        ip = ipaddress.ip_address(address)
+        if not ip.is_global or ip.is_multicast:
+            raise ImageSourceError(f"image host is not public: {host}")
+    return addresses[0]
+
+
+def _pinned_request(client: httpx.Client, url: httpx.URL) -> httpx.Request:
+    # Connect to the address that was checked rather than resolving the name
+    # again (DNS rebinding); Host and TLS SNI/certificate still use the name
+    return client.build_request(
+        "GET", url.copy_with(host=_public_address(url)),
+        headers={"Host": url.netloc.decode("ascii")},
+        extensions={"sni_hostname": url.raw_host.decode("ascii")},
+    )
+
+
+def fetch_source(url: str) -> bytes:
+    target = httpx.URL(url)
+    with httpx.Client(timeout=IMAGE_FETCH_TIMEOUT, follow_redirects=False) as client:
+        for _ in range(IMAGE_MAX_REDIRECTS + 1):
+            response = client.send(_pinned_request(client, target), stream=True)
+            try:
+                if response.is_redirect:
+                    # Checked again on the next pass, like the first URL
+                    target = target.join(response.headers["location"])
+                    continue
+                if response.status_code != 200:
+                    raise ImageSourceError(f"image fetch returned {response.status_code}: {url}")
+                data = bytearray()
+                for chunk in response.iter_bytes():
+                    data.extend(chunk)
+                    if len(data) > IMAGE_MAX_SOURCE_BYTES:
+                        raise ImageSourceError(f"image larger than {IMAGE_MAX_SOURCE_BYTES} bytes: {url}")
+                return bytes(data)
+            finally:
+                response.close()
+    raise ImageSourceError(f"more than {IMAGE_MAX_REDIRECTS} redirects: {url}")
+
+
+def _write_atomically(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.part"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def render_variants(source: bytes) -> list:
+    """
+    Writes the derivatives of one source image and returns their descriptions
+    ({"width", "height", "format", "url"}), smallest first. Widths above the
+    source's own are skipped rather than upscaled.
+    """
+    digest = hashlib.sha256(source).hexdigest()
+    try:
+        with Image.open(BytesIO(source)) as opened:
+            opened.load()
+            image = ImageOps.exif_transpose(opened)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImageSourceError(f"cannot decode image: {e}")
+
+    widths = [w for w in IMAGE_WIDTHS if w < image.width] + [min(image.width, IMAGE_WIDTHS[-1])]
+    variants = []
+    for width in sorted(set(widths)):
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+        for fmt, options in IMAGE_FORMATS.items():
+            name = f"{digest[:2]}/{digest}-{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+            path = os.path.join(IMAGE_VARIANT_DIR, name)
+            if not os.path.exists(path):
+                frame = resized
+                if fmt == "jpeg" and frame.mode != "RGB":
+                    frame = frame.convert("RGB")
+                elif frame.mode not in ("RGB", "RGBA"):
+                    frame = frame.convert("RGBA")
+                buffer = BytesIO()
+                frame.save(buffer, format=fmt.upper(), **options)
+                _write_atomically(path, buffer.getvalue())
+            variants.append({
+                "width": resized.width,
+                "height": resized.height,
+                "format": fmt,
+                "url": f"{IMAGE_URL_PREFIX}/{name}",
+            })
+    return variants
+
+
+def build_variants(image_url: str) -> list:
+    return render_variants(fetch_source(image_url))
+
+
+_VARIANT_NAME = re.compile(r"^([0-9a-f]{2})/[0-9a-f]{64}-\d+\.(webp|jpg)$")
+
+
+def variant_path(name: str):
+    """Local path of a derivative from its URL path below IMAGE_URL_PREFIX, or None if not one."""
+    match = _VARIANT_NAME.match(name)
+    if not match or not name.startswith(match.group(1), 3):
+        return None
+    return os.path.join(IMAGE_VARIANT_DIR, name), "image/webp" if match.group(2) == "webp" else "image/jpeg"
+
+
+def has_remote_image(image) -> bool:
+    """Only absolute URLs are processed; relative paths are frontend assets (placeholders)."""
+    return bool(image) and image.startswith(("http://", "https://"))
+
+
+class ImagePipeline:
+    """
+    In-process queue of (service id, image URL) drained by IMAGE_WORKERS
+    tasks. Decoding and resizing run in the threadpool. Jobs lost on restart
+    are picked up by the startup backfill.
+    """
+
+    def __init__(self, session_factory, on_updated=None):
+        self.session_factory = session_factory
+        self.on_updated = on_updated
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self.processed = 0
+        self.failed = 0
+
+    def submit(self, service_id: int, image):
+        if has_remote_image(image):
+            self.queue.put_nowait((service_id, image))
+
+    def start(self, workers: int = IMAGE_WORKERS):
+        self.workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def _work(self):
+        while True:
+            service_id, image = await self.queue.get()
+            try:
+                try:
+                    variants = await run_in_threadpool(build_variants, image)
+                    self.processed += 1
+                except ImageSourceError as e:
+                    # Stored as an empty list so the backfill does not retry it forever
+                    variants = []
+                    self.failed += 1
+                    logger.warning("Skipping image derivatives for service %s: %s", service_id, e)
+                await run_in_threadpool(self._save, service_id, image, variants)
+            except Exception:
+                self.failed += 1
+                logger.exception("Error building image derivatives for service %s", service_id)
+            finally:
+                self.queue.task_done()
+
+    def _save(self, service_id: int, image: str, variants: list):
+        db = self.session_factory()
+        try:
+            # Skip if the image changed again meanwhile; that change has its own job
+            provider_id = db.execute(
+                update(Service)
+                .where(Service.id == service_id, Service.image == image)
+                .values(image_variants=variants)
+                .returning(Service.provider_id)
+            ).scalar()
+            db.commit()
+        finally:
+            db.close()
+        if provider_id is not None and self.on_updated:
+            self.on_updated(service_id, provider_id)
+
+    def _missing(self, limit: int):
+        db = self.session_factory()
+        try:
+            return db.execute(
+                select(Service.id, Service.image)
+                .where(Service.image_variants.is_(None), Service.image.like("http%"))
+                .order_by(Service.id.desc())
+                .limit(limit)
+            ).all()
+        finally:
+            db.close()
+
+    async def backfill(self, limit: int = IMAGE_BACKFILL_LIMIT) -> int:
+        """Queues services whose derivatives were never built."""
+        rows = await run_in_threadpool(self._missing, limit)
+        for service_id, image in rows:
+            self.submit(service_id, image)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "processed": self.processed, "failed": self.failed}
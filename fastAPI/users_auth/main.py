@@ -1,24 +1,63 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form, status, Body, Request
-from fastapi.responses import JSONResponse
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Form, status, Body, Request, Response, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-import shutil
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session, selectinload, joinedload, contains_eager
 import os
+import json
+import secrets
 from datetime import datetime
-from typing import Annotated, Optional, List
-import uuid
-from fastapi.security import OAuth2PasswordBearer
+from typing import Annotated, Optional, List, Literal
+import asyncio
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 from schemas import BookingCreate, BookingResponse, ChatResponse, ChatInput
 
-from jose import JWTError, jwt
-from typing import Annotated
-
-SECRET_KEY = "your_secret_key_here"  
-ALGORITHM = "HS256"  
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="admin/login")
-
-from database import get_db, engine
-from auth import hash_password, verify_password, create_access_token, get_current_admin_user, get_current_super_admin, get_current_user
+from database import get_db, get_async_db, SessionLocal, pool_stats, warm_pools
+from principal_cache import principal_cache, invalidate_principal
+from db_routing import (
+    replica_router,
+    read_session,
+    read_session_scope,
+    sync_read_session,
+    ReadYourWritesMiddleware,
+    REPLICA_CHECK_SECONDS
+)
+from pagination import (
+    NEXT_CURSOR_HEADER,
+    TOTAL_COUNT_HEADER,
+    TOTAL_ESTIMATED_HEADER,
+    encode_cursor,
+    decode_cursor,
+    after_nulls_last,
+    nulls_last_order,
+    keyset_page,
+    stream_keyset_page,
+    count_rows
+)
+from auth import (
+    oauth2_scheme,
+    hash_password_async,
+    verify_and_update_password,
+    release_connection,
+    save_password_hash,
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    revoke_token,
+    sync_revoked_tokens,
+    REVOCATION_SYNC_SECONDS,
+    build_profile_claims,
+    principal_from_claims,
+    get_homeowner_id,
+    get_provider_profile,
+    get_current_admin_user,
+    get_current_super_admin,
+    get_current_user
+)
 from models import (
     Base, 
     User, 
@@ -33,12 +72,82 @@ from models import (
     BookingStatus
 )
 from schemas import ServiceCreate,AdminCreate,AdminResponse,Service as ServiceSchema, Token, ServiceUpdate
+from schemas import HomeOwnerProfile, RefreshRequest, LogoutRequest, ServiceSearchResult, SuggestionResponse
+from search import search_services_query, APPROXIMATE_HEADER
+from suggest import suggest_index, load_suggest_index, sync_suggest_index, SUGGEST_SYNC_SECONDS
+from uploads import UploadSizeLimitMiddleware
+from profiling import ProfilingMiddleware, render_metrics, METRICS_TOKEN
+from document_store import (
+    store_document, ref_count_updates, collect_garbage, resolve_document, document_backend,
+    prepare_document_store, DOCUMENT_GC_INTERVAL_SECONDS
+)
+from images import ImagePipeline, variant_path, IMAGE_URL_PREFIX
+from file_serving import file_response, IMMUTABLE_PUBLIC, IMMUTABLE_PRIVATE
+import logging
+import mimetypes
+from response_cache import catalog_cache, PUBLIC_CACHE_CONTROL, PRIVATE_CACHE_CONTROL
+from pydantic import TypeAdapter
+
+from chat_assistant import Ai_Assistant, get_assistant, current_assistant
+from chat_sessions import chat_sessions
+
+# Log level for the app's own loggers (uvicorn keeps its own configuration)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+# httpx logs every request (image fetches) at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Startup does no more than it must so new workers take traffic quickly: the
+# schema is managed by migrations.py (`python initial_setup.py` runs them);
+# the chat assistant is built on first use; the suggestion index, image
+# backfill and replica checks load in the background. STARTUP_PREWARM=1 instead waits for the
+# suggestion index and opens the connection pools before serving.
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "0").lower() in ("1", "true", "yes")
+# Import plus startup; exceeding it is logged
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "2000"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    prepare_document_store()
+    if STARTUP_PREWARM:
+        await asyncio.gather(run_in_threadpool(refresh_suggest_index), warm_pools())
+    image_pipeline.start()
+    tasks = [
+        asyncio.create_task(keep_suggest_index_fresh(load_first=not STARTUP_PREWARM)),
+        asyncio.create_task(backfill_images()),
+        asyncio.create_task(collect_document_garbage_periodically()),
+        asyncio.create_task(sync_revoked_tokens_periodically()),
+    ]
+    if replica_router.replicas:
+        tasks.append(asyncio.create_task(check_replicas_periodically()))
+
+    timings = {
+        "import_ms": round((IMPORT_FINISHED - IMPORT_STARTED) * 1000, 1),
+        "startup_ms": round((time.perf_counter() - started) * 1000, 1),
+        "prewarm": STARTUP_PREWARM,
+        "budget_ms": STARTUP_BUDGET_MS,
+    }
+    app.state.startup = timings
+    total_ms = timings["import_ms"] + timings["startup_ms"]
+    logger.info("Started in %.0f ms (import %.0f ms, startup %.0f ms)",
+                total_ms, timings["import_ms"], timings["startup_ms"])
+    if total_ms > STARTUP_BUDGET_MS:
+        logger.warning("Startup took longer than STARTUP_BUDGET_MS=%.0f", STARTUP_BUDGET_MS)
+
+    yield
 
-app = FastAPI()
+    for task in tasks + image_pipeline.workers:
+        task.cancel()
+    await asyncio.gather(*tasks, *image_pipeline.workers, return_exceptions=True)
 
-from chat_assistant import Ai_Assistant
+app = FastAPI(lifespan=lifespan)
 
-assistant = Ai_Assistant()
+# Refuse oversized document uploads before their body is read
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Keep a user's reads on the primary right after they write
+app.add_middleware(ReadYourWritesMiddleware)
 
 # Configure CORSnpm run dev
 app.add_middleware(
@@ -50,27 +159,94 @@ app.add_middleware(
     expose_headers=["*"] 
 )
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Outermost, so its timings cover the other middleware too
+app.add_middleware(ProfilingMiddleware)
+
+def catalog_changed(provider_id: int):
+    # Cached pages go stale, and replicas may not have the change yet
+    catalog_cache.bump("catalog", f"provider:{provider_id}")
+    replica_router.note_write("catalog")
 
-UPLOAD_DIR = "static/uploads/"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+image_pipeline = ImagePipeline(SessionLocal, on_updated=lambda service_id, provider_id: catalog_changed(provider_id))
 
-def save_upload_file(upload_file: UploadFile, destination: str) -> str:
+def refresh_suggest_index():
+    db = SessionLocal()
     try:
-        file_ext = os.path.splitext(upload_file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(destination, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
-            
-        return file_path
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error saving file: {str(e)}"
-        )
+        count = load_suggest_index(db)
+        logger.info("Suggestion index loaded from %d services", count)
+    finally:
+        db.close()
+
+def sync_suggestions():
+    db = SessionLocal()
+    try:
+        sync_suggest_index(db)
+    finally:
+        db.close()
+
+async def keep_suggest_index_fresh(load_first: bool):
+    # Loaded once; after that only other workers' changes are applied
+    while load_first:
+        try:
+            await run_in_threadpool(refresh_suggest_index)
+            load_first = False
+        except Exception:
+            logger.exception("Error loading suggestion index")
+            await asyncio.sleep(SUGGEST_SYNC_SECONDS)
+    while True:
+        await asyncio.sleep(SUGGEST_SYNC_SECONDS)
+        try:
+            await run_in_threadpool(sync_suggestions)
+        except Exception:
+            logger.exception("Error syncing suggestion index")
+
+def collect_document_garbage():
+    db = SessionLocal()
+    try:
+        result = collect_garbage(db)
+        if any(result.values()):
+            logger.info("Document garbage collection: %s", result)
+    finally:
+        db.close()
+
+async def collect_document_garbage_periodically():
+    while True:
+        await asyncio.sleep(DOCUMENT_GC_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(collect_document_garbage)
+        except Exception:
+            logger.exception("Error collecting document garbage")
+
+def load_revoked_tokens():
+    db = SessionLocal()
+    try:
+        sync_revoked_tokens(db)
+    finally:
+        db.close()
+
+async def sync_revoked_tokens_periodically():
+    while True:
+        try:
+            await run_in_threadpool(load_revoked_tokens)
+        except Exception:
+            logger.exception("Error syncing revoked tokens")
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+
+async def check_replicas_periodically():
+    while True:
+        try:
+            await run_in_threadpool(replica_router.check_all)
+        except Exception:
+            logger.exception("Error checking replicas")
+        await asyncio.sleep(REPLICA_CHECK_SECONDS)
+
+async def backfill_images():
+    try:
+        queued = await image_pipeline.backfill()
+        if queued:
+            logger.info("Queued image derivatives for %d services", queued)
+    except Exception:
+        logger.exception("Error queueing image derivatives")
 
 # Modify the registration endpoint to make documents optional
 
@@ -84,20 +260,22 @@ async def register_provider_request(
     years_experience: Annotated[Optional[int], Form()] = None,
     id_verification: Optional[UploadFile] = File(None),
     certification: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     try:
         # Check if email exists in either User or ProviderRegistrationRequest
-        if (db.query(User).filter(User.email == email).first() or
-           db.query(ProviderRegistrationRequest).filter(ProviderRegistrationRequest.email == email).first()):
+        if ((await db.execute(select(User.id).where(User.email == email))).first() or
+           (await db.execute(select(ProviderRegistrationRequest.id).where(ProviderRegistrationRequest.email == email))).first()):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
+        await release_connection(db)
+        password_hash = await hash_password_async(password)
 
         # Handle file uploads if provided
-        id_path = save_upload_file(id_verification, UPLOAD_DIR) if id_verification else None
-        cert_path = save_upload_file(certification, UPLOAD_DIR) if certification else None
+        id_key = await store_document(db, id_verification) if id_verification else None
+        cert_key = await store_document(db, certification) if certification else None
 
         # Create registration request instead of direct User/ServiceProvider
         registration_request = ProviderRegistrationRequest(
@@ -106,29 +284,31 @@ async def register_provider_request(
             phone_number=phone_number,
             address=address,
             years_experience=years_experience,
-            password_hash=hash_password(password),
-            id_verification=id_path,
-            certification=cert_path,
+            password_hash=password_hash,
+            id_verification=id_key,
+            certification=cert_key,
             status=RegistrationStatus.PENDING.value,
             requested_at=datetime.utcnow()
         )
 
         db.add(registration_request)
-        db.commit()
+        for statement in ref_count_updates(added=[id_key, cert_key]):
+            await db.execute(statement)
+        await db.commit()
 
         return JSONResponse(
             status_code=201,
             content={
                 "message": "Registration request submitted successfully. Please wait for admin approval.",
                 "request_id": registration_request.id,
-                "needs_documents": not (id_path and cert_path),
+                "needs_documents": not (id_key and cert_key),
                 "redirect_to": "/login"
             }
         )
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error submitting registration request: {str(e)}"
@@ -138,13 +318,11 @@ async def register_provider_request(
 async def upload_provider_documents(
     id_verification: UploadFile = File(...),
     certification: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        # Debug logging - print the entire current_user object
-        print(f"Current user: {current_user}")
-        print(f"User role: {current_user.role}")
+        logger.debug("Document upload by user %s (role %s)", current_user.id, current_user.role)
         
         if current_user.role != UserRole.SERVICEPROVIDERS.value:
             raise HTTPException(
@@ -152,24 +330,30 @@ async def upload_provider_documents(
                 detail="Only service providers can upload documents"
             )
 
-        # Save documents
-        id_path = save_upload_file(id_verification, UPLOAD_DIR)
-        cert_path = save_upload_file(certification, UPLOAD_DIR)
-
-        # Update provider record
-        provider = db.query(ServiceProvider).filter(ServiceProvider.user_id == current_user.id).first()
+        provider = (await db.execute(
+            select(ServiceProvider).where(ServiceProvider.user_id == current_user.id)
+        )).scalars().first()
         if not provider:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Provider not found"
             )
 
-        provider.id_verification = id_path
-        provider.certification = cert_path
+        # Save documents
+        id_key = await store_document(db, id_verification)
+        cert_key = await store_document(db, certification)
+
+        # Update provider record; the documents it replaces lose a reference
+        replaced = [provider.id_verification, provider.certification]
+        provider.id_verification = id_key
+        provider.certification = cert_key
         provider.is_verified = False  # Needs admin approval
         
         db.add(provider)
-        db.commit()
+        for statement in ref_count_updates(added=[id_key, cert_key], removed=replaced):
+            await db.execute(statement)
+        await db.commit()
+        invalidate_principal(current_user.email)
 
         return {
             "message": "Documents uploaded successfully. Please wait for admin approval.",
@@ -179,7 +363,7 @@ async def upload_provider_documents(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error uploading documents: {str(e)}"
@@ -187,7 +371,7 @@ async def upload_provider_documents(
 
 @app.get("/provider/status")
 async def check_provider_status(
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     if current_user.role != UserRole.SERVICEPROVIDERS.value:
@@ -196,7 +380,7 @@ async def check_provider_status(
             detail="Only service providers can access this endpoint"
         )
     
-    provider = db.query(ServiceProvider).filter(ServiceProvider.user_id == current_user.id).first()
+    provider = await get_provider_profile(db, current_user)
     if not provider:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -205,7 +389,7 @@ async def check_provider_status(
     
     return {
         "is_verified": provider.is_verified,
-        "needs_documents": not (provider.id_verification and provider.certification)
+        "needs_documents": not provider.has_documents
     }
 
 
@@ -213,27 +397,28 @@ async def check_provider_status(
 @app.post("/register/admin/")
 async def register_admin(
     admin_data: AdminCreate,
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_super_admin)  # Only super admins can create new admins
 ):
     try:
         # Check if email exists
-        if db.query(User).filter(User.email == admin_data.email).first():
+        if (await db.execute(select(User.id).where(User.email == admin_data.email))).first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
+        await release_connection(db)
 
         # Create base User
         new_user = User(
             email=admin_data.email,
-            password_hash=hash_password(admin_data.password),
+            password_hash=await hash_password_async(admin_data.password),
             full_name=admin_data.full_name,
             role=UserRole.ADMIN.value,
             is_active=True
         )
         db.add(new_user)
-        db.flush()  # Flush to get the user ID
+        await db.flush()  # Flush to get the user ID
 
         # Create Admin
         new_admin = Admin(
@@ -242,7 +427,8 @@ async def register_admin(
         )
 
         db.add(new_admin)
-        db.commit()
+        await db.commit()
+        invalidate_principal(new_user.email)
 
         return {
             "message": "Admin created successfully",
@@ -253,7 +439,7 @@ async def register_admin(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating admin: {str(e)}"
@@ -263,7 +449,7 @@ async def register_admin(
 @app.post("/admin/login")
 async def admin_login(
     credentials: dict = Body(...),
-    db: Session = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     try:
         email = credentials.get("email")
@@ -276,18 +462,25 @@ async def admin_login(
                 detail="Email and password are required"
             )
 
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(
+            select(User).options(selectinload(User.admin)).where(User.email == email)
+        )).scalars().first()
         if not user or user.role != UserRole.ADMIN.value:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid admin credentials"
             )
 
-        if not verify_password(password, user.password_hash):
+        await release_connection(db, user, user.admin)
+        is_valid, new_hash = await verify_and_update_password(password, user.password_hash)
+        if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid admin credentials"
             )
+        if new_hash:
+            await save_password_hash(db, User, user.id, new_hash)
+            invalidate_principal(user.email)
 
         # Now this will work because the relationship is properly defined
         if not user.admin:
@@ -307,7 +500,8 @@ async def admin_login(
                 "sub": user.email,
                 "user_id": user.id,
                 "role": user.role,
-                "is_super_admin": user.admin.is_super_admin
+                "is_super_admin": user.admin.is_super_admin,
+                **(await build_profile_claims(db, user))
             }
         )
         
@@ -316,6 +510,7 @@ async def admin_login(
         
         return {
             "token": access_token,
+            "refresh_token": create_refresh_token(user.email),
             "token_type": "bearer",
             "admin": {
                 "id": user.admin.id,
@@ -326,6 +521,8 @@ async def admin_login(
             "redirect_to": dashboard_url  # Add this line to specify where to redirect
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -335,8 +532,8 @@ async def admin_login(
 #Fetch available admins
 
 @app.get("/admins", response_model=List[AdminResponse])
-async def get_all_admins(
-    db: Session = Depends(get_db),
+def get_all_admins(
+    db: Session = Depends(sync_read_session()),
     current_user: User = Depends(get_current_super_admin)  # Only super admins can access
 ):
     """
@@ -345,7 +542,7 @@ async def get_all_admins(
     """
     try:
         # Query all admin users with their related User information
-        admins = db.query(Admin).join(User).all()
+        admins = db.query(Admin).join(Admin.user).options(contains_eager(Admin.user)).all()
         
         return [
             {
@@ -366,9 +563,9 @@ async def get_all_admins(
 
 # Admin Approval Endpoints
 @app.get("/admin/registration-requests")
-async def get_registration_requests(
+def get_registration_requests(
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(sync_read_session()),
     current_user: User = Depends(get_current_admin_user)
 ):
     try:
@@ -387,15 +584,15 @@ async def get_registration_requests(
 @app.post("/admin/registration-requests/{request_id}/approve")
 async def approve_registration(
     request_id: int,
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     try:
         # Get the registration request
-        registration_request = db.query(ProviderRegistrationRequest).filter(
+        registration_request = (await db.execute(select(ProviderRegistrationRequest).where(
             ProviderRegistrationRequest.id == request_id,
             ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
-        ).first()
+        ))).scalars().first()
 
         if not registration_request:
             raise HTTPException(
@@ -420,7 +617,7 @@ async def approve_registration(
             is_active=True
         )
         db.add(new_user)
-        db.flush()  # Flush to get the user ID
+        await db.flush()  # Flush to get the user ID
 
         # Create ServiceProvider linked to the User
         new_provider = ServiceProvider(
@@ -442,12 +639,16 @@ async def approve_registration(
 
         db.add(new_provider)
         db.add(registration_request)
-        db.commit()
+        # The provider row references the request's documents too
+        for statement in ref_count_updates(added=[new_provider.id_verification, new_provider.certification]):
+            await db.execute(statement)
+        await db.commit()
+        invalidate_principal(registration_request.email)
 
         # Get updated list of pending requests
-        pending_requests = db.query(ProviderRegistrationRequest).filter(
+        pending_requests = (await db.execute(select(ProviderRegistrationRequest).where(
             ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
-        ).all()
+        ))).scalars().all()
 
         return {
             "message": "Registration approved successfully",
@@ -458,7 +659,7 @@ async def approve_registration(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error approving registration: {str(e)}"
@@ -469,14 +670,14 @@ async def approve_registration(
 async def reject_registration(
     request_id: int,
     reason: str = Body(..., embed=True),
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_admin_user)
 ):
     try:
-        registration_request = db.query(ProviderRegistrationRequest).filter(
+        registration_request = (await db.execute(select(ProviderRegistrationRequest).where(
             ProviderRegistrationRequest.id == request_id,
             ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
-        ).first()
+        ))).scalars().first()
 
         if not registration_request:
             raise HTTPException(
@@ -490,12 +691,12 @@ async def reject_registration(
         registration_request.processed_by = current_user.id
 
         db.add(registration_request)
-        db.commit()
+        await db.commit()
 
         # Get updated list of pending requests
-        pending_requests = db.query(ProviderRegistrationRequest).filter(
+        pending_requests = (await db.execute(select(ProviderRegistrationRequest).where(
             ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
-        ).all()
+        ))).scalars().all()
 
         return {
             "message": "Registration rejected successfully",
@@ -504,7 +705,7 @@ async def reject_registration(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error rejecting registration: {str(e)}"
@@ -518,26 +719,27 @@ async def register_homeowner(
     password: Annotated[str, Form(...)],
     phone_number: Annotated[Optional[str], Form()] = None,
     address: Annotated[Optional[str], Form()] = None,
-    db: Session = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     try:
-        if db.query(User).filter(User.email == email).first():
+        if (await db.execute(select(User.id).where(User.email == email))).first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
+        await release_connection(db)
 
         # Create base User - use lowercase 'homeowner'
         new_user = User(
             email=email,
-            password_hash=hash_password(password),
+            password_hash=await hash_password_async(password),
             full_name=full_name,
             phone_number=phone_number,
             role=UserRole.HOMEOWNERS.value,  # Changed to use .value
             is_active=True
         )
         db.add(new_user)
-        db.flush()
+        await db.flush()
 
         # Create HomeOwner
         new_homeowner = HomeOwner(
@@ -546,7 +748,7 @@ async def register_homeowner(
         )
 
         db.add(new_homeowner)
-        db.commit()
+        await db.commit()
 
         return {
             "message": "Homeowner created successfully",
@@ -556,7 +758,7 @@ async def register_homeowner(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating user: {str(e)}"
@@ -565,25 +767,31 @@ async def register_homeowner(
 
 # Authentication Endpoints
 @app.post("/signin/", response_model=Token)
-def signin(
+async def signin(
     email: Annotated[str, Form(...)],
     password: Annotated[str, Form(...)],
     role: Annotated[UserRole, Form(...)],
-    db: Session = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     # First check if user exists in registration requests
-    registration_request = db.query(ProviderRegistrationRequest).filter(
-        ProviderRegistrationRequest.email == email,
-        ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
-    ).first()
+    registration_request = (await db.execute(
+        select(ProviderRegistrationRequest).where(
+            ProviderRegistrationRequest.email == email,
+            ProviderRegistrationRequest.status == RegistrationStatus.PENDING.value
+        )
+    )).scalars().first()
 
     if registration_request:
         # Verify password matches the registration request
-        if not verify_password(password, registration_request.password_hash):
+        await release_connection(db, registration_request)
+        is_valid, new_hash = await verify_and_update_password(password, registration_request.password_hash)
+        if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect password"
             )
+        if new_hash:
+            await save_password_hash(db, ProviderRegistrationRequest, registration_request.id, new_hash)
         
         # Check if the requested role matches
         if role != UserRole.SERVICEPROVIDERS:
@@ -613,7 +821,7 @@ def signin(
         )
 
     # If not in registration requests, check the User table
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -627,15 +835,29 @@ def signin(
             detail="User does not have this role"
         )
     
-    if not verify_password(password, user.password_hash):
+    await release_connection(db, user)
+    is_valid, new_hash = await verify_and_update_password(password, user.password_hash)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
         )
+    if new_hash:
+        await save_password_hash(db, User, user.id, new_hash)
+        invalidate_principal(user.email)
     
+    token_data = {
+        "sub": user.email,
+        "user_id": user.id,
+        "role": user.role,
+        **(await build_profile_claims(db, user))
+    }
+
     # For service providers, check verification status
     if role == UserRole.SERVICEPROVIDERS:
-        provider = db.query(ServiceProvider).filter(ServiceProvider.user_id == user.id).first()
+        provider = (await db.execute(
+            select(ServiceProvider).where(ServiceProvider.user_id == user.id)
+        )).scalars().first()
         if not provider:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -648,13 +870,8 @@ def signin(
             return JSONResponse(
                 status_code=200,
                 content={
-                    "access_token": create_access_token(
-                        data={
-                            "sub": user.email,
-                            "user_id": user.id,
-                            "role": user.role
-                        }
-                    ),
+                    "access_token": create_access_token(data=token_data),
+                    "refresh_token": create_refresh_token(user.email),
                     "token_type": "bearer",
                     "role": role.value,
                     "user_id": user.id,
@@ -665,13 +882,7 @@ def signin(
             )
     
     # Generate token with user details
-    access_token = create_access_token(
-        data={
-            "sub": user.email,
-            "user_id": user.id,
-            "role": user.role
-        }
-    )
+    access_token = create_access_token(data=token_data)
 
     # Determine dashboard URL based on role
     dashboard_url = (
@@ -681,6 +892,7 @@ def signin(
 
     return {
         "access_token": access_token,
+        "refresh_token": create_refresh_token(user.email),
         "token_type": "bearer",
         "role": role.value,
         "user_id": user.id,
@@ -688,11 +900,63 @@ def signin(
         "documents_verified": False
     }
 
+@app.post("/auth/refresh")
+async def refresh_access_token(
+    body: RefreshRequest,
+    db = Depends(get_async_db)
+):
+    payload = decode_token(body.refresh_token, token_type="refresh")
+
+    user = (await db.execute(
+        select(User).options(selectinload(User.admin)).where(User.email == payload["sub"])
+    )).scalars().first()
+    if user is None or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Refresh tokens are single use; rotate on every refresh. The insert into
+    # revoked_tokens fails for a token already used or logged out on any worker.
+    if not await revoke_token(db, payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    token_data = {
+        "sub": user.email,
+        "user_id": user.id,
+        "role": user.role,
+        **(await build_profile_claims(db, user))
+    }
+    if user.admin:
+        token_data["is_super_admin"] = user.admin.is_super_admin
+
+    return {
+        "access_token": create_access_token(data=token_data),
+        "refresh_token": create_refresh_token(user.email),
+        "token_type": "bearer"
+    }
+
+@app.post("/auth/logout")
+async def logout(
+    body: Optional[LogoutRequest] = None,
+    token: str = Depends(oauth2_scheme),
+    db = Depends(get_async_db)
+):
+    await revoke_token(db, decode_token(token))
+    if body and body.refresh_token:
+        await revoke_token(db, decode_token(body.refresh_token, token_type="refresh"))
+    return {"message": "Logged out successfully"}
+
 # Service Endpoints
 @app.post("/services/", response_model=ServiceSchema)
 async def create_service(
     service: ServiceCreate,
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
@@ -703,10 +967,8 @@ async def create_service(
                 detail="Only service providers can create services"
             )
 
-        # Get the provider record
-        provider = db.query(ServiceProvider).filter(
-            ServiceProvider.user_id == current_user.id
-        ).first()
+        # Get the provider record; verification can be withdrawn after the token was issued
+        provider = await get_provider_profile(db, current_user, current=True)
         
         if not provider:
             raise HTTPException(
@@ -734,14 +996,17 @@ async def create_service(
         )
         
         db.add(db_service)
-        db.commit()
-        db.refresh(db_service)
+        await db.commit()
+        await db.refresh(db_service)
+        suggest_index.upsert(db_service.id, db_service.title, db_service.provider_name, db_service.is_active)
+        catalog_changed(db_service.provider_id)
+        image_pipeline.submit(db_service.id, db_service.image)
         
         return db_service
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating service: {str(e)}"
@@ -752,12 +1017,12 @@ async def create_service(
 async def update_service(
     service_id: int,
     service_update: ServiceUpdate,
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
         # Get the service to update
-        db_service = db.query(Service).filter(Service.id == service_id).first()
+        db_service = await db.get(Service, service_id)
         if not db_service:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -765,10 +1030,12 @@ async def update_service(
             )
 
         # Verify the current user owns this service
-        provider = db.query(ServiceProvider).filter(
-            ServiceProvider.user_id == current_user.id,
-            ServiceProvider.id == db_service.provider_id
-        ).first()
+        provider = (await db.execute(
+            select(ServiceProvider).where(
+                ServiceProvider.user_id == current_user.id,
+                ServiceProvider.id == db_service.provider_id
+            )
+        )).scalars().first()
         
         if not provider:
             raise HTTPException(
@@ -778,32 +1045,110 @@ async def update_service(
 
         # Update only the fields that were provided
         update_data = service_update.dict(exclude_unset=True)
+        image_changed = "image" in update_data and update_data["image"] != db_service.image
         for field, value in update_data.items():
             setattr(db_service, field, value)
+        if image_changed:
+            # The old derivatives show a different picture
+            db_service.image_variants = None
 
         db.add(db_service)
-        db.commit()
-        db.refresh(db_service)
+        await db.commit()
+        await db.refresh(db_service)
+        suggest_index.upsert(db_service.id, db_service.title, db_service.provider_name, db_service.is_active)
+        catalog_changed(db_service.provider_id)
+        if image_changed:
+            image_pipeline.submit(db_service.id, db_service.image)
         
         return db_service
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating service: {str(e)}"
         )
 
+# Catalog reads serialize straight to JSON bytes so the result can be cached
+service_json = TypeAdapter(ServiceSchema)
+service_list_json = TypeAdapter(List[ServiceSchema])
+
+def dump_services(services) -> bytes:
+    return service_list_json.dump_json(service_list_json.validate_python(services, from_attributes=True))
+
+# sort name -> (column, cursor value type, descending)
+SERVICE_SORTS = {
+    "newest": (Service.created_at, datetime, True),
+    "price_asc": (Service.price, int, False),
+    "price_desc": (Service.price, int, True),
+    "rating": (Service.rating, int, True),
+}
+
 @app.get("/services/", response_model=List[ServiceSchema])
 async def read_services(
-    db: Session = Depends(get_db),
+    request: Request,
+    db = Depends(read_session("catalog")),
     skip: int = 0,
-    limit: int = 100
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    provider_id: Optional[int] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    is_active: bool = True,
+    sort: Literal["newest", "price_asc", "price_desc", "rating"] = "newest",
+    count: Literal["none", "exact", "estimate"] = "none"
 ):
+    """
+    List services, newest first by default. Pass the X-Next-Cursor response
+    header back as `cursor` for the next page; `skip` is only honoured
+    without a cursor. count=exact|estimate adds an X-Total-Count header.
+    Responses carry an ETag; send it back as If-None-Match to get a 304.
+    """
     try:
-        services = db.query(Service).offset(skip).limit(limit).all()
-        return services  # FastAPI will automatically use ServiceSchema to serialize
+        cache_key = (
+            "services", skip, limit, cursor, provider_id, min_price, max_price, is_active, sort, count,
+            catalog_cache.version("catalog")
+        )
+        cached = catalog_cache.get(cache_key)
+        if cached is not None:
+            return catalog_cache.respond(request, cached, PUBLIC_CACHE_CONTROL)
+
+        headers = {}
+        sort_column, cursor_type, descending = SERVICE_SORTS[sort]
+
+        query = select(Service).where(Service.is_active == is_active)
+        if provider_id is not None:
+            query = query.where(Service.provider_id == provider_id)
+        if min_price is not None:
+            query = query.where(Service.price >= min_price)
+        if max_price is not None:
+            query = query.where(Service.price <= max_price)
+
+        if count != "none":
+            total, is_estimate = await count_rows(db, query, count)
+            headers[TOTAL_COUNT_HEADER] = str(total)
+            headers[TOTAL_ESTIMATED_HEADER] = "true" if is_estimate else "false"
+
+        if cursor:
+            last_value, last_id = decode_cursor(cursor, cursor_type, int)
+            query = query.where(after_nulls_last(sort_column, Service.id, last_value, last_id, descending))
+        elif skip:
+            query = query.offset(skip)
+
+        # Services missing the sort value come last rather than dropping out
+        order = nulls_last_order(sort_column, Service.id, descending)
+        services = (await db.execute(query.order_by(*order).limit(limit + 1))).scalars().all()
+
+        if len(services) > limit:
+            services = services[:limit]
+            last = services[-1]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, sort_column.key), last.id)
+
+        cached = catalog_cache.set(cache_key, dump_services(services), headers)
+        return catalog_cache.respond(request, cached, PUBLIC_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -811,19 +1156,76 @@ async def read_services(
         )
     
 
+@app.get("/services/search", response_model=List[ServiceSearchResult])
+async def search_services(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    db = Depends(read_session("catalog"))
+):
+    """
+    Full-text search over service titles, provider names and descriptions.
+    Words match as prefixes; highlights wrap matches in <mark> tags.
+    X-Search-Approximate: true means the query had too many matches to rank
+    them all, and only the best-rated SEARCH_CANDIDATE_LIMIT were ranked.
+    """
+    try:
+        query = search_services_query(q, limit)
+        if query is None:
+            return []
+
+        rows = (await db.execute(query)).all()
+        if rows and rows[0].truncated:
+            response.headers[APPROXIMATE_HEADER] = "true"
+        return [
+            {
+                **ServiceSchema.model_validate(row.Service).model_dump(),
+                "rank": row.rank,
+                "title_highlight": row.title_highlight,
+                "description_highlight": row.description_highlight
+            }
+            for row in rows
+        ]
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching services: {str(e)}"
+        )
+
+
+@app.get("/services/suggest", response_model=List[SuggestionResponse])
+async def suggest_services(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """
+    Typeahead suggestions (service titles and provider names) for the search box.
+    Served from an in-memory index, never from the database.
+    """
+    return suggest_index.suggest(q, limit)
+
+
 @app.get("/services/{service_id}", response_model=ServiceSchema)
 async def read_service(
     service_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db = Depends(read_session("catalog"))
 ):
     try:
-        service = db.query(Service).filter(Service.id == service_id).first()
-        if not service:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Service not found"
-            )
-        return ServiceSchema.from_orm(service)
+        cache_key = ("service", service_id, catalog_cache.version("catalog"))
+        cached = catalog_cache.get(cache_key)
+        if cached is None:
+            service = await db.get(Service, service_id)
+            if not service:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Service not found"
+                )
+            body = service_json.dump_json(ServiceSchema.model_validate(service))
+            cached = catalog_cache.set(cache_key, body)
+        return catalog_cache.respond(request, cached, PUBLIC_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -834,7 +1236,8 @@ async def read_service(
 
 @app.get("/provider/services", response_model=List[ServiceSchema])
 async def get_provider_services(
-    db: Session = Depends(get_db),
+    request: Request,
+    db = Depends(read_session("catalog")),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -848,10 +1251,8 @@ async def get_provider_services(
                 detail="Only service providers can access this endpoint"
             )
 
-        # Get the provider record
-        provider = db.query(ServiceProvider).filter(
-            ServiceProvider.user_id == current_user.id
-        ).first()
+        # Get the provider record; verification can be withdrawn after the token was issued
+        provider = await get_provider_profile(db, current_user, current=True)
         
         if not provider:
             raise HTTPException(
@@ -859,12 +1260,18 @@ async def get_provider_services(
                 detail="Provider not found"
             )
 
-        # Get all services for this provider
-        services = db.query(Service).filter(
-            Service.provider_id == provider.id
-        ).order_by(Service.created_at.desc()).all()
-
-        return services
+        cache_key = ("provider-services", provider.id, catalog_cache.version(f"provider:{provider.id}"))
+        cached = catalog_cache.get(cache_key)
+        if cached is None:
+            # Get all services for this provider
+            services = (await db.execute(
+                select(Service)
+                .where(Service.provider_id == provider.id)
+                .order_by(Service.created_at.desc())
+            )).scalars().all()
+            cached = catalog_cache.set(cache_key, dump_services(services))
+
+        return catalog_cache.respond(request, cached, PRIVATE_CACHE_CONTROL)
     except HTTPException:
         raise
     except Exception as e:
@@ -905,15 +1312,94 @@ async def get_current_admin(
         "is_super_admin": current_user.admin.is_super_admin
     }
 
+@app.get("/admin/principal-cache")
+async def get_principal_cache_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    return principal_cache.stats()
+
+@app.get("/admin/db-pool")
+async def get_db_pool_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Connection pool usage of the worker that answers; sample repeatedly to see every worker."""
+    return pool_stats()
+
+@app.get("/admin/db-replicas")
+async def get_db_replica_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    return replica_router.stats()
+
+@app.get("/admin/catalog-cache")
+async def get_catalog_cache_stats(
+    current_user: User = Depends(get_current_admin_user)
+):
+    return catalog_cache.stats()
+
+# File serving
+@app.api_route(IMAGE_URL_PREFIX + "/{name:path}", methods=["GET", "HEAD"])
+async def get_image_variant(name: str, request: Request):
+    """Resized service images; public, and immutable since names are content hashes."""
+    located = variant_path(name)
+    if not located:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    path, content_type = located
+    try:
+        return file_response(request, path, content_type, IMMUTABLE_PUBLIC)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+@app.api_route("/documents/{name}", methods=["GET", "HEAD"])
+async def get_document(
+    name: str,
+    request: Request,
+    db = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    A verification document (ID or certification), by the file name stored on
+    the registration request or provider. Admins can read any document; a
+    provider only the ones on their own record.
+    """
+    resolved = resolve_document(name)
+    if not resolved:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    stored, path = resolved
+
+    if current_user.role != UserRole.ADMIN.value:
+        owns = (await db.execute(
+            select(ServiceProvider.id).where(
+                ServiceProvider.user_id == current_user.id,
+                or_(ServiceProvider.id_verification == stored, ServiceProvider.certification == stored)
+            )
+        )).first()
+        if not owns:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have permission to view this document"
+            )
+
+    if path is None:
+        # Remote store: let the client fetch it directly with a short-lived URL
+        return RedirectResponse(document_backend.presigned_url(stored), status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    try:
+        return file_response(request, path, content_type, IMMUTABLE_PRIVATE)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
 @app.get("/providers")
-async def get_providers(
+def get_providers(
     verified: bool = True,
     limit: int = 6,
-    db: Session = Depends(get_db),
+    db: Session = Depends(sync_read_session()),
     current_user: User = Depends(get_current_admin_user)
 ):
     try:
-        providers = db.query(ServiceProvider).filter(
+        # The user columns come in the same query instead of one lazy load per provider
+        providers = db.query(ServiceProvider).options(joinedload(ServiceProvider.user)).filter(
             ServiceProvider.is_verified == verified
         ).limit(limit).all()
         
@@ -953,24 +1439,26 @@ async def get_reports(
 
 async def get_current_homeowner(
     token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)
+    db = Depends(get_async_db)
 ):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+    payload = decode_token(token)
+    email: str = payload["sub"]
+
+    principal = principal_from_claims(payload)
+    if principal is not None and principal.homeowner_id is not None:
+        return HomeOwnerProfile(id=principal.homeowner_id, user_id=principal.id)
+
+    homeowner = principal_cache.get("homeowner", email)
+    if homeowner is not None:
+        return homeowner
     
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
     if user.role != UserRole.HOMEOWNERS.value:
         raise HTTPException(
@@ -978,20 +1466,26 @@ async def get_current_homeowner(
             detail="Only homeowners can access this endpoint"
         )
     
-    homeowner = db.query(HomeOwner).filter(HomeOwner.user_id == user.id).first()
+    homeowner = (await db.execute(
+        select(HomeOwner).where(HomeOwner.user_id == user.id)
+    )).scalars().first()
     if not homeowner:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Homeowner record not found"
         )
     
+    db.expunge(homeowner)
+    # Release the connection before the endpoint runs, as get_current_user does
+    await db.rollback()
+    principal_cache.set("homeowner", email, homeowner)
     return homeowner
 
 # booking endpoint
 @app.post("/bookings/", response_model=BookingResponse)
 async def create_booking(
     booking_data: BookingCreate,
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_homeowner: HomeOwner = Depends(get_current_homeowner)
 ):
     """
@@ -999,10 +1493,12 @@ async def create_booking(
     """
     try:
         # Get the service
-        service = db.query(Service).filter(
-            Service.id == booking_data.service_id,
-            Service.is_active == True
-        ).first()
+        service = (await db.execute(
+            select(Service).where(
+                Service.id == booking_data.service_id,
+                Service.is_active == True
+            )
+        )).scalars().first()
         
         if not service:
             raise HTTPException(
@@ -1020,8 +1516,8 @@ async def create_booking(
         )
         
         db.add(new_booking)
-        db.commit()
-        db.refresh(new_booking)
+        await db.commit()
+        await db.refresh(new_booking)
 
         # Return enriched booking data
         return {
@@ -1039,64 +1535,82 @@ async def create_booking(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating booking: {str(e)}"
         )
 
+# Streamed responses skip FastAPI's response_model; validate against it here instead
+booking_json = TypeAdapter(BookingResponse)
+
 @app.get("/bookings/", response_model=List[BookingResponse])
 async def get_bookings(
-    status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    request: Request,
+    booking_status: Optional[str] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db = Depends(read_session()),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Get bookings for the current user
+    Get bookings for the current user, ordered by scheduled date with
+    unscheduled bookings last. When more rows exist, the X-Next-Cursor
+    response header holds the cursor to pass back for the next page.
     """
     try:
-        query = db.query(Booking)
+        # One projection with the service columns joined in, no per-row lookups
+        query = (
+            select(
+                Booking.id,
+                Booking.service_id,
+                Booking.homeowner_id,
+                Booking.booking_date,
+                Booking.status,
+                Booking.scheduled_date,
+                Booking.completed_date,
+                func.coalesce(Service.title, "Unknown Service").label("service_title"),
+                func.coalesce(Service.provider_name, "Unknown Provider").label("provider_name"),
+            )
+            .outerjoin(Service, Service.id == Booking.service_id)
+        )
         
         # Filter by user role
         if current_user.role == UserRole.HOMEOWNERS.value:
-            homeowner = db.query(HomeOwner).filter(
-                HomeOwner.user_id == current_user.id
-            ).first()
-            if not homeowner:
+            homeowner_id = await get_homeowner_id(db, current_user)
+            if not homeowner_id:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Homeowner record not found"
                 )
-            query = query.filter(Booking.homeowner_id == homeowner.id)
+            query = query.where(Booking.homeowner_id == homeowner_id)
             
         elif current_user.role == UserRole.SERVICEPROVIDERS.value:
-            provider = db.query(ServiceProvider).filter(
-                ServiceProvider.user_id == current_user.id
-            ).first()
+            provider = await get_provider_profile(db, current_user)
             if not provider:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Provider record not found"
                 )
-            query = query.join(Service).filter(Service.provider_id == provider.id)
+            query = query.where(Service.provider_id == provider.id)
         
         # Filter by status if provided
-        if status:
-            query = query.filter(Booking.status == status)
-            
-        bookings = query.order_by(Booking.scheduled_date).all()
-        
-        # Enrich with service info
-        result = []
-        for booking in bookings:
-            service = db.query(Service).filter(Service.id == booking.service_id).first()
-            result.append({
-                **booking.__dict__,
-                "service_title": service.title if service else "Unknown Service",
-                "provider_name": service.provider_name if service else "Unknown Provider"
-            })
-            
-        return result
+        if booking_status:
+            query = query.where(Booking.status == booking_status)
+
+        if cursor:
+            scheduled_date, booking_id = decode_cursor(cursor, datetime, int)
+            query = query.where(after_nulls_last(Booking.scheduled_date, Booking.id, scheduled_date, booking_id))
+
+        # Rows go out as they are read, on a session that outlives the dependency's;
+        # hand that one's connection back first so a request never holds two
+        await db.rollback()
+        return await stream_keyset_page(
+            read_session_scope(request),
+            keyset_page(query, Booking.scheduled_date, Booking.id, limit),
+            limit,
+            lambda row: booking_json.dump_python(booking_json.validate_python(row._asdict()), mode="json"),
+        )
         
     except HTTPException:
         raise
@@ -1110,14 +1624,14 @@ async def get_bookings(
 async def update_booking_status(
     booking_id: int,
     new_status: str = Body(..., embed=True),
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Update booking status (for providers and homeowners)
     """
     try:
-        booking = db.query(Booking).filter(Booking.id == booking_id).first()
+        booking = await db.get(Booking, booking_id)
         if not booking:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1126,10 +1640,8 @@ async def update_booking_status(
 
         # Verify user has permission to update this booking
         if current_user.role == UserRole.HOMEOWNERS.value:
-            homeowner = db.query(HomeOwner).filter(
-                HomeOwner.user_id == current_user.id
-            ).first()
-            if not homeowner or booking.homeowner_id != homeowner.id:
+            homeowner_id = await get_homeowner_id(db, current_user)
+            if not homeowner_id or booking.homeowner_id != homeowner_id:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="You can only update your own bookings"
@@ -1142,13 +1654,13 @@ async def update_booking_status(
                 )
                 
         elif current_user.role == UserRole.SERVICEPROVIDERS.value:
-            provider = db.query(ServiceProvider).filter(
-                ServiceProvider.user_id == current_user.id
-            ).first()
-            service = db.query(Service).filter(
-                Service.id == booking.service_id,
-                Service.provider_id == provider.id if provider else None
-            ).first()
+            provider = await get_provider_profile(db, current_user)
+            service = (await db.execute(
+                select(Service).where(
+                    Service.id == booking.service_id,
+                    Service.provider_id == provider.id if provider else None
+                )
+            )).scalars().first()
             if not service:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -1167,11 +1679,11 @@ async def update_booking_status(
             booking.completed_date = datetime.utcnow()
             
         db.add(booking)
-        db.commit()
-        db.refresh(booking)
+        await db.commit()
+        await db.refresh(booking)
 
         # Return enriched booking data
-        service = db.query(Service).filter(Service.id == booking.service_id).first()
+        service = await db.get(Service, booking.service_id)
         return {
             **booking.__dict__,
             "service_title": service.title if service else "Unknown Service",
@@ -1181,7 +1693,7 @@ async def update_booking_status(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating booking: {str(e)}"
@@ -1189,16 +1701,106 @@ async def update_booking_status(
     
 # chatAssistant endpoint
 @app.post("/chat/", response_model=ChatResponse)
-async def chat_with_bot(input: ChatInput):
+async def chat_with_bot(input: ChatInput, assistant: Ai_Assistant = Depends(get_assistant)):
     """
     Endpoint to interact with the HomeHelp Connect Chat Assistant.
     Receives a user message and returns the chatbot's response.
     """
     try:
-        response_text = await assistant.generate_response(input.message)
-        return {"response": response_text}
+        session = chat_sessions.get_or_create(input.session_id)
+        response_text = await assistant.generate_response(input.message, session)
+        return {"response": response_text, "session_id": session.id}
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {e}")
-    
\ No newline at end of file
+
+def sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def stream_chat_with_bot(input: ChatInput, assistant: Ai_Assistant = Depends(get_assistant)):
+    """
+    Same as /chat/, but streams the answer as Server-Sent Events while the
+    model writes it: `data: {"text": ...}` per piece, then `event: done`
+    with the session id (also sent up front in the X-Chat-Session header).
+    A failure after the first piece arrives as `event: error`.
+    """
+    session = chat_sessions.get_or_create(input.session_id)
+    answer = assistant.stream_response(input.message, session)
+    try:
+        # Wait for the first piece so early failures still get a real status code
+        first = await answer.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating response: {e}")
+
+    async def events():
+        try:
+            if first:
+                yield sse_event({"text": first})
+            async for chunk in answer:
+                yield sse_event({"text": chunk})
+            yield sse_event({"session_id": session.id}, event="done")
+        except HTTPException as e:
+            yield sse_event({"detail": e.detail}, event="error")
+        except Exception:
+            logger.exception("Error streaming chat response")
+            yield sse_event({"detail": "Error generating response"}, event="error")
+        finally:
+            await answer.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Chat-Session": session.id}
+    )
+
+@app.get("/admin/chat-assistant")
+async def get_chat_assistant_stats(
+    current_user: User = Depends(get_current_admin_user),
+    assistant: Ai_Assistant = Depends(get_assistant)
+):
+    return assistant.stats()
+
+@app.get("/metrics")
+async def get_metrics(authorization: Annotated[Optional[str], Header()] = None):
+    """
+    Prometheus metrics of the worker that answers; each worker keeps its own,
+    so scrape every worker. Requires `Authorization: Bearer <METRICS_TOKEN>`
+    when METRICS_TOKEN is set.
+    """
+    if METRICS_TOKEN and not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token"
+        )
+    # Scope versions are per provider; as gauges they would be a series each
+    catalog = {key: value for key, value in catalog_cache.stats().items() if key != "versions"}
+    stats = {
+        "homehelp_db_pool": pool_stats(),
+        "homehelp_db_replicas": replica_router.stats(),
+        "homehelp_catalog_cache": catalog,
+        "homehelp_principal_cache": principal_cache.stats(),
+    }
+    assistant = current_assistant()
+    if assistant is not None:
+        stats["homehelp_chat"] = assistant.stats()
+    return PlainTextResponse(render_metrics(stats), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/startup")
+async def get_startup_timings(
+    current_user: User = Depends(get_current_admin_user)
+):
+    return app.state.startup
+    
+
+IMPORT_FINISHED = time.perf_counter()
@@ -0,0 +1,302 @@
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Versioned schema changes, applied in order and recorded in schema_migrations.
+# Run `python migrations.py` (initial_setup.py does too) before starting a new
+# release; `--status` lists what is applied. Every migration is safe to run
+# against a database that already has its change, so databases created before
+# versioning are brought in line the first time.
+#
+# Add new changes at the end with the next version number and never edit one
+# that has shipped. Migrations with transactional=False run in autocommit mode,
+# which CREATE INDEX CONCURRENTLY needs so busy tables are not locked.
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str, transactional: bool = True):
+    def register(func):
+        MIGRATIONS.append((version, description, transactional, func))
+        return func
+    return register
+
+
+def create_index_concurrently(conn, name: str, definition: str):
+    """`definition` is everything after "CREATE INDEX CONCURRENTLY IF NOT EXISTS <name> ON"."""
+    # A failed concurrent build leaves an invalid index that IF NOT EXISTS would keep
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+    ), {"name": name}).scalar()
+    if invalid:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+
+# The schema as it was before versioning, frozen: later changes to models.py
+# must not leak into it, or migrations after it would find nothing to do on a
+# new database and never be exercised
+BASELINE_SCHEMA = [
+    "DO $$ BEGIN CREATE TYPE userrole AS ENUM ('homeowners', 'serviceproviders', 'admin'); "
+    "EXCEPTION WHEN duplicate_object THEN NULL; END $$",
+    "DO $$ BEGIN CREATE TYPE registrationstatus AS ENUM ('PENDING', 'APPROVED', 'REJECTED'); "
+    "EXCEPTION WHEN duplicate_object THEN NULL; END $$",
+    "DO $$ BEGIN CREATE TYPE bookingstatus AS ENUM ('PENDING', 'CONFIRMED', 'COMPLETED', 'CANCELLED'); "
+    "EXCEPTION WHEN duplicate_object THEN NULL; END $$",
+    """CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        email VARCHAR NOT NULL,
+        password_hash VARCHAR NOT NULL,
+        full_name VARCHAR NOT NULL,
+        phone_number VARCHAR,
+        profile_image VARCHAR,
+        is_active BOOLEAN,
+        role userrole NOT NULL,
+        created_at TIMESTAMP,
+        last_login TIMESTAMP
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    """CREATE TABLE IF NOT EXISTS admins (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER UNIQUE REFERENCES users (id),
+        is_super_admin BOOLEAN
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_admins_id ON admins (id)",
+    """CREATE TABLE IF NOT EXISTS homeowners (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER UNIQUE REFERENCES users (id),
+        address VARCHAR
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_homeowners_id ON homeowners (id)",
+    """CREATE TABLE IF NOT EXISTS provider_registration_requests (
+        id SERIAL PRIMARY KEY,
+        full_name VARCHAR NOT NULL,
+        email VARCHAR NOT NULL UNIQUE,
+        phone_number VARCHAR,
+        address VARCHAR,
+        years_experience INTEGER,
+        password_hash VARCHAR NOT NULL,
+        id_verification VARCHAR,
+        certification VARCHAR,
+        status registrationstatus,
+        rejection_reason VARCHAR,
+        requested_at TIMESTAMP,
+        processed_at TIMESTAMP,
+        processed_by INTEGER REFERENCES users (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_provider_registration_requests_id ON provider_registration_requests (id)",
+    """CREATE TABLE IF NOT EXISTS serviceproviders (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER UNIQUE REFERENCES users (id),
+        business_name VARCHAR,
+        address VARCHAR,
+        years_experience INTEGER,
+        service_description VARCHAR,
+        id_verification VARCHAR,
+        certification VARCHAR,
+        is_verified BOOLEAN,
+        verification_date TIMESTAMP,
+        verification_by INTEGER REFERENCES users (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_serviceproviders_id ON serviceproviders (id)",
+    """CREATE TABLE IF NOT EXISTS services (
+        id SERIAL PRIMARY KEY,
+        provider_id INTEGER REFERENCES serviceproviders (id),
+        title VARCHAR NOT NULL,
+        description VARCHAR,
+        price INTEGER,
+        image VARCHAR(255),
+        rating INTEGER,
+        provider_name VARCHAR,
+        created_at TIMESTAMP,
+        is_active BOOLEAN
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_services_id ON services (id)",
+    """CREATE TABLE IF NOT EXISTS bookings (
+        id SERIAL PRIMARY KEY,
+        service_id INTEGER REFERENCES services (id),
+        homeowner_id INTEGER REFERENCES homeowners (id),
+        booking_date TIMESTAMP,
+        status bookingstatus,
+        scheduled_date TIMESTAMP,
+        completed_date TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_bookings_id ON bookings (id)",
+]
+
+
+@migration(1, "Tables from the models")
+def create_tables(conn):
+    for statement in BASELINE_SCHEMA:
+        conn.execute(text(statement))
+
+
+@migration(2, "services.search_vector for full-text search")
+def add_search_vector(conn):
+    from models import SERVICE_SEARCH_VECTOR
+    conn.execute(text(
+        "ALTER TABLE services ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({SERVICE_SEARCH_VECTOR}) STORED"
+    ))
+
+
+@migration(3, "services.image_variants for resized images")
+def add_image_variants(conn):
+    conn.execute(text("ALTER TABLE services ADD COLUMN IF NOT EXISTS image_variants JSON"))
+
+
+@migration(4, "Catalog keyset and search indexes", transactional=False)
+def add_catalog_indexes(conn):
+    create_index_concurrently(conn, "ix_services_active_created", "services (created_at, id) WHERE is_active")
+    create_index_concurrently(conn, "ix_services_active_price", "services (price, id) WHERE is_active")
+    create_index_concurrently(conn, "ix_services_active_rating", "services (rating, id) WHERE is_active")
+    create_index_concurrently(conn, "ix_services_provider_created", "services (provider_id, created_at)")
+    create_index_concurrently(conn, "ix_services_search", "services USING gin (search_vector)")
+
+
+@migration(5, "Booking and registration request indexes", transactional=False)
+def add_booking_and_registration_indexes(conn):
+    create_index_concurrently(conn, "ix_bookings_homeowner_scheduled", "bookings (homeowner_id, scheduled_date, id)")
+    create_index_concurrently(conn, "ix_bookings_service_scheduled", "bookings (service_id, scheduled_date, id)")
+    create_index_concurrently(conn, "ix_bookings_status_scheduled", "bookings (status, scheduled_date, id)")
+    create_index_concurrently(conn, "ix_bookings_scheduled", "bookings (scheduled_date, id)")
+    create_index_concurrently(
+        conn, "ix_registration_requests_status_requested", "provider_registration_requests (status, requested_at)"
+    )
+    create_index_concurrently(conn, "ix_registration_requests_requested", "provider_registration_requests (requested_at)")
+    conn.execute(text("ANALYZE bookings"))
+    conn.execute(text("ANALYZE provider_registration_requests"))
+
+
+@migration(6, "revoked_tokens shared by every worker")
+def add_revoked_tokens(conn):
+    from models import RevokedToken
+    RevokedToken.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(7, "Booking indexes that keep unscheduled bookings, last", transactional=False)
+def add_booking_nulls_last_indexes(conn):
+    key = "COALESCE(scheduled_date, 'infinity'::timestamp)"
+    create_index_concurrently(conn, "ix_bookings_homeowner_scheduled_nulls_last", f"bookings (homeowner_id, {key}, id)")
+    create_index_concurrently(conn, "ix_bookings_service_scheduled_nulls_last", f"bookings (service_id, {key}, id)")
+    create_index_concurrently(conn, "ix_bookings_status_scheduled_nulls_last", f"bookings (status, {key}, id)")
+    create_index_concurrently(conn, "ix_bookings_scheduled_nulls_last", f"bookings ({key}, id)")
+    for name in ("ix_bookings_homeowner_scheduled", "ix_bookings_service_scheduled",
+                 "ix_bookings_status_scheduled", "ix_bookings_scheduled"):
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text("ANALYZE bookings"))
+
+
+@migration(8, "Catalog sort indexes that keep services with NULL sort keys, last", transactional=False)
+def add_catalog_nulls_last_indexes(conn):
+    create_index_concurrently(
+        conn, "ix_services_active_created_nulls_last",
+        "services (COALESCE(created_at, '-infinity'::timestamp), id) WHERE is_active"
+    )
+    create_index_concurrently(
+        conn, "ix_services_active_price_nulls_last", "services (COALESCE(price, 2147483647), id) WHERE is_active"
+    )
+    create_index_concurrently(
+        conn, "ix_services_active_price_desc_nulls_last", "services (COALESCE(price, -2147483648), id) WHERE is_active"
+    )
+    create_index_concurrently(
+        conn, "ix_services_active_rating_nulls_last", "services (COALESCE(rating, -2147483648), id) WHERE is_active"
+    )
+    for name in ("ix_services_active_created", "ix_services_active_price", "ix_services_active_rating"):
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    conn.execute(text("ANALYZE services"))
+
+
+@migration(9, "services.updated_at for syncing suggestion indexes between workers", transactional=False)
+def add_service_updated_at(conn):
+    conn.execute(text("ALTER TABLE services ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"))
+    create_index_concurrently(conn, "ix_services_updated", "services (updated_at)")
+
+
+@migration(10, "documents for content-addressed verification files")
+def add_documents(conn):
+    # Created by migration 1 on databases set up before it was frozen
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS documents ("
+        "key VARCHAR PRIMARY KEY, content_type VARCHAR NOT NULL, size INTEGER NOT NULL, "
+        "ref_count INTEGER NOT NULL, created_at TIMESTAMP, updated_at TIMESTAMP)"
+    ))
+
+
+def applied_versions(conn) -> set:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars().all())
+
+
+def migrate(engine) -> list:
+    """Applies every pending migration in order; returns the versions applied."""
+    applied = []
+    with engine.connect() as conn:
+        # One migrator at a time when several instances deploy together
+        conn.execute(text("SELECT pg_advisory_lock(hashtext('schema_migrations'))"))
+        conn.commit()
+        try:
+            done = applied_versions(conn)
+            conn.commit()
+            for version, description, transactional, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version in done:
+                    continue
+                logger.info("Applying migration %d: %s", version, description)
+                if transactional:
+                    func(conn)
+                    _record(conn, version, description)
+                    conn.commit()
+                else:
+                    conn.execution_options(isolation_level="AUTOCOMMIT")
+                    try:
+                        func(conn)
+                        _record(conn, version, description)
+                    finally:
+                        # Nothing to undo in autocommit mode; this ends the open transaction marker
+                        conn.rollback()
+                        conn.execution_options(isolation_level=conn.default_isolation_level)
+                applied.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('schema_migrations'))"))
+            conn.commit()
+    return applied
+
+
+def _record(conn, version: int, description: str):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, :now)"),
+        {"version": version, "description": description, "now": datetime.utcnow()}
+    )
+
+
+def status(engine):
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+        conn.commit()
+    for version, description, _, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
+
+
+if __name__ == "__main__":
+    from database import make_engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Index builds may run past the API's statement timeout
+    migration_engine = make_engine(statement_timeout_ms=0, application_name="homehelp-migrate", pool_size=1)
+    if "--status" in sys.argv:
+        status(migration_engine)
+    else:
+        versions = migrate(migration_engine)
+        print(f"Applied migrations {versions}" if versions else "Database is up to date")
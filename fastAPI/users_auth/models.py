@@ -1,7 +1,8 @@
 from enum import Enum
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum as SQLAlchemyEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Computed, JSON, func, literal_column, text, Enum as SQLAlchemyEnum
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from typing import Optional
 from database import Base
 from sqlalchemy.orm import Mapped, mapped_column
@@ -88,6 +89,39 @@ class HomeOwner(Base):
         return f"<HomeOwner {self.user.full_name if self.user else 'Unknown'}>"
 
 
+# Full-text search document for a service: title weighs most, then the
+# provider's name, then the description. Postgres keeps the generated column
+# current on every insert/update, including create_service/update_service.
+SEARCH_CONFIG = "english"
+SERVICE_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(provider_name, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'C')"
+)
+
+# Listings sort nullable columns through a non-null key that puts NULLs after
+# every value in either direction. A keyset cursor on it is one comparison, and
+# an index on the same expression serves the order.
+NULLS_LAST_SENTINELS = {
+    (DateTime, False): "'infinity'::timestamp",
+    (DateTime, True): "'-infinity'::timestamp",
+    (Integer, False): "2147483647",
+    (Integer, True): "-2147483648",
+}
+
+
+def nulls_last_sentinel(column, descending: bool = False):
+    """The SQL constant standing in for NULL in `column`'s sort key."""
+    for (kind, sentinel_descending), sentinel in NULLS_LAST_SENTINELS.items():
+        if isinstance(column.type, kind) and sentinel_descending == descending:
+            return literal_column(sentinel, type_=column.type)
+    raise TypeError(f"No NULLS LAST sort key for {column.type!r}")
+
+
+def nulls_last(column, descending: bool = False):
+    return func.coalesce(column, nulls_last_sentinel(column, descending))
+
+
 class Service(Base):
     __tablename__ = "services"
     
@@ -97,13 +131,35 @@ class Service(Base):
     description = Column(String)
     price = Column(Integer)
     image: Mapped[str] = mapped_column(String(255), nullable=True)
+    # Resized copies of image (see images.py); NULL until the worker has run
+    image_variants = Column(JSON(none_as_null=True), nullable=True)
     rating = Column(Integer, default=0) 
     provider_name = Column(String)  
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set on every write; other workers' suggestion indexes catch up from it
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    # Deferred so catalog reads never ship the search document
+    search_vector = deferred(Column(TSVECTOR, Computed(SERVICE_SEARCH_VECTOR, persisted=True)))
     
     provider = relationship("ServiceProvider", back_populates="services")
     bookings = relationship("Booking", back_populates="service", cascade="all, delete-orphan")
+
+    # Catalog listings only show active services and page by (sort key, id)
+    # with NULLs last; partial indexes keep them small. A descending sort
+    # needs its own index, since its NULL stand-in is the lowest value
+    __table_args__ = (
+        Index("ix_services_active_created_nulls_last", nulls_last(created_at, descending=True), "id",
+              postgresql_where=text("is_active")),
+        Index("ix_services_active_price_nulls_last", nulls_last(price), "id", postgresql_where=text("is_active")),
+        Index("ix_services_active_price_desc_nulls_last", nulls_last(price, descending=True), "id",
+              postgresql_where=text("is_active")),
+        Index("ix_services_active_rating_nulls_last", nulls_last(rating, descending=True), "id",
+              postgresql_where=text("is_active")),
+        Index("ix_services_provider_created", "provider_id", "created_at"),
+        Index("ix_services_search", "search_vector", postgresql_using="gin"),
+        Index("ix_services_updated", "updated_at"),
+    )
     
     def __repr__(self):
         return f"<Service {self.title} by {self.provider_id}>"
@@ -127,6 +183,15 @@ class Booking(Base):
     
     service = relationship("Service", back_populates="bookings")
     homeowner = relationship("HomeOwner")
+
+    # GET /bookings/ pages by (scheduled_date, id), unscheduled last, for a
+    # homeowner, for a provider's services, by status, or across everything (admins)
+    __table_args__ = (
+        Index("ix_bookings_homeowner_scheduled_nulls_last", "homeowner_id", nulls_last(scheduled_date), "id"),
+        Index("ix_bookings_service_scheduled_nulls_last", "service_id", nulls_last(scheduled_date), "id"),
+        Index("ix_bookings_status_scheduled_nulls_last", "status", nulls_last(scheduled_date), "id"),
+        Index("ix_bookings_scheduled_nulls_last", nulls_last(scheduled_date), "id"),
+    )
     
     def __repr__(self):
         return f"<Booking {self.id} for service {self.service_id}>"
@@ -150,10 +215,44 @@ class ProviderRegistrationRequest(Base):
     processed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     
     processed_by_admin = relationship("User", foreign_keys=[processed_by])
+
+    # The admin queue lists requests newest first, usually filtered by status
+    __table_args__ = (
+        Index("ix_registration_requests_status_requested", "status", "requested_at"),
+        Index("ix_registration_requests_requested", "requested_at"),
+    )
     
     def __repr__(self):
         return f"<ProviderRegistrationRequest {self.email} ({self.status})>"
-    
+
+
+class Document(Base):
+    """
+    A stored verification file, named by its SHA-256 (see document_store).
+    ref_count is how many registration request / provider columns point at it;
+    unreferenced documents are garbage collected.
+    """
+    __tablename__ = "documents"
+
+    key = Column(String, primary_key=True)  # "<sha256 hex><extension>"
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Document {self.key} ({self.ref_count} refs)>"
+
+
+class RevokedToken(Base):
+    """A logged-out or rotated token (see auth.revoke_token), kept until it would have expired."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False, index=True)
+
 
 # In your User model, add this relationship:
 admin = relationship(
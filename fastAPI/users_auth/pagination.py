@@ -0,0 +1,153 @@
+import base64
+import json
+from contextlib import AsyncExitStack
+from datetime import datetime
+from enum import Enum
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, text, tuple_
+
+from models import nulls_last, nulls_last_sentinel
+
+# Keyset pagination: the client gets an opaque cursor holding the sort key of
+# the last row it saw and passes it back to continue after that row, so deep
+# pages cost the same as the first one.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+# Below this many estimated rows an exact count is cheap enough to run
+EXACT_COUNT_THRESHOLD = 10000
+# Rows fetched per round trip when a page is streamed from a server-side cursor
+STREAM_BATCH_ROWS = 100
+
+
+def encode_cursor(*values) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    """Decodes a cursor into values of the given types (datetime values are parsed back)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(values) != len(types):
+            raise ValueError("cursor does not match this listing")
+        return [
+            None if value is None
+            else datetime.fromisoformat(value) if kind is datetime
+            else kind(value)
+            for value, kind in zip(values, types)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def after_keyset(columns, values, descending=False):
+    """
+    WHERE clause selecting rows strictly after `values` in (columns...) order,
+    as one row comparison, which an index on those columns serves as a range.
+    """
+    keyset, last = tuple_(*columns), tuple_(*values)
+    return keyset < last if descending else keyset > last
+
+
+def nulls_last_order(column, id_column, descending=False) -> list:
+    """ORDER BY for a listing on a nullable column, NULLs last, ties broken by id."""
+    order = [nulls_last(column, descending), id_column]
+    return [key.desc() for key in order] if descending else order
+
+
+def after_nulls_last(column, id_column, value, last_id, descending=False):
+    """after_keyset for nulls_last_order; a NULL cursor value compares as the sentinel."""
+    if value is None:
+        value = nulls_last_sentinel(column, descending)
+    return after_keyset([nulls_last(column, descending), id_column], [value, last_id], descending=descending)
+
+
+def keyset_page(query, column, id_column, limit: int, descending=False):
+    """
+    One page of `query` in nulls_last_order, whose rows also carry page_rows
+    (limit + 1 when another page follows) and next_value / next_id, the keyset
+    of the page's last row. Both are on the first row, so the next cursor is
+    known before the rest of the page is read.
+    """
+    page = query.order_by(*nulls_last_order(column, id_column, descending)).limit(limit + 1).subquery()
+    page_column, page_id = page.c[column.key], page.c[id_column.key]
+    order = nulls_last_order(page_column, page_id, descending)
+    window = {"order_by": order, "rows": (None, None)}
+    return select(
+        page,
+        func.count().over().label("page_rows"),
+        func.nth_value(page_column, limit).over(**window).label("next_value"),
+        func.nth_value(page_id, limit).over(**window).label("next_id"),
+    ).order_by(*order)
+
+
+async def stream_keyset_page(session_scope, statement, limit: int, serialize) -> StreamingResponse:
+    """
+    Streams a keyset_page statement as a JSON array from a server-side cursor,
+    serializing each row as it arrives. The statement runs on its own session
+    (`session_scope`, an async context manager), held until the last row is
+    sent: dependency sessions are closed before a streamed body goes out.
+    """
+    stack = AsyncExitStack()
+    try:
+        db = await stack.enter_async_context(session_scope)
+        partitions = (await db.stream(statement)).partitions(STREAM_BATCH_ROWS)
+        batch = await anext(partitions, [])
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    headers = {}
+    if batch and batch[0].page_rows > limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(batch[0].next_value, batch[0].next_id)
+
+    async def body():
+        nonlocal batch
+        try:
+            yield "["
+            sent = 0
+            while batch and sent < limit:
+                for row in batch[:limit - sent]:
+                    yield ("," if sent else "") + json.dumps(serialize(row), default=json_default)
+                    sent += 1
+                batch = await anext(partitions, []) if sent < limit else []
+            yield "]"
+        finally:
+            await stack.aclose()
+
+    return StreamingResponse(body(), media_type="application/json", headers=headers)
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def count_rows(db, query, mode: str):
+    """
+    Total rows matched by `query` for mode "exact" or "estimate".
+    Returns (count, is_estimate). Estimates come from the Postgres planner,
+    so a large listing is never counted row by row.
+    """
+    if mode == "estimate" and db.bind.dialect.name == "postgresql":
+        compiled = query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+        plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate, True
+
+    count = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar()
+    return count, False
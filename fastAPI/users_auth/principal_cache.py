@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+# Resolved principals (User / HomeOwner rows) keyed by token subject, so an
+# authenticated request only pays for the JWT decode. PRINCIPAL_CACHE_TTL=0
+# turns the cache off.
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """TTLCache of detached ORM objects keyed by (kind, token subject)."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self._entries = TTLCache(ttl, max_size)
+        self.invalidations = 0
+
+    def get(self, kind: str, subject: str):
+        return self._entries.get((kind, subject))
+
+    def set(self, kind: str, subject: str, value):
+        self._entries.set((kind, subject), value)
+
+    def invalidate(self, subject: str):
+        """Drops every cached principal for a token subject (the user's email)."""
+        self.invalidations += self._entries.discard(lambda key: key[1] == subject)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "invalidations": self.invalidations}
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
+
+# Tokens can embed profile claims (see auth.EMBED_PROFILE_CLAIMS). When the
+# underlying rows change, claims in tokens issued earlier are stale; remember
+# when that happened so those tokens fall back to a lookup until refreshed.
+CLAIMS_CHANGE_RETENTION = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")) * 60
+_claims_changed_at = {}
+_claims_lock = threading.Lock()
+
+
+def invalidate_principal(email: str):
+    """Call whenever a user's row, admin flag or provider verification changes."""
+    principal_cache.invalidate(email)
+    now = time.time()
+    with _claims_lock:
+        _claims_changed_at[email] = now
+        # Anything older than the access token lifetime can only match expired tokens
+        for subject in [s for s, t in _claims_changed_at.items() if t < now - CLAIMS_CHANGE_RETENTION]:
+            del _claims_changed_at[subject]
+
+
+def claims_are_current(email: str, issued_at) -> bool:
+    with _claims_lock:
+        changed_at = _claims_changed_at.get(email)
+    return changed_at is None or (issued_at is not None and issued_at > changed_at)
@@ -0,0 +1,324 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Where a request's time goes: wall time, time in SQL (and how many
+# statements), in bcrypt and waiting on the chat model. Every response gets a
+# Server-Timing header with the breakdown (SERVER_TIMING=0 leaves it off);
+# requests slower than SLOW_REQUEST_MS are logged with their statements; and
+# /metrics aggregates all of it per route as Prometheus histograms, next to
+# the cache, pool and chat statistics.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").lower() in ("1", "true", "yes")
+# When set, /metrics wants it as a bearer token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Statements kept per request for the slow log; the count is always exact
+PROFILE_MAX_STATEMENTS = 50
+# N+1 detection for tests and staging: one statement shape run
+# N_PLUS_ONE_THRESHOLD times in a request (typically a lazy load per row) is
+# logged as a warning with N_PLUS_ONE_DETECTION=warn, or fails the request with =raise
+N_PLUS_ONE_DETECTION = os.getenv("N_PLUS_ONE_DETECTION", "off").lower()
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Seconds; requests, SQL and bcrypt live in the low end, chat answers in the high end
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+_BIND_MARKERS = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_BIND_LISTS = re.compile(r"\?(\s*,\s*\?)+")
+
+
+def statement_shape(sql: str) -> str:
+    """`sql` with whitespace and parameters normalized, so expanded IN lists of any length match."""
+    return _BIND_LISTS.sub("?", _BIND_MARKERS.sub("?", " ".join(sql.split())))
+
+
+class RequestProfile:
+    def __init__(self, description: str = ""):
+        self.description = description
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.statement_count = 0
+        self.statements = []  # (seconds, sql) of the first PROFILE_MAX_STATEMENTS
+        self.timings = {}  # "bcrypt"/"llm" -> seconds
+        self.shapes = {}  # statement shape -> times run, with N+1 detection on
+
+    def add_statement(self, sql: str, seconds: float):
+        self.db_seconds += seconds
+        self.statement_count += 1
+        if len(self.statements) < PROFILE_MAX_STATEMENTS:
+            self.statements.append((seconds, sql))
+        if N_PLUS_ONE_DETECTION in ("warn", "raise"):
+            shape = statement_shape(sql)
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            # Once per shape and request
+            if self.shapes[shape] == N_PLUS_ONE_THRESHOLD:
+                message = (
+                    f"Possible N+1 query in {self.description}: the same statement ran "
+                    f"{N_PLUS_ONE_THRESHOLD} times: {shape[:300]}"
+                )
+                logger.warning(message)
+                if N_PLUS_ONE_DETECTION == "raise":
+                    raise NPlusOneError(message)
+
+    def add_time(self, name: str, seconds: float):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+# Copied into threadpool workers and SQLAlchemy's async greenlets, so their
+# work is charged to the request that started it
+_current_profile = ContextVar("request_profile", default=None)
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+@contextmanager
+def timed(name: str):
+    """Charges the time spent in the block to the current request under `name`."""
+    profile = _current_profile.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.add_time(name, time.perf_counter() - started)
+
+
+async def timed_iter(name: str, iterator):
+    """Yields from an async iterator, charging only the waits for each item."""
+    profile = _current_profile.get()
+    iterator = iterator.__aiter__()
+    while True:
+        started = time.perf_counter()
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            if profile is not None:
+                profile.add_time(name, time.perf_counter() - started)
+        yield item
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_profile.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    started = getattr(context, "_profile_started", None)
+    if profile is not None and started is not None:
+        profile.add_statement(statement, time.perf_counter() - started)
+
+
+# Profiles of finished requests go to every list here (see assert_max_queries)
+_budgets = []
+_budgets_lock = threading.Lock()
+
+
+@contextmanager
+def assert_max_queries(limit: int, description: str = "block"):
+    """
+    Raises AssertionError, listing the statements, if the requests handled
+    while the block runs issue more than `limit` SQL statements between them.
+    Works with TestClient and httpx's ASGITransport alike; in a pytest suite:
+
+        @pytest.fixture
+        def max_queries():
+            return assert_max_queries
+
+        def test_providers_query_count(client, admin_headers, max_queries):
+            with max_queries(2, "GET /providers"):
+                client.get("/providers", headers=admin_headers)
+    """
+    profiles = []
+    with _budgets_lock:
+        _budgets.append(profiles)
+    try:
+        yield profiles
+    finally:
+        with _budgets_lock:
+            _budgets.remove(profiles)
+    count = sum(profile.statement_count for profile in profiles)
+    if count > limit:
+        lines = [f"{description} ran {count} SQL statements, over its budget of {limit}:"]
+        for profile in profiles:
+            lines.extend(f"  {profile.description}: {' '.join(sql.split())[:200]}" for _, sql in profile.statements)
+        raise AssertionError("\n".join(lines))
+
+
+class Histogram:
+    """A Prometheus histogram with one label set per observed combination."""
+
+    def __init__(self, name: str, help: str, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            # Cumulative bucket counts, then the +Inf bucket (the total count), then the sum
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, counts in series:
+            labels = list(zip(self.labels, label_values))
+            for bound, count in zip(list(self.buckets) + ["+Inf"], counts):
+                lines.append(f"{self.name}_bucket{format_labels(labels + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {counts[-2]}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {counts[-1]:.6f}")
+        return lines
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+request_seconds = Histogram(
+    "homehelp_request_seconds", "Request wall time", TIME_BUCKETS, ("method", "route", "status")
+)
+request_db_seconds = Histogram("homehelp_request_db_seconds", "SQL time per request", TIME_BUCKETS, ("route",))
+request_statements = Histogram(
+    "homehelp_request_sql_statements", "SQL statements per request", COUNT_BUCKETS, ("route",)
+)
+request_bcrypt_seconds = Histogram(
+    "homehelp_request_bcrypt_seconds", "Password hashing time per request, including the queue",
+    TIME_BUCKETS, ("route",)
+)
+request_llm_seconds = Histogram(
+    "homehelp_request_llm_seconds", "Time waiting on the chat model per request", TIME_BUCKETS, ("route",)
+)
+HISTOGRAMS = [request_seconds, request_db_seconds, request_statements, request_bcrypt_seconds, request_llm_seconds]
+
+
+def stats_gauges(prefix: str, stats: dict):
+    """Prometheus gauge lines for the numeric values of a stats() dict, nested keys joined by "_"."""
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}"
+        if isinstance(value, dict):
+            lines.extend(stats_gauges(name, value))
+        elif isinstance(value, (bool, int, float)):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {float(value)}")
+    return lines
+
+
+def render_metrics(stats: dict) -> str:
+    """The histograms plus gauges for each stats dict, keyed by metric prefix."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for prefix, values in stats.items():
+        lines.extend(stats_gauges(prefix, values))
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(profile: RequestProfile, total_seconds: float) -> str:
+    parts = [
+        f"app;dur={total_seconds * 1000:.1f}",
+        f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.statement_count} statements"',
+    ]
+    parts.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(profile.timings.items()))
+    return ", ".join(parts)
+
+
+def _route_label(scope) -> str:
+    # Route templates, not raw paths, so ids don't make a series each
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def log_slow_request(scope, status_code: int, profile: RequestProfile, total_seconds: float):
+    timings = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in sorted(profile.timings.items()))
+    # One record per request, so its statements stay together under concurrent load
+    lines = [
+        f"Slow request: {scope['method']} {scope['path']} {status_code} took {total_seconds * 1000:.0f} ms "
+        f"(db {profile.db_seconds * 1000:.0f} ms in {profile.statement_count} statements"
+        f"{', ' + timings if timings else ''})"
+    ]
+    lines.extend(f"  {seconds * 1000:8.1f} ms  {' '.join(sql.split())[:300]}" for seconds, sql in profile.statements)
+    if profile.statement_count > len(profile.statements):
+        lines.append(f"  ... {profile.statement_count - len(profile.statements)} more statements")
+    logger.warning("\n".join(lines))
+
+
+class ProfilingMiddleware:
+    """Profiles each HTTP request; add it last so it wraps everything else."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+        token = _current_profile.set(profile)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    # Streamed bodies are still being produced; this covers the work until the headers
+                    timing = server_timing(profile, time.perf_counter() - profile.started)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            total = time.perf_counter() - profile.started
+            route = _route_label(scope)
+            request_seconds.observe(total, scope["method"], route, str(status_code))
+            request_db_seconds.observe(profile.db_seconds, route)
+            request_statements.observe(profile.statement_count, route)
+            # Only requests that hashed a password or asked the model, so the quantiles mean something
+            if "bcrypt" in profile.timings:
+                request_bcrypt_seconds.observe(profile.timings["bcrypt"], route)
+            if "llm" in profile.timings:
+                request_llm_seconds.observe(profile.timings["llm"], route)
+            if total * 1000 > SLOW_REQUEST_MS:
+                log_slow_request(scope, status_code, profile, total)
+            with _budgets_lock:
+                for profiles in _budgets:
+                    profiles.append(profile)
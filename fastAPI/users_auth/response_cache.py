@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+from typing import NamedTuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from ttl_cache import TTLCache
+
+# Serialized catalog responses (service listings and details), so a repeat
+# read skips the query and the ServiceSchema pass. Keys carry a version that
+# create_service/update_service bump, which makes older entries unreachable
+# at once in this worker; other workers drop them within CATALOG_CACHE_TTL.
+# CATALOG_CACHE_TTL=0 turns the cache off (ETags and 304s still work).
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2000"))
+# How long browsers and CDNs may reuse a public catalog response unchecked
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "15"))
+
+PUBLIC_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}, stale-while-revalidate={CATALOG_MAX_AGE * 4}"
+# Per-user responses: never shared, always revalidated with the ETag
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: dict
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/"x" matches "x"."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """TTLCache of serialized responses, plus version counters."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self._entries = TTLCache(ttl, max_size)
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.not_modified = 0
+
+    def version(self, scope: str) -> int:
+        with self._lock:
+            return self._versions.get(scope, 0)
+
+    def bump(self, *scopes: str):
+        """Invalidates every response keyed on one of these scopes' versions."""
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, body: bytes, headers: dict = None) -> CachedResponse:
+        value = CachedResponse(body, make_etag(body), headers or {})
+        self._entries.set(key, value)
+        return value
+
+    def respond(self, request: Request, cached: CachedResponse, cache_control: str) -> Response:
+        """200 with the body, or an empty 304 when the client already has it."""
+        headers = {"ETag": cached.etag, "Cache-Control": cache_control}
+        if cache_control == PRIVATE_CACHE_CONTROL:
+            headers["Vary"] = "Authorization"
+        if etag_matches(request.headers.get("if-none-match"), cached.etag):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=cached.body, media_type="application/json", headers={**cached.headers, **headers})
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        stats = self._entries.stats()
+        with self._lock:
+            return {**stats, "not_modified": self.not_modified, "versions": dict(self._versions)}
+
+
+catalog_cache = ResponseCache(CATALOG_CACHE_TTL, CATALOG_CACHE_SIZE)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field, SecretStr, HttpUrl
-from typing import Optional, Union
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, SecretStr, HttpUrl
+from typing import List, Optional, Union
 import re
 from datetime import datetime
 
@@ -25,6 +25,38 @@ class Token(BaseModel):
     role: str
     user_id: int  # Add this field
     redirect_to: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+# Identity rebuilt from an access token with embedded profile claims;
+# exposes the User attributes the routes read
+class Principal(BaseModel):
+    id: int
+    email: str
+    role: str
+    full_name: str
+    homeowner_id: Optional[int] = None
+    provider_id: Optional[int] = None
+    admin_id: Optional[int] = None
+    is_verified: bool = False
+    has_documents: bool = False
+    is_super_admin: bool = False
+
+    model_config = ConfigDict(frozen=True)
+
+class HomeOwnerProfile(BaseModel):
+    id: int
+    user_id: int
+
+class ProviderProfile(BaseModel):
+    id: int
+    is_verified: bool
+    has_documents: bool
 
 class ServiceBase(BaseModel):
     title: str
@@ -37,16 +69,26 @@ class ServiceCreate(ServiceBase):
 
 from pydantic import ConfigDict
 
+class ImageVariant(BaseModel):
+    width: int
+    height: int
+    format: str
+    url: str
+
+
 class Service(BaseModel):
     id: int
     title: str
     description: str
-    price: int
+    # Nullable in the table; such services list after the rest on that sort
+    price: Optional[int] = None
     image: str
-    rating: int
+    rating: Optional[int] = None
     provider_name: str
-    created_at: datetime
+    created_at: Optional[datetime] = None
     provider_id: int
+    # Smallest first; None while the derivatives are being built
+    image_variants: Optional[List[ImageVariant]] = None
     
     # Add this configuration
     model_config = ConfigDict(from_attributes=True)
@@ -57,6 +99,18 @@ class Service(BaseModel):
     #     orm_mode = True  # For Pydantic v1 compatibility
 
 
+class ServiceSearchResult(Service):
+    rank: float
+    title_highlight: str
+    description_highlight: str
+
+
+class SuggestionResponse(BaseModel):
+    text: str
+    type: str
+    count: int
+
+
 class ServiceUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -91,13 +145,16 @@ class BookingResponse(BaseModel):
     homeowner_id: int
     booking_date: datetime
     status: str
-    scheduled_date: datetime
+    scheduled_date: Optional[datetime] = None  # unscheduled bookings list last
     completed_date: Optional[datetime] = None
     service_title: str
     provider_name: str
 
 class ChatInput(BaseModel):
     message: str
+    # Returned by the previous answer; omit to start a new conversation
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
-    response: str
\ No newline at end of file
+    response: str
+    session_id: Optional[str] = None
\ No newline at end of file
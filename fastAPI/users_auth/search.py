@@ -0,0 +1,110 @@
+import os
+import re
+
+from sqlalchemy import func, select, literal_column, union_all
+
+from models import Service, SEARCH_CONFIG, nulls_last
+
+HIGHLIGHT_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, HighlightAll=false"
+
+# Ranking reads each match's search document, so only SEARCH_CANDIDATE_LIMIT
+# matches are ranked: the best-rated ones (rating desc, id desc, the catalog's
+# rating order). They are found by walking ix_services_active_rating_nulls_last
+# through at most SEARCH_WINDOW_ROWS services; a query too rare to fill the
+# candidate set there goes through the full-text index instead. Results are
+# approximate whenever a query has more matches than candidates, and the
+# endpoint says so.
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "300"))
+SEARCH_WINDOW_ROWS = int(os.getenv("SEARCH_WINDOW_ROWS", "20000"))
+APPROXIMATE_HEADER = "X-Search-Approximate"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def build_tsquery(text: str):
+    """
+    Turns free text into a prefix tsquery ("plum fix" -> "plum:* & fix:*") so
+    results show up while the user is still typing. Returns None when the text
+    has nothing searchable in it.
+    """
+    terms = _WORD.findall(text.lower())
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def search_services_query(text: str, limit: int):
+    """
+    Ranked search over active services, with highlighted title and description.
+    Each row's `truncated` is true when only some of the matches were ranked.
+    """
+    tsquery_text = build_tsquery(text)
+    if tsquery_text is None:
+        return None
+
+    tsquery = func.to_tsquery(literal_column(f"'{SEARCH_CONFIG}'"), tsquery_text)
+
+    key = nulls_last(Service.rating, descending=True)
+
+    # Best-rated matches among the best-rated services: exact whenever the
+    # window holds more than SEARCH_CANDIDATE_LIMIT matches, and cheap then,
+    # since a common query fills it after a few thousand rows
+    window = (
+        select(Service.id, key.label("sort_key"), Service.search_vector)
+        .where(Service.is_active == True)
+        .order_by(key.desc(), Service.id.desc())
+        .limit(SEARCH_WINDOW_ROWS)
+        .subquery()
+    )
+    head = (
+        select(window)
+        .where(window.c.search_vector.op("@@")(tsquery))
+        .order_by(window.c.sort_key.desc(), window.c.id.desc())
+        .limit(SEARCH_CANDIDATE_LIMIT + 1)
+        .cte("head")
+    )
+    head_full = select(func.count()).select_from(head).scalar_subquery() > SEARCH_CANDIDATE_LIMIT
+
+    # Otherwise the query is rare: read all its matches off the full-text
+    # index. This sorts on the bare column so the planner can't walk the
+    # rating index instead, which would visit every service for a rare word
+    tail = (
+        select(Service.id, key.label("sort_key"), Service.search_vector)
+        .where(Service.is_active == True, Service.search_vector.op("@@")(tsquery), ~head_full)
+        .order_by(Service.rating.desc().nulls_last(), Service.id.desc())
+        .limit(SEARCH_CANDIDATE_LIMIT + 1)
+    )
+    found = union_all(select(head).where(head_full), tail).subquery()
+
+    position = func.row_number().over(order_by=(found.c.sort_key.desc(), found.c.id.desc()))
+    candidates = (
+        select(
+            found.c.id,
+            found.c.search_vector,
+            position.label("position"),
+            (func.count().over() > SEARCH_CANDIDATE_LIMIT).label("truncated"),
+        )
+        .subquery()
+    )
+    rank = func.ts_rank_cd(candidates.c.search_vector, tsquery)
+
+    # Rank and limit first; ts_headline is costly, so only run it on the page
+    matches = (
+        select(candidates.c.id, rank.label("rank"), candidates.c.truncated)
+        .where(candidates.c.position <= SEARCH_CANDIDATE_LIMIT)
+        .order_by(rank.desc(), candidates.c.id)
+        .limit(limit)
+        .subquery()
+    )
+
+    return (
+        select(
+            Service,
+            matches.c.rank,
+            matches.c.truncated,
+            func.ts_headline(literal_column(f"'{SEARCH_CONFIG}'"), Service.title, tsquery, HIGHLIGHT_OPTIONS).label("title_highlight"),
+            func.ts_headline(literal_column(f"'{SEARCH_CONFIG}'"), func.coalesce(Service.description, ""), tsquery, HIGHLIGHT_OPTIONS).label("description_highlight"),
+        )
+        .join(matches, matches.c.id == Service.id)
+        .order_by(matches.c.rank.desc(), Service.id)
+    )
@@ -0,0 +1,303 @@
+import heapq
+import os
+import re
+import threading
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from models import Service
+
+# Typeahead for the homeowner search box, served from memory so a keystroke
+# never reaches Postgres. Each worker keeps its own copy, loaded once at
+# startup. Its own writes are applied in place right away; writes made by
+# other workers are read from services.updated_at every SUGGEST_SYNC_SECONDS
+# and applied the same way, so the index is never rebuilt while serving.
+SUGGEST_SYNC_SECONDS = float(os.getenv("SUGGEST_SYNC_SECONDS", "10"))
+# Suggestions read per prefix, best first. A lookup only reads these, so a
+# one-letter prefix costs the same as a long one; multi-word queries filter
+# them for the other words
+SUGGEST_TOP_K = int(os.getenv("SUGGEST_TOP_K", "100"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def _ranker(suggestions: dict):
+    """Most services first, then alphabetical."""
+    return lambda key: (-len(suggestions[key]["ids"]), key[1], key[0])
+
+
+class RankedPrefixes:
+    """
+    Ranked trie over words, stored flat: every prefix of every word maps to
+    the best suggestion keys that have a word starting with it, best first.
+    A prefix's list is the best of the lists one character longer plus the
+    suggestions whose word is exactly that prefix, so a change to one
+    suggestion only revisits the prefixes of its own words.
+
+    Lists keep up to twice SUGGEST_TOP_K keys. A list that had to drop keys is
+    "truncated": it is still exactly the best len(list) keys, so a removal
+    only shortens it, and it is refilled from scratch only once it is shorter
+    than SUGGEST_TOP_K. Truncated lists differ in length, so a change walks
+    every prefix of the word rather than stopping where the key is missing.
+    """
+
+    def __init__(self, rank):
+        self._rank = rank
+        self._top = {}           # prefix -> [key, ...], best first
+        self._truncated = set()  # prefixes whose list leaves keys out
+        self._postings = {}      # word -> set of keys
+        self._chars = set()      # every character of an indexed word, to find a prefix's children
+
+    def get(self, prefix: str) -> list:
+        return self._top.get(prefix, [])[:SUGGEST_TOP_K]
+
+    def build(self, pairs):
+        """Indexes (word, key) pairs from scratch."""
+        for word, key in pairs:
+            self._postings.setdefault(word, set()).add(key)
+        children = {}
+        for word in self._postings:
+            self._chars.update(word)
+            for end in range(len(word), 0, -1):
+                prefix, parent = word[:end], word[:end - 1]
+                known = parent in children
+                children.setdefault(parent, set()).add(prefix)
+                if known:
+                    break
+        # Longest first, so every child's list is ready before its parent's
+        for prefix in sorted(children.keys() - {""} | self._postings.keys(), key=len, reverse=True):
+            self._recompute(prefix, children.get(prefix, ()))
+
+    def _recompute(self, prefix: str, children=None):
+        if children is None:
+            children = [prefix + char for char in self._chars if prefix + char in self._top]
+        candidates = set(self._postings.get(prefix, ()))
+        for child in children:
+            candidates.update(self._top[child])
+        top = heapq.nsmallest(2 * SUGGEST_TOP_K, candidates, key=self._rank)
+        truncated = [self._top[child][-1] for child in children if child in self._truncated]
+        if truncated:
+            # Past the last key of a truncated child, keys it left out could come first
+            bound = min(truncated, key=self._rank)
+            if bound in top:
+                top = top[:top.index(bound) + 1]
+        if truncated or len(candidates) > len(top):
+            self._truncated.add(prefix)
+        else:
+            self._truncated.discard(prefix)
+        if top:
+            self._top[prefix] = top
+        else:
+            self._top.pop(prefix, None)
+
+    def add(self, word: str, key):
+        self._postings.setdefault(word, set()).add(key)
+        self._chars.update(word)
+        self.promote(word, key)
+
+    def remove(self, words, key):
+        """Drops `key` from all of its words."""
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._postings[word]
+        for word in words:
+            self.demote(word, key, present=False)
+
+    def promote(self, word: str, key):
+        """`key`, one of `word`'s suggestions, now ranks higher than before (or is new)."""
+        rank = self._rank(key)
+        for end in range(len(word), 0, -1):
+            prefix = word[:end]
+            top = self._top.setdefault(prefix, [])
+            if key in top:
+                top.remove(key)
+            elif prefix in self._truncated and rank >= self._rank(top[-1]):
+                # A shorter prefix may keep a longer list, so carry on up
+                continue
+            top.append(key)
+            top.sort(key=self._rank)
+            if len(top) > 2 * SUGGEST_TOP_K:
+                del top[2 * SUGGEST_TOP_K:]
+                self._truncated.add(prefix)
+
+    def demote(self, word: str, key, present: bool = True):
+        """`key` now ranks lower than before, or (present=False) is gone from every word."""
+        for end in range(len(word), 0, -1):
+            prefix = word[:end]
+            top = self._top.get(prefix)
+            if top is None or key not in top:
+                continue
+            top.remove(key)
+            truncated = prefix in self._truncated
+            # A truncated list can only keep the key if it still beats the last one
+            if present and (not truncated or (top and self._rank(key) < self._rank(top[-1]))):
+                top.append(key)
+                top.sort(key=self._rank)
+            if truncated and len(top) < SUGGEST_TOP_K:
+                self._recompute(prefix)
+            elif not top:
+                del self._top[prefix]
+
+
+class PrefixIndex:
+    """
+    Typeahead over service titles and provider names. Services sharing a title
+    or provider name share one suggestion, which counts how many there are;
+    suggestions rank by that count, then alphabetically.
+    """
+
+    def __init__(self):
+        self._suggestions = {}  # (kind, text) -> {"text": display text, "ids": set of service ids, "words": [...]}
+        self._services = {}     # service id -> [(kind, text), ...]
+        self._words = RankedPrefixes(_ranker(self._suggestions))
+        # Suggestions by their first word, for the ones starting with the whole query
+        self._leading = RankedPrefixes(_ranker(self._suggestions))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._suggestions)
+
+    def _add(self, service_id, kind, display):
+        text = normalize(display or "")
+        if not text:
+            return None
+        key = (kind, text)
+        suggestion = self._suggestions.get(key)
+        if suggestion is None:
+            words = text.split()
+            suggestion = self._suggestions[key] = {"text": display.strip(), "ids": {service_id}, "words": words}
+            for word in set(words):
+                self._words.add(word, key)
+            self._leading.add(words[0], key)
+        elif service_id not in suggestion["ids"]:
+            suggestion["ids"].add(service_id)
+            for word in set(suggestion["words"]):
+                self._words.promote(word, key)
+            self._leading.promote(suggestion["words"][0], key)
+        return key
+
+    def _remove(self, service_id, key):
+        suggestion = self._suggestions.get(key)
+        if suggestion is None or service_id not in suggestion["ids"]:
+            return
+        suggestion["ids"].discard(service_id)
+        words = suggestion["words"]
+        if suggestion["ids"]:
+            for word in set(words):
+                self._words.demote(word, key)
+            self._leading.demote(words[0], key)
+            return
+        # Still ranked while it leaves the lists, then forgotten
+        suggestion["ids"].add(service_id)
+        self._words.remove(set(words), key)
+        self._leading.remove([words[0]], key)
+        del self._suggestions[key]
+
+    def upsert(self, service_id, title, provider_name, is_active=True):
+        """Adds, updates or (when inactive) removes one service's suggestions."""
+        with self._lock:
+            keys = []
+            if is_active is not False:
+                keys = [(kind, normalize(display or "")) for kind, display in
+                        (("service", title), ("provider", provider_name))]
+                keys = [key for key in keys if key[1]]
+            if keys == self._services.get(service_id, []):
+                return
+            for key in self._services.pop(service_id, []):
+                self._remove(service_id, key)
+            if keys:
+                added = [self._add(service_id, "service", title), self._add(service_id, "provider", provider_name)]
+                self._services[service_id] = [key for key in added if key]
+
+    def rebuild(self, rows):
+        """Replaces the whole index with (id, title, provider_name) rows."""
+        suggestions, services = {}, {}
+        for service_id, title, provider_name in rows:
+            keys = []
+            for kind, display in (("service", title), ("provider", provider_name)):
+                text = normalize(display or "")
+                if not text:
+                    continue
+                key = (kind, text)
+                suggestion = suggestions.get(key)
+                if suggestion is None:
+                    suggestion = suggestions[key] = {"text": display.strip(), "ids": set(), "words": text.split()}
+                suggestion["ids"].add(service_id)
+                keys.append(key)
+            services[service_id] = keys
+        words, leading = RankedPrefixes(_ranker(suggestions)), RankedPrefixes(_ranker(suggestions))
+        words.build((word, key) for key, suggestion in suggestions.items() for word in set(suggestion["words"]))
+        leading.build((suggestion["words"][0], key) for key, suggestion in suggestions.items())
+        with self._lock:
+            self._suggestions, self._services, self._words, self._leading = suggestions, services, words, leading
+
+    def suggest(self, query: str, limit: int = 8):
+        words = normalize(query).split()
+        if not words:
+            return []
+        phrase = " ".join(words)
+        # Look up the longest word; the rest must also prefix a word
+        lookup = max(words, key=len)
+        others = list(words)
+        others.remove(lookup)
+
+        with self._lock:
+            # Whole-phrase prefix matches first, then the rest; both lists are already ranked
+            leading = [key for key in self._leading.get(words[0]) if key[1].startswith(phrase)]
+            matches = {}
+            for key in leading + self._words.get(lookup):
+                if len(matches) == limit:
+                    break
+                if key in matches:
+                    continue
+                suggestion = self._suggestions[key]
+                if others and not all(any(tw.startswith(w) for tw in suggestion["words"]) for w in others):
+                    continue
+                matches[key] = (suggestion["text"], len(suggestion["ids"]))
+
+        return [
+            {"text": display, "type": kind, "count": count}
+            for (kind, _), (display, count) in matches.items()
+        ]
+
+
+suggest_index = PrefixIndex()
+_suggest_synced_to = None
+
+
+def load_suggest_index(db):
+    """Builds the index from the active services (sync Session)."""
+    global _suggest_synced_to
+    rows = db.execute(
+        select(Service.id, Service.title, Service.provider_name, Service.updated_at).where(Service.is_active == True)
+    ).all()
+    suggest_index.rebuild([(service_id, title, provider_name) for service_id, title, provider_name, _ in rows])
+    _suggest_synced_to = max((updated_at for *_, updated_at in rows if updated_at), default=None)
+    return len(rows)
+
+
+def sync_suggest_index(db) -> int:
+    """Applies services changed since the last load or sync, by any worker; returns how many were read."""
+    global _suggest_synced_to
+    query = select(Service.id, Service.title, Service.provider_name, Service.is_active, Service.updated_at)
+    if _suggest_synced_to is not None:
+        # Overlap the previous sync: workers' clocks and commit order differ a little
+        query = query.where(Service.updated_at > _suggest_synced_to - timedelta(minutes=1))
+    else:
+        query = query.where(Service.updated_at.isnot(None))
+    rows = db.execute(query).all()
+    for service_id, title, provider_name, is_active, _ in rows:
+        suggest_index.upsert(service_id, title, provider_name, is_active)
+    if rows:
+        newest = max(updated_at for *_, updated_at in rows)
+        if _suggest_synced_to is None or newest > _suggest_synced_to:
+            _suggest_synced_to = newest
+    return len(rows)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe TTL + LRU cache. Entries expire `ttl` seconds after they were
+    set, or after they were last read when `sliding` is true; past `max_size`
+    the least recently used go first. A ttl of 0 or less turns it off.
+    """
+
+    def __init__(self, ttl: float, max_size: int, sliding: bool = False):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sliding = sliding
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key, default=None):
+        if self.ttl <= 0:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < now:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            if self.sliding:
+                self._entries[key] = (value, now + self.ttl)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, predicate) -> int:
+        """Drops every entry whose key matches `predicate`; returns how many."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def purge_expired(self) -> int:
+        """
+        Drops expired entries from the least recently used end, stopping at the
+        first live one. With sliding expiry that is every expired entry.
+        """
+        now = time.monotonic()
+        purged = 0
+        with self._lock:
+            while self._entries:
+                key, (_, expires_at) = next(iter(self._entries.items()))
+                if expires_at >= now:
+                    break
+                del self._entries[key]
+                purged += 1
+            self.expired += purged
+        return purged
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import uuid
+from typing import NamedTuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+# Provider documents (ID scans, certificates). Files are copied in chunks
+# with awaits in between, so one large scan never stalls other requests.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# A multipart request carrying more than this is refused before its body is read
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(2 * UPLOAD_MAX_BYTES + 1024 * 1024)))
+
+# Leading bytes -> (content type, extension). The type is taken from the
+# file itself, never from the client's filename or Content-Type.
+SIGNATURES = [
+    (b"%PDF-", "application/pdf", ".pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+]
+ALLOWED_CONTENT_TYPES = {content_type for _, content_type, _ in SIGNATURES}
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    content_type: str
+
+
+def sniff_content_type(head: bytes):
+    for signature, content_type, extension in SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    return None
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit"
+    )
+
+
+async def save_upload_file(upload_file: UploadFile, destination: str, max_bytes: int = UPLOAD_MAX_BYTES) -> StoredUpload:
+    """
+    Streams an upload to `destination` under a random name, hashing it on the
+    way. Data goes to a hidden temp file that is renamed into place only once
+    complete, so a failed or rejected upload never leaves a partial document.
+    """
+    if upload_file.size is not None and upload_file.size > max_bytes:
+        raise _too_large(max_bytes)
+    if upload_file.content_type not in ALLOWED_CONTENT_TYPES | {None, "application/octet-stream"}:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Only PDF, PNG and JPEG files are accepted"
+        )
+
+    digest = hashlib.sha256()
+    size = 0
+    detected = None
+    temp_path = os.path.join(destination, f".{uuid.uuid4()}.part")
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                if detected is None:
+                    detected = sniff_content_type(chunk)
+                    if detected is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Only PDF, PNG and JPEG files are accepted"
+                        )
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                # hashlib releases the GIL on large buffers
+                await run_in_threadpool(digest.update, chunk)
+                await buffer.write(chunk)
+            await buffer.flush()
+            await run_in_threadpool(os.fsync, buffer.fileno())
+
+        if detected is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Uploaded file is empty"
+            )
+
+        content_type, extension = detected
+        file_path = os.path.join(destination, f"{uuid.uuid4()}{extension}")
+        await aiofiles.os.replace(temp_path, file_path)
+        return StoredUpload(file_path, digest.hexdigest(), size, content_type)
+    except HTTPException:
+        await discard_upload(temp_path)
+        raise
+    except Exception as e:
+        await discard_upload(temp_path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving file: {str(e)}"
+        )
+
+
+async def discard_upload(path):
+    """Removes a stored or partial upload; missing files are ignored."""
+    if not path:
+        return
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class UploadSizeLimitMiddleware:
+    """Answers 413 to multipart requests whose Content-Length is over the limit."""
+
+    def __init__(self, app, max_request_bytes: int = UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_request_bytes = max_request_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            length = headers.get(b"content-length")
+            if (headers.get(b"content-type", b"").startswith(b"multipart/form-data")
+                    and length and length.isdigit() and int(length) > self.max_request_bytes):
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": "Upload too large"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)